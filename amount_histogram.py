@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Гистограмма сумм чеков с фиксированными корзинами в CZK
+Сливаемая структура: медиана, p90 и распределение считаются за O(1)
+(по числу корзин) без сортировки транзакций
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+# Ширина корзины в кронах и количество корзин.
+# Последняя корзина - переполнение: все чеки от BUCKET_WIDTH * (BUCKET_COUNT - 1) CZK
+BUCKET_WIDTH = 100
+BUCKET_COUNT = 101
+OVERFLOW_BUCKET = BUCKET_COUNT - 1
+
+
+def bucket_for(amount: float) -> int:
+    """Номер корзины для суммы (совпадает с SQL в Database)"""
+    return max(0, min(int(amount // BUCKET_WIDTH), OVERFLOW_BUCKET))
+
+
+class AmountHistogram:
+    """Гистограмма сумм чеков"""
+
+    __slots__ = ('counts', 'total')
+
+    def __init__(self, counts: Optional[Iterable[int]] = None):
+        self.counts: List[int] = [0] * BUCKET_COUNT
+        self.total = 0
+        if counts is not None:
+            for bucket, count in enumerate(counts):
+                self.counts[bucket] = int(count)
+            self.total = sum(self.counts)
+
+    @classmethod
+    def from_buckets(cls, rows: Iterable[Tuple[int, int]]) -> 'AmountHistogram':
+        """Создает гистограмму из пар (корзина, количество)"""
+        histogram = cls()
+        for bucket, count in rows:
+            histogram.counts[int(bucket)] += int(count)
+            histogram.total += int(count)
+        return histogram
+
+    def add(self, amount: float, count: int = 1):
+        """Добавить чек"""
+        self.counts[bucket_for(amount)] += count
+        self.total += count
+
+    def remove(self, amount: float):
+        """Убрать чек (при удалении транзакции)"""
+        self.add(amount, -1)
+
+    def merge(self, other: 'AmountHistogram') -> 'AmountHistogram':
+        """Слить другую гистограмму в эту (например, месяцы или мастеров)"""
+        for bucket, count in enumerate(other.counts):
+            self.counts[bucket] += count
+        self.total += other.total
+        return self
+
+    def __add__(self, other: 'AmountHistogram') -> 'AmountHistogram':
+        return AmountHistogram(self.counts).merge(other)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AmountHistogram) and self.counts == other.counts
+
+    def __repr__(self) -> str:
+        return f"AmountHistogram(total={self.total}, median={self.median:.0f})"
+
+    def quantile(self, q: float) -> float:
+        """Квантиль с линейной интерполяцией внутри корзины (0.0 если чеков нет)"""
+        if self.total <= 0:
+            return 0.0
+
+        target = q * self.total
+        cumulative = 0
+        for bucket, count in enumerate(self.counts):
+            if count <= 0:
+                continue
+            if cumulative + count >= target:
+                lower = bucket * BUCKET_WIDTH
+                if bucket == OVERFLOW_BUCKET:
+                    return float(lower)
+                return lower + BUCKET_WIDTH * (target - cumulative) / count
+            cumulative += count
+        return float(OVERFLOW_BUCKET * BUCKET_WIDTH)
+
+    @property
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    @property
+    def p90(self) -> float:
+        return self.quantile(0.9)
+
+    def distribution(self, step: int = 500) -> List[Tuple[int, Optional[int], int]]:
+        """Распределение по крупным интервалам: [(от, до или None, количество)]
+
+        Возвращает только непустые интервалы, последний - открытый (до = None)
+        """
+        per_step = max(1, step // BUCKET_WIDTH)
+        result = []
+        for start in range(0, OVERFLOW_BUCKET, per_step):
+            count = sum(self.counts[start:min(start + per_step, OVERFLOW_BUCKET)])
+            if count:
+                result.append((start * BUCKET_WIDTH, (start + per_step) * BUCKET_WIDTH - 1, count))
+        if self.counts[OVERFLOW_BUCKET]:
+            result.append((OVERFLOW_BUCKET * BUCKET_WIDTH, None, self.counts[OVERFLOW_BUCKET]))
+        return result
@@ -4,100 +4,164 @@
 Предоставляет детальные отчеты и графики
 """
 
-from database import db
+from database import db, SALON_TIMEZONE
 from datetime import datetime, timedelta
 from typing import List, Dict
+from reports import cached
+
+# Отчеты считаются в памяти (NumPy), если движок доступен, иначе - запросами к БД
+try:
+    from analytics_engine import analytics_engine as stats_source
+except ImportError:
+    stats_source = db
+
+
+_DAILY_ROW = (
+    "📅 {0}\n"
+    "  💰 Транзакций: {1}\n"
+    "  💵 Сумма: {2:,.0f} CZK\n"
+    "  📊 Средняя: {3:.0f} CZK\n\n"
+).format
+
+_SERVICE_ROW = "{0}. {1}\n   {2} {3}x ({4:.1f}%)\n\n".format
+
+_USER_ROW = "{0}. @{1}{2}\n   💰 {3} транзакций\n   💵 {4:.0f} CZK\n".format
+_USER_QUANTILES = "   📍 Медиана: {0:.0f} CZK, P90: {1:.0f} CZK\n".format
+_USER_LAST_SEEN = "   📅 Последний: {0}\n\n".format
+
+_SUMMARY_HEADER = (
+    "📊 **ОБЩАЯ АНАЛИТИКА**\n\n"
+    "👥 Пользователей: {total_users}\n"
+    "💰 Транзакций: {total_transactions}\n"
+    "💵 Общая сумма: {total_amount:,.0f} CZK\n"
+    "📊 Средний чек: {avg_amount:.0f} CZK\n"
+    "📍 Медиана: {median_amount:.0f} CZK, P90: {p90_amount:.0f} CZK\n"
+    "🟢 Активных (24ч): {active_24h}\n\n"
+).format
+
+_RECENT_ROW = "• {0} - @{1}\n  {2:.0f} CZK - {3}\n\n".format
+
+_END_OF_DAY_TOTALS = (
+    "💰 Транзакций: {0}\n"
+    "💵 Сумма: {1:,.0f} CZK\n"
+    "📊 Средний чек: {2:.0f} CZK\n"
+).format
+
+_END_OF_DAY_WEEK = "\n📅 <b>За 7 дней:</b> {0} транзакций, {1:,.0f} CZK\n".format
 
 
 def format_daily_report() -> str:
     """Форматирует дневной отчет"""
-    daily_stats = db.get_daily_stats(7)
+    return cached(('daily', 7), stats_source, _render_daily_report)
+
+
+def _render_daily_report() -> str:
+    daily_stats = stats_source.get_daily_stats(7)
     
     if not daily_stats:
         return "📊 Нет данных за последние 7 дней"
     
-    report = "📊 **ДНЕВНАЯ СТАТИСТИКА (7 дней)**\n\n"
-    
+    parts = ["📊 **ДНЕВНАЯ СТАТИСТИКА (7 дней)**\n\n"]
     for day in daily_stats:
-        date = day['date']
         transactions = day['transactions']
         total = day['total_amount']
         avg = total / transactions if transactions > 0 else 0
-        
-        report += f"📅 {date}\n"
-        report += f"  💰 Транзакций: {transactions}\n"
-        report += f"  💵 Сумма: {total:,.0f} CZK\n"
-        report += f"  📊 Средняя: {avg:.0f} CZK\n\n"
+        parts.append(_DAILY_ROW(day['date'], transactions, total, avg))
     
-    return report
+    return ''.join(parts)
 
 
 def format_services_report() -> str:
     """Форматирует отчет по услугам"""
-    services = db.get_popular_services(10)
+    return cached(('services', 10), stats_source, _render_services_report)
+
+
+def _render_services_report() -> str:
+    services = stats_source.get_popular_services(10)
     
     if not services:
         return "📋 Нет данных по услугам"
     
-    report = "🛍️ **ПОПУЛЯРНЫЕ УСЛУГИ**\n\n"
-    
+    parts = ["🛍️ **ПОПУЛЯРНЫЕ УСЛУГИ**\n\n"]
     total_count = sum(count for _, count in services)
     
     for i, (service, count) in enumerate(services, 1):
         percentage = (count / total_count * 100) if total_count > 0 else 0
         bar = "█" * int(percentage / 5)  # Простая визуализация
-        report += f"{i}. {service}\n"
-        report += f"   {bar} {count}x ({percentage:.1f}%)\n\n"
+        parts.append(_SERVICE_ROW(i, service, bar, count, percentage))
     
-    return report
+    return ''.join(parts)
 
 
 def format_users_report() -> str:
     """Форматирует отчет по пользователям"""
-    users = db.get_all_users_stats()
+    return cached(('users', 10), stats_source, _render_users_report)
+
+
+def _render_users_report() -> str:
+    users = stats_source.get_all_users_stats()
     
     if not users:
         return "👥 Нет данных по пользователям"
     
-    report = "👥 **АКТИВНЫЕ ПОЛЬЗОВАТЕЛИ**\n\n"
+    parts = ["👥 **АКТИВНЫЕ ПОЛЬЗОВАТЕЛИ**\n\n"]
     
     for i, user in enumerate(users[:10], 1):
         username = user['username'] or f"User{user['user_id']}"
-        name = user['first_name'] or ""
-        
-        report += f"{i}. @{username}"
-        if name:
-            report += f" ({name})"
-        report += "\n"
-        report += f"   💰 {user['transactions_count']} транзакций\n"
-        report += f"   💵 {user['total_amount']:.0f} CZK\n"
-        report += f"   📅 Последний: {user['last_seen'][:10]}\n\n"
-    
-    return report
+        name = f" ({user['first_name']})" if user['first_name'] else ""
+        parts.append(_USER_ROW(i, username, name, user['transactions_count'], user['total_amount']))
+        if user['transactions_count']:
+            histogram = stats_source.get_amount_histogram(user_id=user['user_id'])
+            parts.append(_USER_QUANTILES(histogram.median, histogram.p90))
+        parts.append(_USER_LAST_SEEN(user['last_seen'][:10]))
+    
+    return ''.join(parts)
 
 
 def format_summary_report() -> str:
     """Форматирует общий отчет"""
-    stats = db.get_total_stats()
-    recent = db.get_recent_transactions(5)
+    return cached(('summary', 5), stats_source, _render_summary_report)
+
+
+def _render_summary_report() -> str:
+    stats = stats_source.get_total_stats()
+    recent = stats_source.get_recent_transactions(5)
     
-    report = "📊 **ОБЩАЯ АНАЛИТИКА**\n\n"
-    report += f"👥 Пользователей: {stats['total_users']}\n"
-    report += f"💰 Транзакций: {stats['total_transactions']}\n"
-    report += f"💵 Общая сумма: {stats['total_amount']:,.0f} CZK\n"
-    report += f"📊 Средний чек: {stats['avg_amount']:.0f} CZK\n"
-    report += f"🟢 Активных (24ч): {stats['active_24h']}\n\n"
+    parts = [_SUMMARY_HEADER(**stats)]
     
     if recent:
-        report += "🕒 **ПОСЛЕДНИЕ ТРАНЗАКЦИИ:**\n\n"
+        parts.append("🕒 **ПОСЛЕДНИЕ ТРАНЗАКЦИИ:**\n\n")
         for t in recent:
             username = t['username'] or f"ID{t['user_id']}"
             service = t['service'] or "Без услуги"
             timestamp = t['timestamp'][:16].replace('T', ' ')
-            report += f"• {timestamp} - @{username}\n"
-            report += f"  {t['amount']:.0f} CZK - {service}\n\n"
+            parts.append(_RECENT_ROW(timestamp, username, t['amount'], service))
     
-    return report
+    return ''.join(parts)
+
+
+def format_end_of_day_report(day: str = None) -> str:
+    """Форматирует итоговый отчет за день (HTML) из таблицы дневных агрегатов
+    day - местная дата салона YYYY-MM-DD (по умолчанию - сегодня)
+    """
+    day = day or datetime.now(SALON_TIMEZONE).strftime('%Y-%m-%d')
+    today = db.get_daily_rollup(day)
+    week = db.get_daily_stats(7)
+    
+    parts = [f"🌙 <b>ИТОГИ ДНЯ {day}</b>\n\n"]
+    
+    if today['transactions'] > 0:
+        avg = today['total_amount'] / today['transactions']
+        parts.append(_END_OF_DAY_TOTALS(today['transactions'], today['total_amount'], avg))
+    else:
+        parts.append("📭 Сегодня транзакций не было\n")
+    
+    if week:
+        week_transactions = sum(d['transactions'] for d in week)
+        week_total = sum(d['total_amount'] for d in week)
+        parts.append(_END_OF_DAY_WEEK(week_transactions, week_total))
+    
+    return ''.join(parts)
 
 
 if __name__ == '__main__':
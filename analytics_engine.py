@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Аналитический движок в памяти
+Загружает транзакции из БД один раз в колоночные NumPy массивы и
+считает все отчеты векторно, без обращения к базе данных
+"""
+
+import logging
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from amount_histogram import AmountHistogram, BUCKET_COUNT, BUCKET_WIDTH, OVERFLOW_BUCKET
+from database import db, SALON_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+def to_epoch(value) -> int:
+    """Переводит timestamp из БД (строка SQLite или datetime PostgreSQL) в epoch секунды (UTC)"""
+    if value is None:
+        return int(time.time())
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('T', ' ').replace('Z', ''))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def format_epoch(epoch: int) -> str:
+    """Форматирует epoch секунды так же, как SQLite хранит CURRENT_TIMESTAMP"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def month_key(year: int, month: int) -> int:
+    """Номер месяца от 1970-01 (совпадает с datetime64[M])"""
+    return (year - 1970) * 12 + (month - 1)
+
+
+class AnalyticsEngine:
+    """Колоночное хранилище транзакций с векторными агрегатами
+
+    Колонки: сумма, индекс пользователя, код услуги, epoch timestamp и месяц.
+    Данные загружаются из БД при первом запросе, после чего поддерживаются
+    инкрементально через слушатель Database (add_transaction, delete_transaction).
+    Гистограммы сумм чеков ведутся по (месяц, мастер) и сливаются по запросу.
+    Методы повторяют API Database, поэтому движок подставляется вместо db в отчетах.
+    """
+
+    def __init__(self, database, initial_capacity: int = 1024):
+        self.db = database
+        self.initial_capacity = initial_capacity
+        self.version = 0  # Увеличивается при каждом изменении данных
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset(initial_capacity)
+
+    def _reset(self, capacity: int):
+        """Создает пустые колонки"""
+        self._size = 0
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._amounts = np.empty(capacity, dtype=np.float64)
+        self._user_idx = np.empty(capacity, dtype=np.int32)
+        self._service_codes = np.empty(capacity, dtype=np.int32)
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._months = np.empty(capacity, dtype=np.int32)
+
+        self._user_ids: List[int] = []           # индекс -> user_id
+        self._user_index: Dict[int, int] = {}    # user_id -> индекс
+        self._users: Dict[int, Dict] = {}        # user_id -> данные пользователя
+        self._services: List[str] = []           # код -> название услуги
+        self._service_index: Dict[str, int] = {}
+        self._last_activity: Dict[int, int] = {}  # user_id -> epoch последнего события
+        self._histograms: Dict[Tuple[int, int], AmountHistogram] = {}  # (месяц, user_id) -> гистограмма
+
+    # ------------------------------------------------------------------
+    # Загрузка и инкрементальное обновление
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Полная загрузка данных из БД"""
+        started = time.perf_counter()
+        users = self.db.get_all_users()
+        rows = self.db.get_all_transactions()
+        activity = self.db.get_last_activity()
+
+        with self._lock:
+            self._reset(max(self.initial_capacity, len(rows) * 2))
+
+            for user in users:
+                self._register_user(user['user_id'], user)
+
+            n = len(rows)
+            self._ids[:n] = [row['id'] for row in rows]
+            self._amounts[:n] = [float(row['amount']) for row in rows]
+            self._user_idx[:n] = [self._user_position(row['user_id']) for row in rows]
+            self._service_codes[:n] = [self._service_code(row['service']) for row in rows]
+            self._timestamps[:n] = [to_epoch(row['timestamp']) for row in rows]
+            self._months[:n] = self._month_of(self._timestamps[:n])
+            self._size = n
+            self._build_histograms()
+
+            for row in activity:
+                self._last_activity[row['user_id']] = to_epoch(row['last_event'])
+
+            self._loaded = True
+            self.version += 1
+
+        elapsed = (time.perf_counter() - started) * 1000
+        logger.info(f"📈 Analytics engine loaded {n} transactions, {len(users)} users in {elapsed:.0f} ms")
+
+    def invalidate(self):
+        """Сбросить данные (следующий запрос перезагрузит их из БД)"""
+        with self._lock:
+            self._loaded = False
+            self._reset(self.initial_capacity)
+            self.version += 1
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def _build_histograms(self):
+        """Строит гистограммы (месяц, мастер) одним векторным проходом"""
+        amounts, user_idx, _, _, months = self._columns()
+        if amounts.size == 0:
+            return
+        buckets = np.clip(amounts // BUCKET_WIDTH, 0, OVERFLOW_BUCKET).astype(np.int64)
+        groups = months.astype(np.int64) * len(self._user_ids) + user_idx
+        keys, inverse = np.unique(groups, return_inverse=True)
+        counts = np.zeros((keys.size, BUCKET_COUNT), dtype=np.int64)
+        np.add.at(counts, (inverse, buckets), 1)
+        for i, key in enumerate(keys):
+            month, position = divmod(int(key), len(self._user_ids))
+            self._histograms[(month, self._user_ids[position])] = AmountHistogram(counts[i].tolist())
+
+    def _histogram_for(self, month: int, user_id: int) -> AmountHistogram:
+        histogram = self._histograms.get((month, user_id))
+        if histogram is None:
+            histogram = self._histograms[(month, user_id)] = AmountHistogram()
+        return histogram
+
+    @staticmethod
+    def _month_of(timestamps: np.ndarray) -> np.ndarray:
+        return timestamps.astype('datetime64[s]').astype('datetime64[M]').astype(np.int32)
+
+    def _register_user(self, user_id: int, info: Optional[Dict] = None) -> Dict:
+        user = self._users.get(user_id)
+        if user is None:
+            user = {
+                'user_id': user_id,
+                'username': None,
+                'first_name': None,
+                'last_name': None,
+                'total_requests': 0,
+                'last_seen': None,
+            }
+            self._users[user_id] = user
+        if info:
+            for key in ('username', 'first_name', 'last_name', 'total_requests'):
+                if key in info:
+                    user[key] = info[key]
+            if info.get('last_seen') is not None:
+                user['last_seen'] = format_epoch(to_epoch(info['last_seen']))
+        self._user_position(user_id)
+        return user
+
+    def _user_position(self, user_id: int) -> int:
+        position = self._user_index.get(user_id)
+        if position is None:
+            position = len(self._user_ids)
+            self._user_ids.append(user_id)
+            self._user_index[user_id] = position
+            if user_id not in self._users:
+                self._register_user(user_id)
+        return position
+
+    def _service_code(self, service: Optional[str]) -> int:
+        if not service:
+            return -1
+        code = self._service_index.get(service)
+        if code is None:
+            code = len(self._services)
+            self._services.append(service)
+            self._service_index[service] = code
+        return code
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        for name in ('_ids', '_amounts', '_user_idx', '_service_codes', '_timestamps', '_months'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def on_user_updated(self, user_id: int, username: str, first_name: str, last_name: str):
+        """Слушатель Database.add_or_update_user"""
+        with self._lock:
+            if not self._loaded:
+                return
+            user = self._register_user(user_id, {
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+            })
+            user['total_requests'] = (user['total_requests'] or 0) + 1
+            user['last_seen'] = format_epoch(int(time.time()))
+            self.version += 1
+
+    def on_transaction_added(self, transaction: Dict):
+        """Слушатель Database.add_transaction"""
+        with self._lock:
+            if not self._loaded:
+                return
+            # ID растут монотонно: строка уже могла попасть в массивы при загрузке
+            if self._size and self._ids[self._size - 1] >= transaction['id']:
+                return
+            if self._size == len(self._ids):
+                self._grow()
+
+            i = self._size
+            timestamp = to_epoch(transaction['timestamp'])
+            self._ids[i] = transaction['id']
+            self._amounts[i] = float(transaction['amount'])
+            self._user_idx[i] = self._user_position(transaction['user_id'])
+            self._service_codes[i] = self._service_code(transaction['service'])
+            self._timestamps[i] = timestamp
+            self._months[i] = self._month_of(np.array([timestamp], dtype=np.int64))[0]
+            self._size += 1
+            self._histogram_for(int(self._months[i]), transaction['user_id']).add(self._amounts[i])
+            self.version += 1
+
+    def on_transaction_deleted(self, transaction_id: int):
+        """Слушатель Database.delete_transaction"""
+        with self._lock:
+            if not self._loaded:
+                return
+            positions = np.flatnonzero(self._ids[:self._size] == transaction_id)
+            if positions.size == 0:
+                return
+
+            i = int(positions[0])
+            user_id = self._user_ids[self._user_idx[i]]
+            self._histogram_for(int(self._months[i]), user_id).remove(self._amounts[i])
+
+            last = self._size - 1
+            for name in ('_ids', '_amounts', '_user_idx', '_service_codes', '_timestamps', '_months'):
+                column = getattr(self, name)
+                column[i:last] = column[i + 1:self._size]
+            self._size = last
+            self.version += 1
+
+    def on_event_added(self, user_id: int, event_type: str):
+        """Слушатель Database.add_event"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._last_activity[user_id] = int(time.time())
+            self.version += 1
+
+    # ------------------------------------------------------------------
+    # Вспомогательные выборки
+    # ------------------------------------------------------------------
+
+    def _columns(self) -> Tuple[np.ndarray, ...]:
+        n = self._size
+        return (self._amounts[:n], self._user_idx[:n], self._service_codes[:n],
+                self._timestamps[:n], self._months[:n])
+
+    @staticmethod
+    def _target_month(month_offset: int) -> Tuple[int, int, int]:
+        """Возвращает (ключ месяца, месяц, год) для смещения от текущего месяца (UTC)"""
+        now = datetime.now(timezone.utc)
+        key = month_key(now.year, now.month) - month_offset
+        return key, key % 12 + 1, 1970 + key // 12
+
+    def _user_totals(self, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        amounts, user_idx = self._columns()[:2]
+        if mask is not None:
+            amounts, user_idx = amounts[mask], user_idx[mask]
+        minlength = len(self._user_ids)
+        counts = np.bincount(user_idx, minlength=minlength)
+        totals = np.bincount(user_idx, weights=amounts, minlength=minlength)
+        return counts, totals
+
+    def _top_services(self, mask: Optional[np.ndarray], limit: int) -> List[Tuple[str, int]]:
+        codes = self._columns()[2]
+        if mask is not None:
+            codes = codes[mask]
+        codes = codes[codes >= 0]
+        if codes.size == 0:
+            return []
+        counts = np.bincount(codes, minlength=len(self._services))
+        order = np.argsort(-counts, kind='stable')[:limit]
+        return [(self._services[code], int(counts[code])) for code in order if counts[code] > 0]
+
+    def _user_row(self, position: int, counts: np.ndarray, totals: np.ndarray) -> Dict:
+        user = self._users[self._user_ids[position]]
+        return {
+            'user_id': user['user_id'],
+            'username': user['username'],
+            'first_name': user['first_name'],
+            'transactions_count': int(counts[position]),
+            'total_amount': float(totals[position]),
+        }
+
+    # ------------------------------------------------------------------
+    # API, совместимый с Database
+    # ------------------------------------------------------------------
+
+    def get_amount_histogram(self, month_offset: Optional[int] = None,
+                             user_id: Optional[int] = None) -> AmountHistogram:
+        """Гистограмма сумм чеков за месяц (None = за все время) и по мастеру (None = все)"""
+        self._ensure_loaded()
+        with self._lock:
+            month = self._target_month(month_offset)[0] if month_offset is not None else None
+            result = AmountHistogram()
+            for (hist_month, hist_user), histogram in self._histograms.items():
+                if month is not None and hist_month != month:
+                    continue
+                if user_id is not None and hist_user != user_id:
+                    continue
+                result.merge(histogram)
+            return result
+
+    def get_total_stats(self) -> Dict:
+        """Общая статистика бота"""
+        self._ensure_loaded()
+        with self._lock:
+            amounts = self._columns()[0]
+            cutoff = time.time() - SECONDS_PER_DAY
+            active_24h = sum(1 for last_event in self._last_activity.values() if last_event > cutoff)
+            histogram = self.get_amount_histogram()
+            return {
+                'total_users': len(self._users),
+                'total_transactions': int(amounts.size),
+                'total_amount': round(float(amounts.sum()), 2),
+                'avg_amount': round(float(amounts.mean()), 2) if amounts.size else 0.0,
+                'median_amount': round(histogram.median, 2),
+                'p90_amount': round(histogram.p90, 2),
+                'active_24h': active_24h
+            }
+
+    def get_all_users_stats(self) -> List[Dict]:
+        """Статистика всех пользователей (по убыванию количества транзакций и суммы)"""
+        self._ensure_loaded()
+        with self._lock:
+            counts, totals = self._user_totals()
+            order = np.lexsort((-totals, -counts))
+            result = []
+            for position in order:
+                row = self._user_row(int(position), counts, totals)
+                user = self._users[row['user_id']]
+                row['last_name'] = user['last_name']
+                row['total_requests'] = user['total_requests']
+                row['last_seen'] = user['last_seen']
+                result.append(row)
+            return result
+
+    def get_popular_services(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Популярные услуги за все время"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._top_services(None, limit)
+
+    def get_recent_transactions(self, limit: int = 10) -> List[Dict]:
+        """Последние транзакции"""
+        self._ensure_loaded()
+        with self._lock:
+            timestamps = self._columns()[3]
+            if timestamps.size == 0:
+                return []
+            order = np.argsort(timestamps, kind='stable')[::-1][:limit]
+            result = []
+            for i in order:
+                user = self._users[self._user_ids[self._user_idx[i]]]
+                code = self._service_codes[i]
+                result.append({
+                    'id': int(self._ids[i]),
+                    'user_id': user['user_id'],
+                    'username': user['username'],
+                    'first_name': user['first_name'],
+                    'amount': float(self._amounts[i]),
+                    'service': self._services[code] if code >= 0 else None,
+                    'timestamp': format_epoch(int(self._timestamps[i]))
+                })
+            return result
+
+    def get_daily_stats(self, days: int = 7) -> List[Dict]:
+        """Статистика по местным дням салона: сегодня и days-1 предыдущих дней (новые дни первыми)"""
+        self._ensure_loaded()
+        with self._lock:
+            amounts, _, _, timestamps, _ = self._columns()
+            recent = timestamps > int(time.time()) - (days + 1) * SECONDS_PER_DAY
+            # Местная дата меняется только на границе часа - переводим часы, а не каждую строку
+            hours, hour_index = np.unique(timestamps[recent] // 3600, return_inverse=True)
+            hour_days = np.array([datetime.fromtimestamp(int(hour) * 3600, SALON_TIMEZONE).date().toordinal()
+                                  for hour in hours], dtype=np.int64)
+            day_of = hour_days[hour_index]
+            mask = day_of > datetime.now(SALON_TIMEZONE).date().toordinal() - days
+            if not mask.any():
+                return []
+            day_numbers, inverse = np.unique(day_of[mask], return_inverse=True)
+            counts = np.bincount(inverse)
+            totals = np.bincount(inverse, weights=amounts[recent][mask])
+            return [
+                {
+                    'date': date.fromordinal(int(day_numbers[i])).isoformat(),
+                    'transactions': int(counts[i]),
+                    'total_amount': round(float(totals[i]), 2)
+                }
+                for i in range(day_numbers.size - 1, -1, -1)
+            ]
+
+    def get_monthly_top_users(self, month_offset: int = 0, limit: int = 5) -> List[Dict]:
+        """Топ пользователей за месяц"""
+        self._ensure_loaded()
+        with self._lock:
+            key = self._target_month(month_offset)[0]
+            counts, totals = self._user_totals(self._columns()[4] == key)
+            order = np.lexsort((-totals, -counts))
+            return [self._user_row(int(p), counts, totals) for p in order[:limit] if counts[p] > 0]
+
+    def get_monthly_top_services(self, month_offset: int = 0, limit: int = 5) -> List[tuple]:
+        """Топ услуг за месяц"""
+        self._ensure_loaded()
+        with self._lock:
+            key = self._target_month(month_offset)[0]
+            return self._top_services(self._columns()[4] == key, limit)
+
+    def get_monthly_extremes(self, month_offset: int = 0) -> Dict:
+        """Минимальная и максимальная транзакции за месяц"""
+        self._ensure_loaded()
+        with self._lock:
+            key = self._target_month(month_offset)[0]
+            amounts = self._columns()[0][self._columns()[4] == key]
+            if amounts.size == 0:
+                return {'min_amount': 0.0, 'max_amount': 0.0}
+            return {
+                'min_amount': float(amounts.min()),
+                'max_amount': float(amounts.max())
+            }
+
+    def get_monthly_stats(self, month_offset: int = 0) -> Dict:
+        """Статистика за месяц"""
+        self._ensure_loaded()
+        with self._lock:
+            key, month, year = self._target_month(month_offset)
+            amounts, user_idx, _, _, months = self._columns()
+            mask = months == key
+            month_amounts = amounts[mask]
+            transactions = int(month_amounts.size)
+            histogram = self.get_amount_histogram(month_offset)
+            return {
+                'month': month,
+                'year': year,
+                'transactions': transactions,
+                'total_amount': round(float(month_amounts.sum()), 2),
+                'avg_amount': round(float(month_amounts.mean()), 2) if transactions else 0.0,
+                'median_amount': round(histogram.median, 2),
+                'p90_amount': round(histogram.p90, 2),
+                'unique_users': int(np.unique(user_idx[mask]).size)
+            }
+
+
+# Создаем глобальный экземпляр и подписываем его на изменения в БД
+analytics_engine = AnalyticsEngine(db)
+db.add_listener(analytics_engine)
@@ -0,0 +1,64 @@
+"""
+Синтетические данные для бенчмарков: мастера, транзакции и события за год с лишним
+"""
+import os
+import random
+from datetime import datetime, timedelta
+
+# Размеры данных (транзакций, заголовков): BENCH_SIZES=1000,100000,1000000 - полный прогон
+BENCH_SIZES = [int(size) for size in os.getenv('BENCH_SIZES', '1000,100000').split(',')]
+
+MASTERS = 12
+FIRST_USER = 1000
+SERVICES = [None, 'LAMINACE ŘAS', 'ÚPRAVA A BARVENÍ OBOČÍ', 'ZESVĚTLENÍ OBOČÍ',
+            'BARVENÍ ŘAS', 'KOMBINACE SLUŽEB', 'DEPILACE HORNÍ RTU']
+EVENT_TYPES = ['start', 'payment_start', 'qr_generated']
+HISTORY_DAYS = 400
+
+
+def _seed_rows(size: int):
+    """Пользователи, транзакции и события за HISTORY_DAYS дней (воспроизводимо)"""
+    rng = random.Random(size)
+    now = datetime.now().replace(microsecond=0)
+    users = [(FIRST_USER + i, f'master{i}', f'Master {i}') for i in range(MASTERS)]
+
+    def timestamp():
+        return (now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+    transactions = [
+        (rng.choice(users)[0], float(rng.choice(range(300, 4000, 50))), rng.choice(SERVICES), timestamp())
+        for _ in range(size)
+    ]
+    events = [
+        (rng.choice(users)[0], rng.choice(EVENT_TYPES), None, timestamp())
+        for _ in range(size)
+    ]
+    return users, transactions, events
+
+
+def seed_database(database, size: int):
+    """Заполнить БД данными размера size и пересчитать производные таблицы"""
+    users, transactions, events = _seed_rows(size)
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        if database.db_type == 'postgresql':
+            from psycopg2.extras import execute_values
+            cursor.execute('TRUNCATE users, transactions, events, amount_buckets, daily_rollups, '
+                           'user_data, bot_lease, event_rollups RESTART IDENTITY')
+            execute_values(cursor, 'INSERT INTO users (user_id, username, first_name) VALUES %s', users)
+            execute_values(cursor, 'INSERT INTO transactions (user_id, amount, service, timestamp) VALUES %s',
+                           transactions, page_size=10000)
+            execute_values(cursor, 'INSERT INTO events (user_id, event_type, event_data, timestamp) VALUES %s',
+                           events, page_size=10000)
+        else:
+            cursor.executemany('INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?)', users)
+            cursor.executemany('INSERT INTO transactions (user_id, amount, service, timestamp) VALUES (?, ?, ?, ?)',
+                               transactions)
+            cursor.executemany('INSERT INTO events (user_id, event_type, event_data, timestamp) VALUES (?, ?, ?, ?)',
+                               events)
+        cursor.execute('ANALYZE')
+
+    # Счетчики пользователей, агрегаты и ретеншн событий - как у живой базы
+    database.reconcile_user_counters()
+    database.backfill_aggregates()
+    database.expire_events(30, '')
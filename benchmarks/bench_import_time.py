@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк времени импорта google_calendar
+Каждый замер - отдельный процесс Python (холодный импорт); сравнивается
+импорт модуля с прежним набором библиотек Google, которые он раньше
+загружал сразу
+
+Запуск: python benchmarks/bench_import_time.py [количество запусков]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCENARIOS = [
+    ('import google_calendar', 'import google_calendar'),
+    ('прежние импорты Google', (
+        'import google.auth.transport.requests, google.oauth2.credentials, '
+        'google.oauth2.service_account, google_auth_oauthlib.flow, '
+        'googleapiclient.discovery, googleapiclient.errors, dotenv'
+    )),
+    ('google_calendar + build()', (
+        'import google_calendar\n'
+        'from google.auth.credentials import AnonymousCredentials\n'
+        'google_calendar._build_service(AnonymousCredentials())'
+    )),
+]
+
+MEASURE = '''
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+'''
+
+
+def measure(code: str, runs: int) -> float:
+    """Медиана времени выполнения кода в новых процессах (секунды)"""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', MEASURE.format(code=code)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    print(f"⏱️ Холодный импорт, медиана {runs} запусков")
+
+    results = {}
+    for name, code in SCENARIOS:
+        results[name] = measure(code, runs)
+        print(f"  {name:28s} {results[name] * 1000:8.1f} ms")
+
+    saving = results['прежние импорты Google'] - results['import google_calendar']
+    print(f"  экономия при старте:          {saving * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска процедур в заголовках событий календаря
+Сравнивает автомат Ахо-Корасик с перебором ключей: прежним (первое
+совпадение) и с той же семантикой (самое длинное совпадение), а также
+на синтетических словарях разного размера
+
+Запуск: python benchmarks/bench_procedure_matcher.py [количество заголовков]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from google_calendar import (
+    PROCEDURE_PRICES, PROCEDURE_ALIASES, ProcedureMatcher, extract_procedure_from_title, normalize_text
+)
+
+CLIENT_NAMES = ['Anna', 'Marie', 'Petra Nováková', 'Elena', 'Jana', 'Tereza Svobodová']
+NOISE = ['', 'první návštěva', 'doplatek', 'VIP', 'záloha 500', 'přijde později']
+
+
+def naive_extract(title):
+    """Прежняя реализация: подстрочный поиск по каждому ключу, первое совпадение"""
+    if not title:
+        return None
+    title_lower = title.lower().strip()
+    for procedure in PROCEDURE_PRICES.keys():
+        if procedure.lower() in title_lower:
+            return procedure
+    for alias, procedure in PROCEDURE_ALIASES.items():
+        if alias.lower() in title_lower:
+            return procedure
+    return None
+
+
+def make_longest_extract(procedures, aliases):
+    """Перебор с семантикой автомата: все ключи, самое длинное совпадение"""
+    patterns = [(normalize_text(p), (len(p), 1, p)) for p in procedures]
+    patterns += [(normalize_text(a), (len(a), 0, p)) for a, p in aliases.items()]
+
+    def extract(title):
+        if not title:
+            return None
+        text = normalize_text(title)
+        best = None
+        for pattern, rank in patterns:
+            if pattern in text and (best is None or rank[:2] > best[:2]):
+                best = rank
+        return best[2] if best else None
+
+    return extract
+
+
+def synthetic_procedures(count, seed=7):
+    """Словарь из count вымышленных процедур (для оценки масштабирования)"""
+    rng = random.Random(seed)
+    words = [normalize_text(w) for key in PROCEDURE_PRICES for w in key.split() if w.isalpha()]
+    procedures = dict(PROCEDURE_PRICES)
+    while len(procedures) < count:
+        procedures[' '.join(rng.sample(words, rng.randint(2, 4)))] = 1000
+    return procedures
+
+
+def generate_titles(count, seed=42, procedures=None):
+    """Заголовки вида 'Процедура - Клиент (заметка)', часть без процедуры"""
+    rng = random.Random(seed)
+    keys = list(procedures or PROCEDURE_PRICES) + list(PROCEDURE_ALIASES)
+    titles = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            titles.append(f"Schůzka - {rng.choice(CLIENT_NAMES)}")
+            continue
+        procedure = rng.choice(keys)
+        if rng.random() < 0.3:
+            procedure = procedure.upper()
+        titles.append(f"{procedure} - {rng.choice(CLIENT_NAMES)} {rng.choice(NOISE)}".strip())
+    return titles
+
+
+def best_time(func, titles, repeats=5):
+    return min(timeit.repeat(lambda: [func(t) for t in titles], number=1, repeat=repeats))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    titles = generate_titles(count)
+    longest_extract = make_longest_extract(PROCEDURE_PRICES, PROCEDURE_ALIASES)
+
+    naive = best_time(naive_extract, titles)
+    longest = best_time(longest_extract, titles)
+    matcher = best_time(extract_procedure_from_title, titles)
+    differs = sum(1 for t in titles if naive_extract(t) != extract_procedure_from_title(t))
+
+    print(f"📊 {count} заголовков, {len(PROCEDURE_PRICES) + len(PROCEDURE_ALIASES)} ключей, лучший из 5 прогонов")
+    print(f"  перебор, первое совпадение:  {naive * 1000:8.2f} ms ({naive / count * 1e6:.2f} µs/заголовок)")
+    print(f"  перебор, самое длинное:      {longest * 1000:8.2f} ms ({longest / count * 1e6:.2f} µs/заголовок)")
+    print(f"  Ахо-Корасик:                 {matcher * 1000:8.2f} ms ({matcher / count * 1e6:.2f} µs/заголовок)")
+    print(f"  заголовков с другим (более длинным) совпадением: {differs}")
+
+    print("\n📈 Масштабирование по размеру словаря (самое длинное совпадение):")
+    for size in (50, 200, 1000):
+        procedures = synthetic_procedures(size)
+        sized_titles = generate_titles(count, procedures=procedures)
+        brute = best_time(make_longest_extract(procedures, PROCEDURE_ALIASES), sized_titles, 3)
+        automaton = best_time(ProcedureMatcher(procedures, PROCEDURE_ALIASES).match, sized_titles, 3)
+        print(f"  {size:5d} ключей: перебор {brute * 1000:8.2f} ms, "
+              f"Ахо-Корасик {automaton * 1000:8.2f} ms ({brute / automaton:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
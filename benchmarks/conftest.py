@@ -0,0 +1,61 @@
+"""
+Общие фикстуры набора бенчмарков (pytest-benchmark)
+
+Запуск (из корня репозитория):
+    python -m pytest benchmarks                                  # прогон
+    python -m pytest benchmarks --benchmark-save=baseline        # сохранить baseline
+    python -m pytest benchmarks --benchmark-compare              # сравнить с последним сохраненным;
+                                                                 # регрессия хуже порога - ошибка
+Переменные окружения:
+    BENCH_SIZES                 - размеры данных (транзакций), по умолчанию 1000,100000;
+                                  1000,100000,1000000 - полный прогон
+    BENCH_REGRESSION_THRESHOLD  - порог для --benchmark-compare, по умолчанию median:20%
+    DATABASE_URL                - PostgreSQL (например, локальный контейнер) вместо SQLite;
+                                  вместе с DATABASE_SSLMODE=disable. Таблицы будут очищены!
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# Модули бота создают глобальную БД при импорте - не трогаем bot_stats.db в рабочей папке
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench_import.db'))
+
+import pytest
+from pytest_benchmark.utils import parse_compare_fail
+
+from bench_data import BENCH_SIZES, seed_database
+
+REGRESSION_THRESHOLD = os.getenv('BENCH_REGRESSION_THRESHOLD', 'median:20%')
+
+# Baseline'ы хранятся рядом с бенчмарками (по папке на машину/интерпретатор)
+BASELINE_STORAGE = 'file://' + os.path.join(BENCH_DIR, '.baselines')
+
+
+def pytest_configure(config):
+    """Хранилище baseline'ов и порог регрессии по умолчанию"""
+    if config.getoption('benchmark_storage', None) == 'file://./.benchmarks':
+        config.option.benchmark_storage = BASELINE_STORAGE
+    if config.getoption('benchmark_compare', None) and not config.getoption('benchmark_compare_fail', None):
+        config.option.benchmark_compare_fail = [parse_compare_fail(REGRESSION_THRESHOLD)]
+
+
+@pytest.fixture(scope='session', params=BENCH_SIZES, ids=lambda size: f'{size}tx')
+def seeded_db(request, tmp_path_factory):
+    """Database с size транзакциями и событиями (SQLite - отдельный файл на размер)"""
+    from database import Database
+
+    size = request.param
+    previous = os.environ.get('DATABASE_PATH')
+    os.environ['DATABASE_PATH'] = str(tmp_path_factory.mktemp('db') / f'bench_{size}.db')
+    try:
+        database = Database()
+    finally:
+        os.environ['DATABASE_PATH'] = previous
+    seed_database(database, size)
+    database.size = size
+    yield database
+    database.close()
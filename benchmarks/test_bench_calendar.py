@@ -0,0 +1,19 @@
+"""
+Бенчмарки поиска процедуры в заголовках событий календаря
+(заголовки - как в bench_procedure_matcher.py)
+"""
+import pytest
+
+from bench_data import BENCH_SIZES
+from bench_procedure_matcher import generate_titles
+from google_calendar import extract_procedure_from_title
+
+
+@pytest.mark.parametrize('count', BENCH_SIZES, ids=lambda count: f'{count}titles')
+def test_extract_procedure_from_title(benchmark, count):
+    benchmark.group = 'calendar-extract-procedure'
+    titles = generate_titles(count)
+
+    matched = benchmark(lambda: [extract_procedure_from_title(title) for title in titles])
+
+    assert sum(1 for procedure in matched if procedure) > count // 2
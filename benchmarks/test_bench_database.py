@@ -0,0 +1,82 @@
+"""
+Бенчмарки методов Database на заполненной базе (1k / 100k / 1M транзакций)
+"""
+import itertools
+from datetime import datetime
+
+import pytest
+
+from bench_data import FIRST_USER, MASTERS
+
+# Чтение: имя метода -> вызов на заполненной базе
+READ_CALLS = {
+    'get_user_stats': lambda db: db.get_user_stats(FIRST_USER),
+    'get_all_users_stats': lambda db: db.get_all_users_stats(),
+    'get_total_stats': lambda db: db.get_total_stats(),
+    'get_recent_transactions': lambda db: db.get_recent_transactions(10),
+    'get_transaction_by_id': lambda db: db.get_transaction_by_id(db.size // 2),
+    'get_all_users': lambda db: db.get_all_users(),
+    'get_all_transactions': lambda db: db.get_all_transactions(),
+    'get_last_activity': lambda db: db.get_last_activity(),
+    'get_amount_histogram': lambda db: db.get_amount_histogram(0, FIRST_USER),
+    'get_popular_services': lambda db: db.get_popular_services(10),
+    'get_daily_stats': lambda db: db.get_daily_stats(7),
+    'get_daily_rollup': lambda db: db.get_daily_rollup(datetime.now().strftime('%Y-%m-%d')),
+    'get_user_state': lambda db: db.get_user_state(FIRST_USER),
+    'get_lease': lambda db: db.get_lease('qr_bot'),
+    'get_monthly_top_users': lambda db: db.get_monthly_top_users(0, 5),
+    'get_monthly_top_services': lambda db: db.get_monthly_top_services(0, 5),
+    'get_monthly_extremes': lambda db: db.get_monthly_extremes(0),
+    'get_monthly_stats': lambda db: db.get_monthly_stats(0),
+    'reconcile_user_counters': lambda db: db.reconcile_user_counters(),
+    'init_db': lambda db: db.init_db(),
+    'backfill_aggregates': lambda db: db.backfill_aggregates(),
+}
+
+_counter = itertools.count()
+
+# Запись: каждая итерация добавляет строку (таблица растет на число раундов - мало по сравнению с размером)
+WRITE_CALLS = {
+    'add_or_update_user': lambda db: db.add_or_update_user(FIRST_USER + next(_counter) % MASTERS, 'master', 'Master'),
+    'add_transaction': lambda db: db.add_transaction(FIRST_USER, 1400.0, 'LAMINACE ŘAS'),
+    'add_event': lambda db: db.add_event(FIRST_USER, 'payment_start'),
+    'save_user_states': lambda db: db.save_user_states(
+        {FIRST_USER + i: {'amount': 1400.0, 'waiting_for_service': True} for i in range(MASTERS)}),
+    'acquire_lease': lambda db: db.acquire_lease('bench', 'holder', 15),
+    'release_lease': lambda db: db.release_lease('bench', 'nobody'),
+    'expire_events': lambda db: db.expire_events(30, ''),
+}
+
+
+@pytest.mark.parametrize('method', sorted(READ_CALLS))
+def test_read(benchmark, seeded_db, method):
+    benchmark.group = f'db-read-{method}'
+    benchmark(READ_CALLS[method], seeded_db)
+
+
+@pytest.mark.parametrize('method', sorted(WRITE_CALLS))
+def test_write(benchmark, seeded_db, method):
+    benchmark.group = f'db-write-{method}'
+    benchmark(WRITE_CALLS[method], seeded_db)
+
+
+def test_delete_transaction(benchmark, seeded_db):
+    """Удаление свежей транзакции (с откатом счетчиков и агрегатов)"""
+    benchmark.group = 'db-write-delete_transaction'
+
+    def setup():
+        return (seeded_db.add_transaction(FIRST_USER, 700.0, 'BARVENÍ ŘAS'),), {}
+
+    benchmark.pedantic(seeded_db.delete_transaction, setup=setup, rounds=50)
+
+
+def test_every_method_benchmarked():
+    """Новый публичный метод Database должен попасть в бенчмарки"""
+    from database import Database, _UNTIMED_METHODS
+
+    public = {name for name, member in vars(Database).items()
+              if not name.startswith('_') and name not in _UNTIMED_METHODS and callable(member)
+              and not isinstance(member, (staticmethod, classmethod))}
+    covered = set(READ_CALLS) | set(WRITE_CALLS) | {'delete_transaction'}
+
+    assert public - covered == set()
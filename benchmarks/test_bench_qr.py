@@ -0,0 +1,43 @@
+"""
+Бенчмарки генерации QR-кодов: рендер PNG и ответ из кэша
+Payload'ы от короткого (сумма без услуги) до длинной услуги, введенной вручную -
+версия QR и размер картинки растут вместе с длиной строки
+"""
+import pytest
+
+import qr
+
+PAYLOADS = {
+    'amount-only': (500, None),
+    'service': (1400, 'LAMINACE ŘAS'),
+    'decimal-long-service': (1234.5, 'ÚPRAVA A BARVENÍ OBOČÍ + LAMINACE ŘAS'),
+    'custom-service-max': (18500, 'KOMBINACE SLUŽEB ' * 8),
+}
+
+
+@pytest.mark.parametrize('payload', sorted(PAYLOADS))
+def test_render_qr_png(benchmark, payload):
+    """Рендер без кэша (промах)"""
+    benchmark.group = 'qr-render'
+    qr_text = qr.build_qr_payload(*PAYLOADS[payload])
+
+    png = benchmark(qr.render_qr_png, qr_text)
+
+    assert png.startswith(b'\x89PNG')
+
+
+@pytest.mark.parametrize('payload', sorted(PAYLOADS))
+def test_generate_qr_code_cached(benchmark, payload):
+    """generate_qr_code при попадании в кэш (повторная сумма и услуга)"""
+    benchmark.group = 'qr-generate-cached'
+    qr.generate_qr_code(*PAYLOADS[payload])
+
+    image = benchmark(qr.generate_qr_code, *PAYLOADS[payload])
+
+    assert image.getbuffer().nbytes > 0
+
+
+@pytest.mark.parametrize('payload', sorted(PAYLOADS))
+def test_build_qr_payload(benchmark, payload):
+    benchmark.group = 'qr-payload'
+    benchmark(qr.build_qr_payload, *PAYLOADS[payload])
@@ -0,0 +1,66 @@
+"""
+Бенчмарки клавиатур и форматирования отчетов статистики
+Отчеты рендерятся из снимка результатов запросов: замеряется только
+форматирование, запросы к БД - в test_bench_database.py
+"""
+import pytest
+
+import qr
+import reports
+
+
+class QuerySnapshot:
+    """Источник статистики, отвечающий сохраненными результатами запросов к БД"""
+
+    def __init__(self, source):
+        self._source = source
+        self._results = {}
+
+    def __getattr__(self, name):
+        method = getattr(self._source, name)
+
+        def call(*args):
+            key = (name, args)
+            if key not in self._results:
+                self._results[key] = method(*args)
+            return self._results[key]
+
+        return call
+
+
+KEYBOARDS = {
+    'main': lambda: qr.get_main_keyboard(False),
+    'main-admin': lambda: qr.get_main_keyboard(True),
+    'admin': qr.get_admin_keyboard,
+    'amount': qr.get_amount_keyboard,
+    'services-low': lambda: qr.get_services_keyboard(500),
+    'services-high': lambda: qr.get_services_keyboard(1800),
+    'services-all': lambda: qr.get_services_keyboard(),
+}
+
+
+@pytest.mark.parametrize('keyboard', sorted(KEYBOARDS))
+def test_keyboard(benchmark, keyboard):
+    benchmark.group = 'keyboards'
+    benchmark(KEYBOARDS[keyboard])
+
+
+def test_stats_overview(benchmark, seeded_db):
+    benchmark.group = 'report-stats-overview'
+    snapshot = QuerySnapshot(seeded_db)
+    reports._render_stats_overview(snapshot, seeded_db.db_type)
+
+    text = benchmark(reports._render_stats_overview, snapshot, seeded_db.db_type)
+
+    assert 'Топ мастеров' in text
+
+
+@pytest.mark.parametrize('month_offset', [0, 1])
+def test_month_stats(benchmark, seeded_db, month_offset):
+    benchmark.group = 'report-month-stats'
+    snapshot = QuerySnapshot(seeded_db)
+    reports._render_month_stats(snapshot, month_offset)
+
+    text = benchmark(reports._render_month_stats, snapshot, month_offset)
+
+    assert 'Распределение чеков' in text
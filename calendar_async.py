@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Асинхронный клиент Google Calendar API
+Забирает расписания нескольких календарей (у каждого мастера свой) параллельно
+через одну пулированную aiohttp сессию; OAuth токен переиспользуется между запросами
+"""
+
+import asyncio
+import os
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+import aiohttp
+
+from calendar_cache import CALENDAR_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_API_URL = 'https://www.googleapis.com/calendar/v3'
+
+# Календари мастеров через запятую (по умолчанию - основной календарь салона)
+CALENDAR_IDS = [cid.strip() for cid in
+                os.getenv('GOOGLE_CALENDAR_IDS', os.getenv('GOOGLE_CALENDAR_ID', 'primary')).split(',')
+                if cid.strip()]
+
+# Максимум одновременных соединений к API и событий на страницу
+MAX_CONNECTIONS = 10
+PAGE_SIZE = 250
+
+# Токен обновляется заранее, за столько секунд до истечения
+TOKEN_REFRESH_MARGIN = 60
+
+
+def _event_start(event: Dict) -> datetime:
+    """Время начала события для сортировки (весь день - полночь по времени салона)"""
+    start = event.get('start', {})
+    if 'dateTime' in start:
+        start_time = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
+        if start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=CALENDAR_TIMEZONE)
+        return start_time
+    if 'date' in start:
+        return datetime.combine(date.fromisoformat(start['date']), datetime.min.time(), CALENDAR_TIMEZONE)
+    return datetime.max.replace(tzinfo=CALENDAR_TIMEZONE)
+
+
+class AsyncCalendarClient:
+    """Асинхронный клиент Calendar API v3 (только чтение событий)"""
+
+    def __init__(self, credentials: Any, base_url: str = CALENDAR_API_URL,
+                 max_connections: int = MAX_CONNECTIONS):
+        """
+        Args:
+            credentials: учетные данные google.auth (token, expiry, refresh(request))
+            base_url: адрес API (в тестах - локальный stub сервер)
+            max_connections: размер пула соединений
+        """
+        self.credentials = credentials
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token_lock = asyncio.Lock()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия с пулом keep-alive соединений"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=15, sock_connect=5)
+            )
+        return self._session
+
+    def _token_is_fresh(self) -> bool:
+        if not getattr(self.credentials, 'token', None):
+            return False
+        expiry = getattr(self.credentials, 'expiry', None)
+        if expiry is None:
+            return True
+        # google.auth хранит expiry как naive UTC
+        return expiry - timedelta(seconds=TOKEN_REFRESH_MARGIN) > datetime.now(timezone.utc).replace(tzinfo=None)
+
+    async def _get_token(self, force_refresh: bool = False) -> str:
+        """Токен доступа; обновление - один раз для всех параллельных запросов"""
+        if not force_refresh and self._token_is_fresh():
+            return self.credentials.token
+
+        async with self._token_lock:
+            if force_refresh or not self._token_is_fresh():
+                from google.auth.transport.requests import Request
+                await asyncio.to_thread(self.credentials.refresh, Request())
+                logger.info("🔑 Calendar access token refreshed")
+        return self.credentials.token
+
+    async def list_events(self, calendar_id: str, time_min: datetime, time_max: datetime) -> List[Dict]:
+        """События календаря в интервале (все страницы)"""
+        session = await self._get_session()
+        url = f"{self.base_url}/calendars/{quote(calendar_id, safe='')}/events"
+        params = {
+            'timeMin': time_min.isoformat(),
+            'timeMax': time_max.isoformat(),
+            'singleEvents': 'true',
+            'orderBy': 'startTime',
+            'maxResults': str(PAGE_SIZE),
+        }
+
+        events = []
+        retried = False
+        while True:
+            token = await self._get_token()
+            async with session.get(url, params=params, headers={'Authorization': f'Bearer {token}'}) as response:
+                if response.status == 401 and not retried:
+                    # Токен отозван раньше срока - обновляем и повторяем страницу
+                    retried = True
+                    await self._get_token(force_refresh=True)
+                    continue
+                response.raise_for_status()
+                data = await response.json()
+
+            for event in data.get('items', []):
+                event['calendarId'] = calendar_id
+                events.append(event)
+
+            page_token = data.get('nextPageToken')
+            if not page_token:
+                return events
+            params['pageToken'] = page_token
+
+    async def fetch_agendas(self, calendar_ids: Sequence[str], day: Optional[date] = None) -> List[Dict]:
+        """Расписание всех календарей за день одним списком, отсортированным по началу
+
+        Календари запрашиваются параллельно; недоступный календарь пропускается
+        (ошибка пишется в лог), остальные расписания возвращаются.
+        """
+        day = day or datetime.now(CALENDAR_TIMEZONE).date()
+        time_min = datetime.combine(day, datetime.min.time(), CALENDAR_TIMEZONE)
+        time_max = time_min + timedelta(days=1)
+
+        results = await asyncio.gather(
+            *(self.list_events(calendar_id, time_min, time_max) for calendar_id in calendar_ids),
+            return_exceptions=True
+        )
+
+        events = []
+        for calendar_id, result in zip(calendar_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to fetch calendar {calendar_id}: {result}")
+                continue
+            events.extend(result)
+
+        events.sort(key=_event_start)
+        return events
+
+    async def close(self):
+        """Закрыть сессию (при остановке бота)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def create_calendar_client() -> Optional[AsyncCalendarClient]:
+    """Клиент на учетных данных основного сервиса (None, если аутентификация не удалась)"""
+    from google_calendar import get_calendar_service
+
+    calendar_service = get_calendar_service()
+    if not calendar_service.creds and not calendar_service.authenticate():
+        return None
+    return AsyncCalendarClient(calendar_service.creds)
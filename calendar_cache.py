@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Локальный кэш событий Google Calendar
+Раз в день - полная выгрузка окна [timeMin, timeMax], в течение дня - инкрементальные
+обновления по syncToken (Calendar API не принимает timeMax вместе с syncToken, поэтому
+окно сдвигается только полной синхронизацией). Кэш хранится в JSON файле и переживает
+перезапуск; get_events(day) отвечает из памяти без запросов к API
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# Файл кэша и глубина хранения прошедших событий
+CALENDAR_CACHE_FILE = os.getenv('CALENDAR_CACHE_FILE', 'calendar_cache.json')
+CALENDAR_PAST_DAYS = 7
+
+# Горизонт будущих событий (дни): повторяющиеся события разворачиваются (singleEvents) только до него
+CALENDAR_FUTURE_DAYS = int(os.getenv('CALENDAR_FUTURE_DAYS', '60'))
+CALENDAR_TIMEZONE = ZoneInfo(os.getenv('CALENDAR_TIMEZONE', 'Europe/Prague'))
+
+# Максимум событий на страницу (ограничение Calendar API - 2500)
+PAGE_SIZE = 250
+
+
+def _is_sync_token_expired(error: Exception) -> bool:
+    """HttpError 410 Gone: syncToken устарел, нужна полная синхронизация"""
+    resp = getattr(error, 'resp', None)
+    return getattr(resp, 'status', None) == 410
+
+
+def _event_days(event: Dict) -> List[date]:
+    """Дни (по времени салона), на которые приходится событие"""
+    start = event.get('start', {})
+    end = event.get('end', {})
+
+    if 'dateTime' in start:
+        start_time = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
+        if start_time.tzinfo is not None:
+            start_time = start_time.astimezone(CALENDAR_TIMEZONE)
+        return [start_time.date()]
+
+    if 'date' in start:
+        # Событие на весь день: end.date не включается
+        first = date.fromisoformat(start['date'])
+        last = date.fromisoformat(end['date']) if 'date' in end else first + timedelta(days=1)
+        return [first + timedelta(days=i) for i in range(max((last - first).days, 1))]
+
+    return []
+
+
+def _start_key(event: Dict) -> str:
+    """Ключ сортировки по времени начала (события на весь день - первыми)"""
+    start = event.get('start', {})
+    return start.get('dateTime') or start.get('date') or ''
+
+
+class CalendarEventCache:
+    """Кэш событий одного календаря с инкрементальной синхронизацией"""
+
+    def __init__(self, events_api: Callable[[], Any], calendar_id: str,
+                 cache_file: Optional[str] = None, past_days: int = CALENDAR_PAST_DAYS,
+                 future_days: int = CALENDAR_FUTURE_DAYS):
+        """
+        Args:
+            events_api: функция, возвращающая ресурс service.events() (или None, если API недоступен)
+            calendar_id: ID календаря
+            cache_file: путь к JSON файлу кэша (None - только в памяти)
+            past_days: сколько дней прошедших событий хранить
+            future_days: на сколько дней вперед выгружать события
+        """
+        self._events_api = events_api
+        self.calendar_id = calendar_id
+        self.cache_file = cache_file
+        self.past_days = past_days
+        self.future_days = future_days
+
+        self.sync_token: Optional[str] = None
+        self.last_sync: Optional[float] = None
+        self.window_day: Optional[str] = None  # День последней полной синхронизации (начало окна)
+        self._events: Dict[str, Dict] = {}
+        self._by_day: Dict[date, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._file_mtime: Optional[float] = None  # Версия файла, из которой загружен кэш
+
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Синхронизация
+    # ------------------------------------------------------------------
+
+    def sync(self) -> int:
+        """Синхронизировать кэш с календарем
+
+        Returns:
+            Количество полученных (измененных) событий
+        """
+        api = self._events_api()
+        if api is None:
+            return 0
+
+        # Новый день - окно сдвинулось: полная синхронизация подтянет дни, вошедшие в горизонт
+        today = datetime.now(CALENDAR_TIMEZONE).date().isoformat()
+        if self.sync_token and self.window_day == today:
+            try:
+                return self._sync(api, full=False)
+            except Exception as e:
+                if not _is_sync_token_expired(e):
+                    raise
+                logger.info("📅 Calendar sync token expired, running full sync")
+
+        return self._sync(api, full=True)
+
+    def _sync(self, api, full: bool) -> int:
+        params = {'calendarId': self.calendar_id, 'singleEvents': True, 'maxResults': PAGE_SIZE}
+        if full:
+            today = datetime.now(CALENDAR_TIMEZONE).date()
+            time_min = datetime.combine(today - timedelta(days=self.past_days), dt_time.min, CALENDAR_TIMEZONE)
+            time_max = datetime.combine(today + timedelta(days=self.future_days + 1), dt_time.min, CALENDAR_TIMEZONE)
+            params['timeMin'] = time_min.isoformat()
+            params['timeMax'] = time_max.isoformat()
+        else:
+            params['syncToken'] = self.sync_token
+
+        items = []
+        next_sync_token = None
+        page_token = None
+        while True:
+            if page_token:
+                params['pageToken'] = page_token
+            response = api.list(**params).execute()
+            items.extend(response.get('items', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                next_sync_token = response.get('nextSyncToken')
+                break
+
+        with self._lock:
+            events = {} if full else dict(self._events)
+            for item in items:
+                if item.get('status') == 'cancelled':
+                    events.pop(item['id'], None)
+                else:
+                    events[item['id']] = item
+
+            self._events = events
+            self.sync_token = next_sync_token
+            if full:
+                self.window_day = today.isoformat()
+            self.last_sync = time.time()
+            self._prune()
+            self._reindex()
+
+        self._save()
+        logger.info(f"📅 Calendar {'full' if full else 'incremental'} sync: {len(items)} event(s) received")
+        return len(items)
+
+    def _prune(self):
+        """Убрать события вне окна: старше past_days и дальше future_days
+        (инкрементальная синхронизация присылает изменения и за горизонтом)
+        """
+        today = datetime.now(CALENDAR_TIMEZONE).date()
+        cutoff = today - timedelta(days=self.past_days)
+        horizon = today + timedelta(days=self.future_days)
+        stale = [event_id for event_id, event in self._events.items()
+                 if all(day < cutoff or day > horizon for day in _event_days(event))]
+        for event_id in stale:
+            del self._events[event_id]
+
+    def _reindex(self):
+        """Пересобрать индекс по дням (новый словарь подменяет старый целиком)"""
+        by_day: Dict[date, List[Dict]] = {}
+        for event in self._events.values():
+            for day in _event_days(event):
+                by_day.setdefault(day, []).append(event)
+        for events in by_day.values():
+            events.sort(key=_start_key)
+        self._by_day = by_day
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    def get_events(self, day: Optional[date] = None) -> List[Dict]:
+        """События за день (по умолчанию - сегодня) из кэша, отсортированные по началу"""
+        day = day or datetime.now(CALENDAR_TIMEZONE).date()
+        return list(self._by_day.get(day, ()))
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    # ------------------------------------------------------------------
+    # Хранение в файле
+    # ------------------------------------------------------------------
+
+    def reload(self) -> bool:
+        """Перечитать файл кэша, если его обновил другой процесс (воркеры scale-out режима
+        не синхронизируются с API сами - файл пишет основной экземпляр)
+
+        Returns:
+            True, если кэш загружен заново
+        """
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return False
+        if os.path.getmtime(self.cache_file) == self._file_mtime:
+            return False
+        with self._lock:
+            self._load()
+        return True
+
+    def _load(self):
+        """Загрузить кэш из файла (если он от этого же календаря)"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+
+        try:
+            self._file_mtime = os.path.getmtime(self.cache_file)
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Calendar cache file is unreadable, ignoring: {e}")
+            return
+
+        if data.get('calendar_id') != self.calendar_id:
+            return
+
+        self._events = {event['id']: event for event in data.get('events', [])}
+        self.sync_token = data.get('sync_token')
+        self.last_sync = data.get('last_sync')
+        self.window_day = data.get('window_day')
+        self._prune()
+        self._reindex()
+        logger.info(f"📅 Calendar cache loaded: {len(self._events)} event(s)")
+
+    def _save(self):
+        """Сохранить кэш атомарно (запись во временный файл + rename)"""
+        if not self.cache_file:
+            return
+
+        data = {
+            'calendar_id': self.calendar_id,
+            'sync_token': self.sync_token,
+            'last_sync': self.last_sync,
+            'window_day': self.window_day,
+            'events': list(self._events.values()),
+        }
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+            self._file_mtime = os.path.getmtime(self.cache_file)
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to save calendar cache: {e}")
+
+
+def _google_events_api():
+    """Ресурс events() аутентифицированного сервиса Google Calendar"""
+    from google_calendar import get_calendar_service
+
+    calendar_service = get_calendar_service()
+    if not calendar_service.service and not calendar_service.authenticate():
+        return None
+    return calendar_service.service.events()
+
+
+# Кэш календаря салона (используется в боте)
+calendar_cache = CalendarEventCache(
+    _google_events_api,
+    os.getenv('GOOGLE_CALENDAR_ID', 'primary'),
+    CALENDAR_CACHE_FILE
+)
+
+
+def get_events(day: Optional[date] = None) -> List[Dict]:
+    """События за день из кэша календаря салона"""
+    return calendar_cache.get_events(day)
@@ -4,14 +4,22 @@
 Поддерживает PostgreSQL (для Render) и SQLite (для локальной разработки)
 """
 
+import gzip
+import json
 import logging
 import os
 import sqlite3
+import threading
 import time
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
 from typing import Optional, Dict, List, Tuple
 from contextlib import contextmanager
 from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+
+from amount_histogram import AmountHistogram, bucket_for, BUCKET_WIDTH, OVERFLOW_BUCKET
+from metrics import timed_db_method
+from tracing import traced, tracer
 
 logger = logging.getLogger(__name__)
 
@@ -38,20 +46,89 @@ else:
 
 logger.info(f"📊 Database type: {DB_TYPE}")
 
+# Максимум соединений в пуле PostgreSQL (в scale-out режиме делится между воркерами)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '3'))
+
+# Сколько дней хранить сырые события (старые дни сворачиваются в event_rollups), 0 - хранить все
+EVENTS_RETENTION_DAYS = int(os.getenv('EVENTS_RETENTION_DAYS', '30'))
+
+# Папка для архива удаляемых событий (gzip JSONL, файл на день), пусто - без архива
+EVENTS_ARCHIVE_DIR = os.getenv('EVENTS_ARCHIVE_DIR', '')
+
+# На сколько дней вперед создаются дневные партиции events (PostgreSQL)
+EVENTS_PARTITIONS_AHEAD = 7
+
+# Часовой пояс салона: дневные агрегаты ведутся по местной дате (время в БД - UTC)
+SALON_TIMEZONE = ZoneInfo('Europe/Prague')
+
+# Миграции схемы по порядку: (версия, описание, метод Database)
+# Изменения схемы добавляются только новой миграцией в конец списка
+MIGRATIONS = [
+    (1, 'users, transactions, events', '_migrate_base_tables'),
+    (2, 'user transaction counters', '_migrate_user_counters'),
+    (3, 'amount histograms', '_migrate_amount_buckets'),
+    (4, 'daily rollups', '_migrate_daily_rollups'),
+    (5, 'conversation state', '_migrate_user_data'),
+    (6, 'single instance lease', '_migrate_bot_lease'),
+    (7, 'event rollups', '_migrate_event_rollups'),
+    (8, 'events timestamp index', '_migrate_events_timestamp_index'),
+    (9, 'events partitioned by day', '_migrate_events_partitions'),
+    (10, 'daily rollups by salon date', '_migrate_daily_rollups_salon_day'),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Ключ pg_advisory_xact_lock: миграции применяет один экземпляр
+MIGRATION_LOCK_ID = 4242001
+
+# Ошибка запроса к несуществующей таблице (schema_version в базе до версионирования)
+MISSING_TABLE_ERRORS = (sqlite3.OperationalError,) + ((psycopg2.ProgrammingError,) if POSTGRESQL_AVAILABLE else ())
+
+
+def salon_day(timestamp) -> str:
+    """Местная дата салона YYYY-MM-DD для времени из БД (строка SQLite или datetime, UTC)"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(SALON_TIMEZONE).strftime('%Y-%m-%d')
+
 
 class Database:
     """Универсальный класс для работы с базой данных"""
     
-    def __init__(self):
-        """Инициализация базы данных"""
-        self.db_type = DB_TYPE
+    def __init__(self, connect: bool = True):
+        """Инициализация базы данных
         
-        if self.db_type == 'postgresql' and POSTGRESQL_AVAILABLE:
-            self._init_postgresql()
-        else:
-            self._init_sqlite()
+        Args:
+            connect: False - подключение и схема откладываются до connect()
+                     или первого запроса (не блокирует импорт и старт бота)
+        """
+        self.db_type = DB_TYPE
+        self._listeners = []
+        self.connected = False
+        self.schema_version = 0
+        self._connecting = False
+        self._connect_lock = threading.RLock()
         
-        self.init_db()
+        if connect:
+            self.connect()
+    
+    def connect(self):
+        """Подключиться и применить схему (один раз; параллельные вызовы ждут первый)"""
+        with self._connect_lock:
+            # Повторный вход из init_db того же потока - подключение уже создано
+            if self.connected or self._connecting:
+                return
+            self._connecting = True
+            try:
+                if self.db_type == 'postgresql' and POSTGRESQL_AVAILABLE:
+                    self._init_postgresql()
+                else:
+                    self._init_sqlite()
+                self.init_db()
+                self.connected = True
+            finally:
+                self._connecting = False
     
     def _init_postgresql(self):
         """Инициализация PostgreSQL с retry механизмом"""
@@ -64,7 +141,7 @@ class Database:
             'database': url.path[1:],  # Убираем первый /
             'user': url.username,
             'password': url.password,
-            'sslmode': 'require',  # Supabase требует SSL
+            'sslmode': os.getenv('DATABASE_SSLMODE', 'require'),  # Supabase требует SSL (disable - локальный PostgreSQL)
             'connect_timeout': 10,  # Таймаут подключения
             'keepalives': 1,  # Включить TCP keepalive
             'keepalives_idle': 10,  # Начать keepalive через 10 сек (было 30)
@@ -82,7 +159,7 @@ class Database:
             try:
                 self.pool = psycopg2.pool.ThreadedConnectionPool(
                     minconn=1,
-                    maxconn=3,  # Уменьшено с 5 до 3 (Pool Size = 15 на Nano compute)
+                    maxconn=DB_POOL_SIZE,  # По умолчанию 3 (Pool Size = 15 на Nano compute)
                     **self.pg_config
                 )
                 logger.info(f"✅ Connected to PostgreSQL: {self.pg_config['database']}")
@@ -108,10 +185,13 @@ class Database:
     @contextmanager
     def get_connection(self):
         """Контекстный менеджер для работы с подключением (с retry механизмом)"""
+        if not self.connected:
+            self.connect()
         if self.db_type == 'postgresql':
             conn = None
             max_retries = 3
             retry_delay = 0.5  # Начальная задержка в секундах
+            acquire_started = time.perf_counter()
             
             for attempt in range(max_retries):
                 try:
@@ -140,7 +220,8 @@ class Database:
                         else:
                             raise
                     
-                    # Соединение живое, используем его
+                    # Соединение живое, используем его (span: ожидание пула, проверка и повторы)
+                    tracer.record('db.connection', acquire_started, attempts=attempt + 1)
                     yield conn
                     conn.commit()
                     break  # Успешно выполнили, выходим из цикла
@@ -182,6 +263,25 @@ class Database:
             finally:
                 conn.close()
     
+    def add_listener(self, listener):
+        """Подписать слушателя на изменения данных
+        
+        Слушатель может реализовать любые из методов:
+        on_user_updated, on_transaction_added, on_transaction_deleted, on_event_added
+        """
+        self._listeners.append(listener)
+    
+    def _notify(self, event: str, *args):
+        """Оповестить слушателей (ошибки слушателей не ломают запись в БД)"""
+        for listener in self._listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                handler(*args)
+            except Exception as e:
+                logger.error(f"Listener {type(listener).__name__}.{event} failed: {e}")
+    
     def _get_cursor(self, conn):
         """Получить cursor с правильным типом для текущей БД"""
         if self.db_type == 'postgresql':
@@ -190,98 +290,502 @@ class Database:
             return conn.cursor()
     
     def init_db(self):
-        """Инициализация таблиц базы данных"""
+        """Схема базы данных по версиям
+        
+        При актуальной схеме - одно чтение schema_version. Иначе недостающие
+        миграции применяются по порядку в одной транзакции (на PostgreSQL - под
+        advisory lock, чтобы два экземпляра при деплое не мигрировали одновременно)
+        """
         with self.get_connection() as conn:
             cursor = self._get_cursor(conn)
+            self.schema_version = self._read_schema_version(conn, cursor)
+            if self.schema_version >= SCHEMA_VERSION:
+                return
             
             if self.db_type == 'postgresql':
-                # PostgreSQL синтаксис
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id BIGINT PRIMARY KEY,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        total_requests INTEGER DEFAULT 0,
-                        is_admin BOOLEAN DEFAULT FALSE
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS transactions (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        amount DECIMAL(10,2) NOT NULL,
-                        service TEXT,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id)
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS events (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        event_type TEXT NOT NULL,
-                        event_data TEXT,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id)
-                    )
-                ''')
-                
-                # Индексы
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions(user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_user ON events(user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_type ON events(event_type)')
-                
-            else:
-                # SQLite синтаксис
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INTEGER PRIMARY KEY,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        total_requests INTEGER DEFAULT 0,
-                        is_admin BOOLEAN DEFAULT 0
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS transactions (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        amount REAL NOT NULL,
-                        service TEXT,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id)
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS events (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        event_type TEXT NOT NULL,
-                        event_data TEXT,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id)
-                    )
-                ''')
-                
-                # Индексы
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions(user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_user ON events(user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_type ON events(event_type)')
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Другой экземпляр мог применить миграции, пока мы ждали блокировку
+            cursor.execute('SELECT MAX(version) as version FROM schema_version')
+            current = cursor.fetchone()['version'] or 0
+            
+            applied = []
+            for version, description, migration in MIGRATIONS:
+                if version <= current:
+                    continue
+                getattr(self, migration)(cursor)
+                cursor.execute(
+                    'INSERT INTO schema_version (version, description) VALUES (%s, %s)' if self.db_type == 'postgresql' else
+                    'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                    (version, description)
+                )
+                applied.append(version)
             
             conn.commit()
-            logger.info(f"Database initialized successfully")
+            self.schema_version = max(current, SCHEMA_VERSION)
+            if applied:
+                logger.info(f"🗄️ Schema migrated {current} → {self.schema_version}: applied {applied}")
+    
+    def _read_schema_version(self, conn, cursor) -> int:
+        """Текущая версия схемы (0 - база до версионирования или пустая)"""
+        try:
+            cursor.execute('SELECT MAX(version) as version FROM schema_version')
+            return cursor.fetchone()['version'] or 0
+        except MISSING_TABLE_ERRORS:
+            # PostgreSQL: ошибка прерывает транзакцию
+            conn.rollback()
+            return 0
+    
+    # ------------------------------------------------------------------
+    # Миграции (см. MIGRATIONS): каждая идемпотентна - базы, созданные до
+    # версионирования, проходят все миграции с начала без потери данных
+    # ------------------------------------------------------------------
+    
+    def _migrate_base_tables(self, cursor):
+        """Пользователи, транзакции, события и их индексы"""
+        if self.db_type == 'postgresql':
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id BIGINT PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    last_name TEXT,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    total_requests INTEGER DEFAULT 0,
+                    is_admin BOOLEAN DEFAULT FALSE,
+                    transactions_count INTEGER NOT NULL DEFAULT 0,
+                    total_amount DECIMAL(12,2) NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id SERIAL PRIMARY KEY,
+                    user_id BIGINT NOT NULL,
+                    amount DECIMAL(10,2) NOT NULL,
+                    service TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id SERIAL PRIMARY KEY,
+                    user_id BIGINT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    event_data TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                )
+            ''')
+        else:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    last_name TEXT,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    total_requests INTEGER DEFAULT 0,
+                    is_admin BOOLEAN DEFAULT 0,
+                    transactions_count INTEGER NOT NULL DEFAULT 0,
+                    total_amount REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    amount REAL NOT NULL,
+                    service TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    event_data TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                )
+            ''')
+        
+        # Индексы
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions(user_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_user ON events(user_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_type ON events(event_type)')
+    
+    def _migrate_user_counters(self, cursor):
+        """Счетчики транзакций в users (базы, созданные до их появления)"""
+        if self._add_user_counter_columns(cursor):
+            self._reconcile_user_counters(cursor)
+    
+    def _migrate_amount_buckets(self, cursor):
+        """Гистограммы сумм чеков по месяцам и мастерам"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS amount_buckets (
+                month TEXT NOT NULL,
+                user_id BIGINT NOT NULL,
+                bucket INTEGER NOT NULL,
+                transactions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, user_id, bucket)
+            )
+        ''' if self.db_type == 'postgresql' else '''
+            CREATE TABLE IF NOT EXISTS amount_buckets (
+                month TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                transactions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, user_id, bucket)
+            )
+        ''')
+        self._backfill_amount_buckets(cursor)
+    
+    def _migrate_daily_rollups(self, cursor):
+        """Дневные агрегаты (обновляются при каждой вставке/удалении транзакции)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                day DATE PRIMARY KEY,
+                transactions INTEGER NOT NULL DEFAULT 0,
+                total_amount DECIMAL(12,2) NOT NULL DEFAULT 0
+            )
+        ''' if self.db_type == 'postgresql' else '''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                day TEXT PRIMARY KEY,
+                transactions INTEGER NOT NULL DEFAULT 0,
+                total_amount REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        self._backfill_daily_rollups(cursor)
+    
+    def _migrate_user_data(self, cursor):
+        """Состояние диалогов (context.user_data), переживает перезапуск бота"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id BIGINT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''' if self.db_type == 'postgresql' else '''
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    
+    def _migrate_bot_lease(self, cursor):
+        """Аренда (lease) единственного экземпляра бота: кто держит polling"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bot_lease (
+                name VARCHAR(64) PRIMARY KEY,
+                holder VARCHAR(255) NOT NULL,
+                expires_at DOUBLE PRECISION NOT NULL
+            )
+        ''' if self.db_type == 'postgresql' else '''
+            CREATE TABLE IF NOT EXISTS bot_lease (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+    
+    def _migrate_event_rollups(self, cursor):
+        """Дневные агрегаты событий по типам (event_type '*' - все типы вместе)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_rollups (
+                day DATE NOT NULL,
+                event_type TEXT NOT NULL,
+                events INTEGER NOT NULL DEFAULT 0,
+                users INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, event_type)
+            )
+        ''' if self.db_type == 'postgresql' else '''
+            CREATE TABLE IF NOT EXISTS event_rollups (
+                day TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                events INTEGER NOT NULL DEFAULT 0,
+                users INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, event_type)
+            )
+        ''')
+    
+    def _migrate_events_timestamp_index(self, cursor):
+        """Индекс по времени событий: активные за сутки и удаление старого дня без полного скана"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)')
+    
+    def _migrate_events_partitions(self, cursor):
+        """PostgreSQL: events разбита на дневные партиции - старый день удаляется
+        DETACH + DROP без VACUUM. На SQLite таблица одна, хватает индекса по времени
+        """
+        if self.db_type != 'postgresql':
+            return
+        
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('events')")
+        if cursor.fetchone()['relkind'] == 'p':
+            return
+        
+        # Старая таблица освобождает имена индексов и последовательности
+        cursor.execute('ALTER TABLE events RENAME TO events_unpartitioned')
+        cursor.execute('ALTER INDEX IF EXISTS events_pkey RENAME TO events_unpartitioned_pkey')
+        cursor.execute('ALTER SEQUENCE IF EXISTS events_id_seq RENAME TO events_unpartitioned_id_seq')
+        cursor.execute('DROP INDEX IF EXISTS idx_events_user')
+        cursor.execute('DROP INDEX IF EXISTS idx_events_type')
+        cursor.execute('DROP INDEX IF EXISTS idx_events_timestamp')
+        cursor.execute('''
+            CREATE TABLE events (
+                id BIGSERIAL,
+                user_id BIGINT NOT NULL REFERENCES users(user_id),
+                event_type TEXT NOT NULL,
+                event_data TEXT,
+                timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+        ''')
+        # Строки вне дневных партиций (старше срока хранения) - до ближайшего expire_events
+        cursor.execute('CREATE TABLE events_default PARTITION OF events DEFAULT')
+        cursor.execute('CREATE INDEX idx_events_user ON events(user_id)')
+        cursor.execute('CREATE INDEX idx_events_type ON events(event_type)')
+        cursor.execute('CREATE INDEX idx_events_timestamp ON events(timestamp)')
+        
+        today = datetime.now(timezone.utc).date()
+        self._ensure_event_partitions(cursor, today - timedelta(days=EVENTS_RETENTION_DAYS),
+                                      today + timedelta(days=EVENTS_PARTITIONS_AHEAD))
+        cursor.execute('''
+            INSERT INTO events (id, user_id, event_type, event_data, timestamp)
+            SELECT id, user_id, event_type, event_data, COALESCE(timestamp, CURRENT_TIMESTAMP)
+            FROM events_unpartitioned
+        ''')
+        cursor.execute("SELECT setval(pg_get_serial_sequence('events', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM events")
+        cursor.execute('DROP TABLE events_unpartitioned')
+        logger.info("🗄️ Events table partitioned by day")
+    
+    def _migrate_daily_rollups_salon_day(self, cursor):
+        """Дневные агрегаты велись по дате UTC - пересобираем по местной дате салона"""
+        cursor.execute('DELETE FROM daily_rollups')
+        self._backfill_daily_rollups(cursor)
+    
+    def _event_partitions(self, cursor) -> Dict[date, str]:
+        """Дневные партиции events: день -> имя таблицы (PostgreSQL)"""
+        cursor.execute('''
+            SELECT c.relname as name
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass('events') AND c.relname LIKE 'events\\_p%'
+        ''')
+        return {datetime.strptime(row['name'][len('events_p'):], '%Y%m%d').date(): row['name']
+                for row in cursor.fetchall()}
+    
+    def _ensure_event_partitions(self, cursor, first_day: date, last_day: date):
+        """Создать недостающие дневные партиции events с first_day по last_day включительно
+        
+        Строки этих дней, попавшие в events_default, переносятся в новую партицию
+        (иначе ATTACH PARTITION упадет на проверке default-партиции)
+        """
+        existing = self._event_partitions(cursor)
+        day = first_day
+        while day <= last_day:
+            if day not in existing:
+                name = f'events_p{day:%Y%m%d}'
+                start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+                cursor.execute(f'CREATE TABLE {name} (LIKE events INCLUDING DEFAULTS)')
+                cursor.execute(f'''
+                    WITH moved AS (
+                        DELETE FROM events_default WHERE timestamp >= %s AND timestamp < %s RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                ''', (start, end))
+                cursor.execute(f"ALTER TABLE events ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+            day += timedelta(days=1)
+    
+    def backfill_aggregates(self):
+        """Заполнить пустые гистограммы и дневные агрегаты из транзакций
+        (после ручной очистки таблиц агрегатов; при миграции - автоматически)
+        """
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            self._backfill_amount_buckets(cursor)
+            self._backfill_daily_rollups(cursor)
+    
+    def _add_user_counter_columns(self, cursor) -> bool:
+        """Добавить счетчики транзакций в users для баз, созданных до их появления
+        
+        Returns:
+            True, если колонки были добавлены (счетчики нужно заполнить)
+        """
+        if self.db_type == 'postgresql':
+            cursor.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'users'
+                  AND column_name = 'transactions_count'
+            """)
+            if cursor.fetchone():
+                return False
+            cursor.execute('ALTER TABLE users ADD COLUMN transactions_count INTEGER NOT NULL DEFAULT 0')
+            cursor.execute('ALTER TABLE users ADD COLUMN total_amount DECIMAL(12,2) NOT NULL DEFAULT 0')
+        else:
+            cursor.execute('PRAGMA table_info(users)')
+            if any(row['name'] == 'transactions_count' for row in cursor.fetchall()):
+                return False
+            cursor.execute('ALTER TABLE users ADD COLUMN transactions_count INTEGER NOT NULL DEFAULT 0')
+            cursor.execute('ALTER TABLE users ADD COLUMN total_amount REAL NOT NULL DEFAULT 0')
+        
+        logger.info("👥 User transaction counters added")
+        return True
+    
+    def _reconcile_user_counters(self, cursor) -> int:
+        """Пересчитать счетчики пользователей по таблице transactions
+        
+        Обновляет только расходящиеся строки. Returns: количество исправленных пользователей
+        """
+        cursor.execute('''
+            UPDATE users SET
+                transactions_count = (SELECT COUNT(*) FROM transactions t WHERE t.user_id = users.user_id),
+                total_amount = (SELECT COALESCE(SUM(amount), 0) FROM transactions t WHERE t.user_id = users.user_id)
+            WHERE transactions_count <> (SELECT COUNT(*) FROM transactions t WHERE t.user_id = users.user_id)
+               OR ABS(total_amount - (SELECT COALESCE(SUM(amount), 0) FROM transactions t WHERE t.user_id = users.user_id)) > 0.005
+        ''')
+        return max(cursor.rowcount or 0, 0)
+    
+    def reconcile_user_counters(self) -> int:
+        """Сверить счетчики transactions_count/total_amount с транзакциями (периодическая задача)
+        
+        Returns:
+            Количество пользователей, у которых счетчики разошлись и были исправлены
+        """
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            fixed = self._reconcile_user_counters(cursor)
+        
+        if fixed:
+            logger.warning(f"⚠️ User counters reconciled: {fixed} user(s) fixed")
+        return fixed
+    
+    def _update_user_counters(self, cursor, user_id: int, amount: float, delta: int):
+        """Изменить счетчики пользователя в той же транзакции БД"""
+        cursor.execute('''
+            UPDATE users
+            SET transactions_count = transactions_count + %s, total_amount = total_amount + %s
+            WHERE user_id = %s
+        ''' if self.db_type == 'postgresql' else '''
+            UPDATE users
+            SET transactions_count = transactions_count + ?, total_amount = total_amount + ?
+            WHERE user_id = ?
+        ''', (delta, delta * float(amount), user_id))
+    
+    def _backfill_amount_buckets(self, cursor):
+        """Заполнить гистограммы из существующих транзакций (один раз, при пустой таблице)"""
+        cursor.execute('SELECT COUNT(*) as count FROM amount_buckets')
+        if cursor.fetchone()['count'] > 0:
+            return
+        
+        cursor.execute(f'''
+            INSERT INTO amount_buckets (month, user_id, bucket, transactions)
+            SELECT
+                to_char(timestamp, 'YYYY-MM'),
+                user_id,
+                GREATEST(LEAST(FLOOR(amount / {BUCKET_WIDTH}), {OVERFLOW_BUCKET}), 0)::INTEGER,
+                COUNT(*)
+            FROM transactions
+            GROUP BY 1, 2, 3
+        ''' if self.db_type == 'postgresql' else f'''
+            INSERT INTO amount_buckets (month, user_id, bucket, transactions)
+            SELECT
+                strftime('%Y-%m', timestamp),
+                user_id,
+                MAX(MIN(CAST(amount / {BUCKET_WIDTH} AS INTEGER), {OVERFLOW_BUCKET}), 0),
+                COUNT(*)
+            FROM transactions
+            GROUP BY 1, 2, 3
+        ''')
+        if cursor.rowcount and cursor.rowcount > 0:
+            logger.info(f"📊 Amount histograms backfilled: {cursor.rowcount} buckets")
+    
+    def _backfill_daily_rollups(self, cursor):
+        """Заполнить дневные агрегаты из существующих транзакций (один раз, при пустой таблице)"""
+        cursor.execute('SELECT COUNT(*) as count FROM daily_rollups')
+        if cursor.fetchone()['count'] > 0:
+            return
+        
+        # Смещение пояса салона - целые часы: суммы по часам UTC точно раскладываются по местным датам
+        cursor.execute('''
+            SELECT to_char(timestamp, 'YYYY-MM-DD HH24') as hour, COUNT(*) as transactions,
+                   COALESCE(SUM(amount), 0) as total_amount
+            FROM transactions
+            GROUP BY 1
+        ''' if self.db_type == 'postgresql' else '''
+            SELECT strftime('%Y-%m-%d %H', timestamp) as hour, COUNT(*) as transactions,
+                   COALESCE(SUM(amount), 0) as total_amount
+            FROM transactions
+            GROUP BY 1
+        ''')
+        rollups: Dict[str, List] = {}
+        for row in cursor.fetchall():
+            day = salon_day(datetime.strptime(row['hour'], '%Y-%m-%d %H'))
+            rollup = rollups.setdefault(day, [0, 0.0])
+            rollup[0] += row['transactions']
+            rollup[1] += float(row['total_amount'])
+        if not rollups:
+            return
+        
+        cursor.executemany('''
+            INSERT INTO daily_rollups (day, transactions, total_amount) VALUES (%s, %s, %s)
+        ''' if self.db_type == 'postgresql' else '''
+            INSERT INTO daily_rollups (day, transactions, total_amount) VALUES (?, ?, ?)
+        ''', [(day, transactions, round(total, 2)) for day, (transactions, total) in rollups.items()])
+        logger.info(f"📅 Daily rollups backfilled: {len(rollups)} days")
+    
+    @staticmethod
+    def _month_string(timestamp) -> str:
+        """Месяц транзакции в формате YYYY-MM (timestamp - строка SQLite или datetime)"""
+        if isinstance(timestamp, str):
+            return timestamp[:7]
+        return timestamp.strftime('%Y-%m')
+    
+    def _update_amount_bucket(self, cursor, user_id: int, amount: float, timestamp, delta: int):
+        """Изменить счетчик корзины гистограммы в той же транзакции БД"""
+        cursor.execute('''
+            INSERT INTO amount_buckets (month, user_id, bucket, transactions)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (month, user_id, bucket)
+            DO UPDATE SET transactions = amount_buckets.transactions + EXCLUDED.transactions
+        ''' if self.db_type == 'postgresql' else '''
+            INSERT INTO amount_buckets (month, user_id, bucket, transactions)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (month, user_id, bucket)
+            DO UPDATE SET transactions = amount_buckets.transactions + excluded.transactions
+        ''', (self._month_string(timestamp), user_id, bucket_for(float(amount)), delta))
+    
+    def _update_daily_rollup(self, cursor, amount: float, timestamp, delta: int):
+        """Изменить дневной агрегат (местной даты салона) в той же транзакции БД"""
+        day = salon_day(timestamp)
+        cursor.execute('''
+            INSERT INTO daily_rollups (day, transactions, total_amount)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (day) DO UPDATE SET
+                transactions = daily_rollups.transactions + EXCLUDED.transactions,
+                total_amount = daily_rollups.total_amount + EXCLUDED.total_amount
+        ''' if self.db_type == 'postgresql' else '''
+            INSERT INTO daily_rollups (day, transactions, total_amount)
+            VALUES (?, ?, ?)
+            ON CONFLICT (day) DO UPDATE SET
+                transactions = daily_rollups.transactions + excluded.transactions,
+                total_amount = daily_rollups.total_amount + excluded.total_amount
+        ''', (day, delta, delta * float(amount)))
     
     def add_or_update_user(self, user_id: int, username: str = None, 
                           first_name: str = None, last_name: str = None,
@@ -317,19 +821,40 @@ class Database:
                     INSERT INTO users (user_id, username, first_name, last_name, is_admin, total_requests)
                     VALUES (?, ?, ?, ?, ?, 1)
                 ''', (user_id, username, first_name, last_name, is_admin))
+        
+        self._notify('on_user_updated', user_id, username, first_name, last_name)
     
-    def add_transaction(self, user_id: int, amount: float, service: str = None):
-        """Добавить транзакцию"""
+    def add_transaction(self, user_id: int, amount: float, service: str = None) -> int:
+        """Добавить транзакцию
+        
+        Returns:
+            ID созданной транзакции
+        """
         with self.get_connection() as conn:
             cursor = self._get_cursor(conn)
             cursor.execute('''
                 INSERT INTO transactions (user_id, amount, service)
                 VALUES (%s, %s, %s)
+                RETURNING id, timestamp
             ''' if self.db_type == 'postgresql' else '''
                 INSERT INTO transactions (user_id, amount, service)
                 VALUES (?, ?, ?)
+                RETURNING id, timestamp
             ''', (user_id, amount, service))
+            row = cursor.fetchone()
+            self._update_user_counters(cursor, user_id, amount, 1)
+            self._update_amount_bucket(cursor, user_id, amount, row['timestamp'], 1)
+            self._update_daily_rollup(cursor, amount, row['timestamp'], 1)
             logger.info(f"Transaction added: user={user_id}, amount={amount}, service={service}")
+        
+        self._notify('on_transaction_added', {
+            'id': row['id'],
+            'user_id': user_id,
+            'amount': float(amount),
+            'service': service,
+            'timestamp': row['timestamp']
+        })
+        return row['id']
     
     def add_event(self, user_id: int, event_type: str, event_data: str = None):
         """Добавить событие"""
@@ -342,38 +867,31 @@ class Database:
                 INSERT INTO events (user_id, event_type, event_data)
                 VALUES (?, ?, ?)
             ''', (user_id, event_type, event_data))
+        
+        self._notify('on_event_added', user_id, event_type)
     
     def get_user_stats(self, user_id: int) -> Optional[Dict]:
-        """Получить статистику пользователя"""
+        """Получить статистику пользователя (счетчики хранятся в users)"""
         with self.get_connection() as conn:
             cursor = self._get_cursor(conn)
             
-            cursor.execute('SELECT * FROM users WHERE user_id = %s' if self.db_type == 'postgresql' else 'SELECT * FROM users WHERE user_id = ?', 
-                         (user_id,))
+            cursor.execute('''
+                SELECT user_id, username, first_name, last_name, first_seen, last_seen,
+                       total_requests, transactions_count, total_amount
+                FROM users WHERE user_id = %s
+            ''' if self.db_type == 'postgresql' else '''
+                SELECT user_id, username, first_name, last_name, first_seen, last_seen,
+                       total_requests, transactions_count, total_amount
+                FROM users WHERE user_id = ?
+            ''', (user_id,))
             user = cursor.fetchone()
             
             if not user:
                 return None
             
-            cursor.execute('SELECT COUNT(*) as count FROM transactions WHERE user_id = %s' if self.db_type == 'postgresql' else 'SELECT COUNT(*) as count FROM transactions WHERE user_id = ?', 
-                         (user_id,))
-            transactions_count = cursor.fetchone()['count']
-            
-            cursor.execute('SELECT SUM(amount) as total FROM transactions WHERE user_id = %s' if self.db_type == 'postgresql' else 'SELECT SUM(amount) as total FROM transactions WHERE user_id = ?', 
-                         (user_id,))
-            total_amount = cursor.fetchone()['total'] or 0
-            
-            return {
-                'user_id': user['user_id'],
-                'username': user['username'],
-                'first_name': user['first_name'],
-                'last_name': user['last_name'],
-                'first_seen': user['first_seen'],
-                'last_seen': user['last_seen'],
-                'total_requests': user['total_requests'],
-                'transactions_count': transactions_count,
-                'total_amount': float(total_amount)
-            }
+            stats = dict(user)
+            stats['total_amount'] = float(stats['total_amount'])
+            return stats
     
     def get_all_users_stats(self) -> List[Dict]:
         """Получить статистику всех пользователей"""
@@ -381,18 +899,9 @@ class Database:
             cursor = self._get_cursor(conn)
             
             cursor.execute('''
-                SELECT 
-                    u.user_id,
-                    u.username,
-                    u.first_name,
-                    u.last_name,
-                    u.total_requests,
-                    COUNT(t.id) as transactions_count,
-                    COALESCE(SUM(t.amount), 0) as total_amount,
-                    u.last_seen
-                FROM users u
-                LEFT JOIN transactions t ON u.user_id = t.user_id
-                GROUP BY u.user_id, u.username, u.first_name, u.last_name, u.total_requests, u.last_seen
+                SELECT user_id, username, first_name, last_name, total_requests,
+                       transactions_count, total_amount, last_seen
+                FROM users
                 ORDER BY transactions_count DESC, total_amount DESC
             ''')
             
@@ -425,14 +934,18 @@ class Database:
                 WHERE timestamp > datetime('now', '-1 day')
             ''')
             active_24h = cursor.fetchone()['count']
-            
-            return {
-                'total_users': total_users,
-                'total_transactions': total_transactions,
-                'total_amount': round(float(total_amount), 2),
-                'avg_amount': round(float(avg_amount), 2),
-                'active_24h': active_24h
-            }
+        
+        histogram = self.get_amount_histogram()
+        
+        return {
+            'total_users': total_users,
+            'total_transactions': total_transactions,
+            'total_amount': round(float(total_amount), 2),
+            'avg_amount': round(float(avg_amount), 2),
+            'median_amount': round(histogram.median, 2),
+            'p90_amount': round(histogram.p90, 2),
+            'active_24h': active_24h
+        }
     
     def get_recent_transactions(self, limit: int = 10) -> List[Dict]:
         """Получить последние транзакции"""
@@ -510,12 +1023,13 @@ class Database:
             
             # Сначала проверяем существование транзакции
             cursor.execute('''
-                SELECT id FROM transactions WHERE id = %s
+                SELECT id, user_id, amount, timestamp FROM transactions WHERE id = %s
             ''' if self.db_type == 'postgresql' else '''
-                SELECT id FROM transactions WHERE id = ?
+                SELECT id, user_id, amount, timestamp FROM transactions WHERE id = ?
             ''', (transaction_id,))
             
-            if not cursor.fetchone():
+            transaction = cursor.fetchone()
+            if not transaction:
                 return False
             
             # Удаляем транзакцию
@@ -525,8 +1039,228 @@ class Database:
                 DELETE FROM transactions WHERE id = ?
             ''', (transaction_id,))
             
+            self._update_user_counters(cursor, transaction['user_id'], transaction['amount'], -1)
+            self._update_amount_bucket(cursor, transaction['user_id'], transaction['amount'],
+                                       transaction['timestamp'], -1)
+            self._update_daily_rollup(cursor, transaction['amount'], transaction['timestamp'], -1)
+            
             logger.info(f"Transaction {transaction_id} deleted successfully")
-            return True
+        
+        self._notify('on_transaction_deleted', transaction_id)
+        return True
+    
+    def get_all_users(self) -> List[Dict]:
+        """Получить всех пользователей (без агрегатов по транзакциям)"""
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            cursor.execute('''
+                SELECT user_id, username, first_name, last_name, total_requests, last_seen
+                FROM users
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_all_transactions(self) -> List[Dict]:
+        """Получить все транзакции (для загрузки аналитики в память)"""
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            cursor.execute('''
+                SELECT id, user_id, amount, service, timestamp
+                FROM transactions
+                ORDER BY id
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_last_activity(self) -> List[Dict]:
+        """Получить время последнего события пользователей за последние сутки"""
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            cursor.execute('''
+                SELECT user_id, MAX(timestamp) as last_event
+                FROM events
+                WHERE timestamp > CURRENT_TIMESTAMP - INTERVAL '1 day'
+                GROUP BY user_id
+            ''' if self.db_type == 'postgresql' else '''
+                SELECT user_id, MAX(timestamp) as last_event
+                FROM events
+                WHERE timestamp > datetime('now', '-1 day')
+                GROUP BY user_id
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def expire_events(self, retention_days: int = EVENTS_RETENTION_DAYS,
+                      archive_dir: str = EVENTS_ARCHIVE_DIR) -> Dict:
+        """Свернуть события старше retention_days дней в event_rollups и удалить сырые строки
+        
+        Каждый день - отдельная транзакция: агрегаты -> удаление (на PostgreSQL -
+        DETACH + DROP партиции дня). Архив дня (если archive_dir) пишется во временный
+        файл и получает свое имя только после commit: откат не оставляет дублей.
+        На PostgreSQL заодно создаются партиции на EVENTS_PARTITIONS_AHEAD дней вперед
+        
+        Returns:
+            {'days': обработанные дни, 'events': удалено строк, 'archives': файлы архива}
+        """
+        result = {'days': [], 'events': 0, 'archives': []}
+        today = datetime.now(timezone.utc).date()
+        cutoff = today - timedelta(days=retention_days)
+        
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            partitions = {}
+            if self.db_type == 'postgresql':
+                self._ensure_event_partitions(cursor, today, today + timedelta(days=EVENTS_PARTITIONS_AHEAD))
+                partitions = self._event_partitions(cursor)
+            if retention_days <= 0:
+                return result
+            
+            cursor.execute('''
+                SELECT DISTINCT DATE(timestamp) as day FROM events WHERE timestamp < %s
+            ''' if self.db_type == 'postgresql' else '''
+                SELECT DISTINCT DATE(timestamp) as day FROM events WHERE timestamp < ?
+            ''', (cutoff.isoformat(),))
+            days = {row['day'] if isinstance(row['day'], date) else date.fromisoformat(row['day'])
+                    for row in cursor.fetchall()}
+        
+        # Пустые партиции прошедших дней тоже удаляются
+        days.update(day for day in partitions if day < cutoff)
+        for day in sorted(days):
+            archive = self._archive_path(day, archive_dir) if archive_dir else None
+            pending = archive + '.tmp' if archive else None
+            try:
+                with self.get_connection() as conn:
+                    cursor = self._get_cursor(conn)
+                    expired = self._expire_events_day(cursor, day, partitions.get(day), pending)
+            except Exception:
+                if pending and os.path.exists(pending):
+                    os.remove(pending)
+                raise
+            
+            result['days'].append(day.isoformat())
+            result['events'] += expired
+            if pending and os.path.exists(pending):
+                os.replace(pending, archive)
+                result['archives'].append(archive)
+        
+        if result['days']:
+            logger.info(f"🗄️ Events expired: {result['events']} event(s) in {len(result['days'])} day(s) "
+                        f"before {cutoff}, archives: {len(result['archives'])}")
+        return result
+    
+    def _expire_events_day(self, cursor, day: date, partition: Optional[str], archive: Optional[str]) -> int:
+        """Архив (в файл archive), агрегаты и удаление событий одного дня (в транзакции вызывающего)"""
+        start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+        params = (start, end)
+        if archive:
+            cursor.execute('''
+                SELECT id, user_id, event_type, event_data, timestamp FROM events
+                WHERE timestamp >= %s AND timestamp < %s ORDER BY id
+            ''' if self.db_type == 'postgresql' else '''
+                SELECT id, user_id, event_type, event_data, timestamp FROM events
+                WHERE timestamp >= ? AND timestamp < ? ORDER BY id
+            ''', params)
+            rows = cursor.fetchall()
+            if rows:
+                self._archive_events(rows, archive)
+        
+        cursor.execute('''
+            SELECT event_type, COUNT(*) as events, COUNT(DISTINCT user_id) as users FROM events
+            WHERE timestamp >= %s AND timestamp < %s GROUP BY event_type
+            UNION ALL
+            SELECT '*', COUNT(*), COUNT(DISTINCT user_id) FROM events
+            WHERE timestamp >= %s AND timestamp < %s
+        ''' if self.db_type == 'postgresql' else '''
+            SELECT event_type, COUNT(*) as events, COUNT(DISTINCT user_id) as users FROM events
+            WHERE timestamp >= ? AND timestamp < ? GROUP BY event_type
+            UNION ALL
+            SELECT '*', COUNT(*), COUNT(DISTINCT user_id) FROM events
+            WHERE timestamp >= ? AND timestamp < ?
+        ''', params + params)
+        rollups = [(start, row['event_type'], row['events'], row['users'])
+                   for row in cursor.fetchall() if row['events']]
+        for rollup in rollups:
+            cursor.execute('''
+                INSERT INTO event_rollups (day, event_type, events, users)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (day, event_type) DO UPDATE SET
+                    events = event_rollups.events + EXCLUDED.events,
+                    users = GREATEST(event_rollups.users, EXCLUDED.users)
+            ''' if self.db_type == 'postgresql' else '''
+                INSERT INTO event_rollups (day, event_type, events, users)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (day, event_type) DO UPDATE SET
+                    events = event_rollups.events + excluded.events,
+                    users = MAX(event_rollups.users, excluded.users)
+            ''', rollup)
+        
+        if partition:
+            cursor.execute(f'ALTER TABLE events DETACH PARTITION {partition}')
+            cursor.execute(f'DROP TABLE {partition}')
+        else:
+            cursor.execute('''
+                DELETE FROM events WHERE timestamp >= %s AND timestamp < %s
+            ''' if self.db_type == 'postgresql' else '''
+                DELETE FROM events WHERE timestamp >= ? AND timestamp < ?
+            ''', params)
+        return next((events for _, event_type, events, _ in rollups if event_type == '*'), 0)
+    
+    @staticmethod
+    def _archive_path(day: date, archive_dir: str) -> str:
+        """Свободное имя архива дня: events-YYYY-MM-DD.jsonl.gz, затем .2, .3...
+        (поздние строки уже обработанного дня не перезаписывают прежний архив)
+        """
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f'events-{day.isoformat()}.jsonl.gz')
+        part = 1
+        while os.path.exists(path):
+            part += 1
+            path = os.path.join(archive_dir, f'events-{day.isoformat()}.{part}.jsonl.gz')
+        return path
+    
+    @staticmethod
+    def _archive_events(rows, path: str):
+        """Записать события в gzip JSONL"""
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                record = dict(row)
+                record['timestamp'] = str(record['timestamp'])
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    
+    def get_amount_histogram(self, month_offset: Optional[int] = None,
+                             user_id: Optional[int] = None) -> AmountHistogram:
+        """Получить гистограмму сумм чеков
+        
+        Args:
+            month_offset: 0 = текущий месяц, 1 = прошлый месяц; None = за все время
+            user_id: мастер; None = все мастера
+        """
+        conditions = []
+        params = []
+        placeholder = '%s' if self.db_type == 'postgresql' else '?'
+        
+        if month_offset is not None:
+            if self.db_type == 'postgresql':
+                conditions.append("month = to_char(CURRENT_DATE - INTERVAL '%s months', 'YYYY-MM')")
+            else:
+                conditions.append("month = strftime('%Y-%m', date('now', '-' || ? || ' months'))")
+            params.append(month_offset)
+        
+        if user_id is not None:
+            conditions.append(f'user_id = {placeholder}')
+            params.append(user_id)
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            cursor.execute(f'''
+                SELECT bucket, SUM(transactions) as transactions
+                FROM amount_buckets
+                {where}
+                GROUP BY bucket
+            ''', tuple(params))
+            
+            return AmountHistogram.from_buckets(
+                (row['bucket'], row['transactions']) for row in cursor.fetchall()
+            )
     
     def get_popular_services(self, limit: int = 10) -> List[Tuple[str, int]]:
         """Получить популярные услуги"""
@@ -552,31 +1286,139 @@ class Database:
             return [(row['service'], row['count']) for row in cursor.fetchall()]
     
     def get_daily_stats(self, days: int = 7) -> List[Dict]:
-        """Получить статистику по дням"""
+        """Получить статистику по дням (из дневных агрегатов, сегодня + days-1 предыдущих дней)
+        Дни - местные даты салона (SALON_TIMEZONE)
+        """
+        since = (datetime.now(SALON_TIMEZONE).date() - timedelta(days=days)).isoformat()
         with self.get_connection() as conn:
             cursor = self._get_cursor(conn)
             
             cursor.execute('''
                 SELECT 
-                    DATE(timestamp) as date,
-                    COUNT(*) as transactions,
-                    COALESCE(SUM(amount), 0) as total_amount
-                FROM transactions
-                WHERE timestamp > CURRENT_TIMESTAMP - INTERVAL '%s days'
-                GROUP BY DATE(timestamp)
-                ORDER BY date DESC
+                    day as date,
+                    transactions,
+                    total_amount
+                FROM daily_rollups
+                WHERE day > %s AND transactions > 0
+                ORDER BY day DESC
             ''' if self.db_type == 'postgresql' else '''
                 SELECT 
-                    DATE(timestamp) as date,
-                    COUNT(*) as transactions,
-                    COALESCE(SUM(amount), 0) as total_amount
-                FROM transactions
-                WHERE timestamp > datetime('now', '-' || ? || ' days')
-                GROUP BY DATE(timestamp)
-                ORDER BY date DESC
-            ''', (days,) if self.db_type == 'postgresql' else (days,))
+                    day as date,
+                    transactions,
+                    total_amount
+                FROM daily_rollups
+                WHERE day > ? AND transactions > 0
+                ORDER BY day DESC
+            ''', (since,))
             
-            return [dict(row) for row in cursor.fetchall()]
+            return [
+                {
+                    'date': row['date'],
+                    'transactions': row['transactions'],
+                    'total_amount': round(float(row['total_amount']), 2)
+                }
+                for row in cursor.fetchall()
+            ]
+    
+    def get_daily_rollup(self, day: str) -> Dict:
+        """Получить агрегат за один день (YYYY-MM-DD, местная дата салона)"""
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            
+            cursor.execute('''
+                SELECT transactions, total_amount FROM daily_rollups WHERE day = %s
+            ''' if self.db_type == 'postgresql' else '''
+                SELECT transactions, total_amount FROM daily_rollups WHERE day = ?
+            ''', (day,))
+            
+            row = cursor.fetchone()
+            return {
+                'date': day,
+                'transactions': row['transactions'] if row else 0,
+                'total_amount': round(float(row['total_amount']), 2) if row else 0.0
+            }
+    
+    def get_user_state(self, user_id: int) -> Optional[Dict]:
+        """Получить сохраненное состояние диалога пользователя (user_data)"""
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            cursor.execute('SELECT data FROM user_data WHERE user_id = %s' if self.db_type == 'postgresql' else 'SELECT data FROM user_data WHERE user_id = ?',
+                         (user_id,))
+            row = cursor.fetchone()
+            return json.loads(row['data']) if row else None
+    
+    def save_user_states(self, states: Dict[int, Optional[Dict]]):
+        """Сохранить состояния нескольких пользователей одной транзакцией
+        
+        Пустое состояние или None удаляет строку пользователя
+        """
+        upserts = [(user_id, json.dumps(data, ensure_ascii=False, default=str))
+                   for user_id, data in states.items() if data]
+        deletes = [(user_id,) for user_id, data in states.items() if not data]
+        
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            if upserts:
+                cursor.executemany('''
+                    INSERT INTO user_data (user_id, data, updated_at)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+                ''' if self.db_type == 'postgresql' else '''
+                    INSERT INTO user_data (user_id, data, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                ''', upserts)
+            if deletes:
+                cursor.executemany('DELETE FROM user_data WHERE user_id = %s' if self.db_type == 'postgresql' else 'DELETE FROM user_data WHERE user_id = ?',
+                                 deletes)
+    
+    def acquire_lease(self, name: str, holder: str, ttl: float, now: Optional[float] = None) -> bool:
+        """Захватить или продлить аренду
+        
+        Аренда переходит к holder, если она свободна, истекла или уже принадлежит ему.
+        Захват атомарный: из нескольких экземпляров аренду получает только один.
+        
+        Returns:
+            True, если аренда принадлежит holder
+        """
+        now = time.time() if now is None else now
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            if self.db_type == 'postgresql':
+                cursor.execute('''
+                    INSERT INTO bot_lease (name, holder, expires_at)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (name) DO UPDATE SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+                    WHERE bot_lease.holder = EXCLUDED.holder OR bot_lease.expires_at < %s
+                ''', (name, holder, now + ttl, now))
+                cursor.execute('SELECT holder FROM bot_lease WHERE name = %s', (name,))
+            else:
+                cursor.execute('''
+                    INSERT INTO bot_lease (name, holder, expires_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                    WHERE bot_lease.holder = excluded.holder OR bot_lease.expires_at < ?
+                ''', (name, holder, now + ttl, now))
+                cursor.execute('SELECT holder FROM bot_lease WHERE name = ?', (name,))
+            row = cursor.fetchone()
+            return row is not None and row['holder'] == holder
+    
+    def release_lease(self, name: str, holder: str) -> bool:
+        """Освободить аренду (только если она принадлежит holder)"""
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            cursor.execute('DELETE FROM bot_lease WHERE name = %s AND holder = %s' if self.db_type == 'postgresql' else 'DELETE FROM bot_lease WHERE name = ? AND holder = ?',
+                         (name, holder))
+            return cursor.rowcount > 0
+    
+    def get_lease(self, name: str) -> Optional[Dict]:
+        """Текущий держатель аренды и срок ее истечения"""
+        with self.get_connection() as conn:
+            cursor = self._get_cursor(conn)
+            cursor.execute('SELECT holder, expires_at FROM bot_lease WHERE name = %s' if self.db_type == 'postgresql' else 'SELECT holder, expires_at FROM bot_lease WHERE name = ?',
+                         (name,))
+            row = cursor.fetchone()
+            return {'holder': row['holder'], 'expires_at': float(row['expires_at'])} if row else None
     
     def get_monthly_top_users(self, month_offset: int = 0, limit: int = 5) -> List[Dict]:
         """Получить топ пользователей за месяц
@@ -719,7 +1561,8 @@ class Database:
             month_offset: 0 = текущий месяц, 1 = прошлый месяц, и т.д.
         
         Returns:
-            Dict с ключами: month, year, transactions, total_amount, avg_amount, unique_users
+            Dict с ключами: month, year, transactions, total_amount, avg_amount,
+            median_amount, p90_amount, unique_users
         """
         with self.get_connection() as conn:
             cursor = self._get_cursor(conn)
@@ -755,27 +1598,48 @@ class Database:
                 ''', (month_offset,))
             
             result = cursor.fetchone()
-            if result:
-                return {
-                    'month': int(result['month']),
-                    'year': int(result['year']),
-                    'transactions': result['transactions'],
-                    'total_amount': round(float(result['total_amount']), 2),
-                    'avg_amount': round(float(result['avg_amount']), 2),
-                    'unique_users': result['unique_users']
-                }
-            else:
-                # Возвращаем пустую статистику если нет данных
-                from datetime import datetime, timedelta
-                target_date = datetime.now() - timedelta(days=30 * month_offset)
-                return {
-                    'month': target_date.month,
-                    'year': target_date.year,
-                    'transactions': 0,
-                    'total_amount': 0.0,
-                    'avg_amount': 0.0,
-                    'unique_users': 0
-                }
+        
+        if result:
+            histogram = self.get_amount_histogram(month_offset)
+            return {
+                'month': int(result['month']),
+                'year': int(result['year']),
+                'transactions': result['transactions'],
+                'total_amount': round(float(result['total_amount']), 2),
+                'avg_amount': round(float(result['avg_amount']), 2),
+                'median_amount': round(histogram.median, 2),
+                'p90_amount': round(histogram.p90, 2),
+                'unique_users': result['unique_users']
+            }
+        else:
+            # Возвращаем пустую статистику если нет данных
+            from datetime import datetime, timedelta
+            target_date = datetime.now() - timedelta(days=30 * month_offset)
+            return {
+                'month': target_date.month,
+                'year': target_date.year,
+                'transactions': 0,
+                'total_amount': 0.0,
+                'avg_amount': 0.0,
+                'median_amount': 0.0,
+                'p90_amount': 0.0,
+                'unique_users': 0
+            }
+    
+    def pool_status(self) -> Dict:
+        """Состояние пула соединений без запросов к БД (для /ready)"""
+        if not self.connected:
+            return {'type': self.db_type, 'connected': False}
+        if self.db_type == 'postgresql' and hasattr(self, 'pool'):
+            return {
+                'type': 'postgresql',
+                'closed': bool(self.pool.closed),
+                'max': self.pool.maxconn,
+                'in_use': len(self.pool._used),
+                'idle': len(self.pool._pool),
+                'schema_version': self.schema_version,
+            }
+        return {'type': 'sqlite', 'path': self.db_path, 'schema_version': self.schema_version}
     
     def close(self):
         """Закрыть подключение"""
@@ -784,8 +1648,18 @@ class Database:
             logger.info("PostgreSQL connection pool closed")
 
 
-# Создаем глобальный экземпляр
-db = Database()
+# Метрики и span'ы трассировки: длительность и ошибки каждого публичного метода Database
+_UNTIMED_METHODS = {'connect', 'get_connection', 'add_listener', 'pool_status', 'close'}
+for _name, _method in list(vars(Database).items()):
+    if (_name.startswith('_') or _name in _UNTIMED_METHODS
+            or not callable(_method) or isinstance(_method, (staticmethod, classmethod))):
+        continue
+    setattr(Database, _name, timed_db_method(traced(f'db.{_name}')(_method)))
+
+
+# Создаем глобальный экземпляр: подключение - в фоне после старта бота
+# (db.connect()) или при первом запросе, импорт модуля не ходит в сеть
+db = Database(connect=False)
 
 
 if __name__ == '__main__':
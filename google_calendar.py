@@ -6,19 +6,12 @@
 
 import os
 import logging
+import unicodedata
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
-import json
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from dotenv import load_dotenv
 
-# Загружаем переменные окружения
-load_dotenv('.env.test')
+# Библиотеки Google импортируются при первой аутентификации, а не при импорте модуля:
+# боту, который не обращается к календарю, они не нужны
 
 logger = logging.getLogger(__name__)
 
@@ -81,6 +74,17 @@ PROCEDURE_ALIASES = {
     'konzultace návrh': 'konzultace + návrh',
 }
 
+def _build_service(credentials):
+    """Клиент Calendar API v3 по discovery документу, встроенному в googleapiclient
+    
+    static_discovery=True: документ читается из пакета, а не скачивается при каждом build()
+    """
+    from googleapiclient.discovery import build
+    
+    return build('calendar', 'v3', credentials=credentials,
+                 static_discovery=True, cache_discovery=False)
+
+
 class GoogleCalendarService:
     """Сервис для работы с Google Calendar"""
     
@@ -122,17 +126,23 @@ class GoogleCalendarService:
             logger.info("Создайте Service Account согласно REAL_GOOGLE_CALENDAR_SETUP.md")
             return False
         
+        from google.oauth2 import service_account
+        
         # Создаем credentials из Service Account
         self.creds = service_account.Credentials.from_service_account_file(
             self.service_account_file, scopes=SCOPES)
         
         # Создаем сервис
-        self.service = build('calendar', 'v3', credentials=self.creds)
+        self.service = _build_service(self.creds)
         logger.info("✅ Google Calendar Service Account authentication successful")
         return True
     
     def _authenticate_oauth(self) -> bool:
         """Аутентификация через OAuth (для локального тестирования)"""
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        
         # Проверяем существующий токен
         if os.path.exists(self.token_file):
             self.creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
@@ -156,7 +166,7 @@ class GoogleCalendarService:
                 token.write(self.creds.to_json())
         
         # Создаем сервис
-        self.service = build('calendar', 'v3', credentials=self.creds)
+        self.service = _build_service(self.creds)
         logger.info("✅ Google Calendar OAuth authentication successful")
         return True
     
@@ -166,6 +176,8 @@ class GoogleCalendarService:
             if not self.authenticate():
                 return []
         
+        from googleapiclient.errors import HttpError
+        
         try:
             # Определяем временные рамки для сегодняшнего дня
             today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -186,7 +198,7 @@ class GoogleCalendarService:
             return events
             
         except HttpError as error:
-            logger.error(f"Error getting calendar events: {error}")5
+            logger.error(f"Error getting calendar events: {error}")
             if "notFound" in str(error):
                 logger.error(f"Calendar ID '{self.calendar_id}' not found or no access")
                 logger.info("Проверьте GOOGLE_CALENDAR_ID в .env.test")
@@ -197,24 +209,110 @@ class GoogleCalendarService:
             logger.error(f"Unexpected error getting calendar events: {e}")
             return []
 
-def extract_procedure_from_title(title: str) -> Optional[str]:
-    """Извлекает название процедуры из заголовка события"""
-    if not title:
-        return None
+def _build_accent_table() -> Dict[int, str]:
+    """Таблица str.translate: латиница с диакритикой (U+00C0-U+024F) → базовые буквы"""
+    table = {}
+    for code in range(0xC0, 0x250):
+        decomposed = unicodedata.normalize('NFKD', chr(code))
+        base = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+        if base != chr(code):
+            table[code] = base
+    return table
+
+
+_ACCENT_TABLE = _build_accent_table()
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр без диакритики: 'Úprava OBOČÍ' → 'uprava oboci'"""
+    return text.lower().translate(_ACCENT_TABLE)
+
+
+class ProcedureMatcher:
+    """Автомат Ахо-Корасик по названиям процедур и алиасам
     
-    title_lower = title.lower().strip()
+    Строится один раз: суффиксные ссылки сворачиваются в полную таблицу
+    переходов, поэтому заголовок проходится за один линейный проход
+    без возвратов. Из всех найденных названий выбирается самое длинное,
+    при равной длине - основное название из PROCEDURE_PRICES, затем
+    более раннее вхождение.
+    """
+    
+    def __init__(self, procedures: Dict[str, int], aliases: Dict[str, str]):
+        # Узел автомата: переходы, суффиксная ссылка, лучший паттерн среди оканчивающихся здесь
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[Tuple[int, int, str]]] = [None]
+        
+        patterns = {}
+        for procedure in procedures:
+            patterns.setdefault(normalize_text(procedure), (procedure, 1))
+        for alias, procedure in aliases.items():
+            patterns.setdefault(normalize_text(alias), (procedure, 0))
+        
+        for pattern, (procedure, is_primary) in patterns.items():
+            self._add(pattern, (len(pattern), is_primary, procedure))
+        self._build_links()
     
-    # Ищем точное совпадение в основном словаре
-    for procedure in PROCEDURE_PRICES.keys():
-        if procedure.lower() in title_lower:
-            return procedure
+    def _add(self, pattern: str, rank: Tuple[int, int, str]):
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+            node = next_node
+        self._best[node] = rank
     
-    # Ищем через алиасы
-    for alias, procedure in PROCEDURE_ALIASES.items():
-        if alias.lower() in title_lower:
-            return procedure
+    def _build_links(self):
+        """Обход в ширину: суффиксные ссылки, наследование лучшего паттерна и
+        полная таблица переходов (переход по ссылке вычисляется заранее)"""
+        goto, fail, best = self._goto, self._fail, self._best
+        delta = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        
+        queue = list(goto[0].values())
+        for node in queue:
+            # Переходы узла = переходы его суффиксной ссылки + собственные ребра
+            if node:
+                delta[node] = {**delta[fail[node]], **goto[node]}
+            for ch, child in goto[node].items():
+                if node:
+                    fail[child] = delta[fail[node]].get(ch, 0)
+                inherited = best[fail[child]]
+                if inherited and (not best[child] or inherited[:2] > best[child][:2]):
+                    best[child] = inherited
+                queue.append(child)
+        
+        self._delta = delta
     
-    return None
+    def match(self, title: str) -> Optional[str]:
+        """Процедура из заголовка события или None"""
+        if not title:
+            return None
+        
+        delta, best_at = self._delta, self._best
+        node = 0
+        best = None
+        for ch in normalize_text(title):
+            node = delta[node].get(ch, 0)
+            rank = best_at[node]
+            if rank is not None and (best is None or rank[:2] > best[:2]):
+                best = rank
+        
+        return best[2] if best else None
+
+
+# Автомат строится один раз при импорте
+procedure_matcher = ProcedureMatcher(PROCEDURE_PRICES, PROCEDURE_ALIASES)
+
+
+def extract_procedure_from_title(title: str) -> Optional[str]:
+    """Извлекает название процедуры из заголовка события (самое длинное совпадение)"""
+    return procedure_matcher.match(title)
 
 def get_procedure_price(procedure: str) -> Optional[int]:
     """Получает цену процедуры"""
@@ -298,10 +396,29 @@ def get_mock_today_events() -> List[Dict]:
     
     return mock_events
 
-# Инициализация сервиса (будет использоваться в боте)
-calendar_service = GoogleCalendarService()
+# Сервис создается при первом обращении к google_calendar.calendar_service
+_calendar_service: Optional[GoogleCalendarService] = None
+
+
+def get_calendar_service() -> GoogleCalendarService:
+    """Общий экземпляр сервиса (создается лениво, аутентификация - при первом запросе)"""
+    global _calendar_service
+    if _calendar_service is None:
+        _calendar_service = GoogleCalendarService()
+    return _calendar_service
+
+
+def __getattr__(name: str):
+    # Обратная совместимость: from google_calendar import calendar_service
+    if name == 'calendar_service':
+        return get_calendar_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv('.env.test')
+    
     # Тестирование функций
     print("🧪 Тестирование Google Calendar модуля")
     
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Health endpoint на aiohttp в основном event loop бота
+/health - liveness (процесс жив, отвечает сразу после старта),
+/ready  - readiness (polling запущен, аренда получена, состояние БД и кэшей),
+/metrics - метрики в текстовом формате Prometheus.
+Ответы /health и /ready кэшируются на секунду: частые пробы не нагружают бота
+"""
+
+import json
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'qr-payment-bot'
+
+# Время жизни закэшированного ответа (секунды)
+HEALTH_CACHE_TTL = 1.0
+
+
+class HealthServer:
+    """HTTP сервер /health, /ready и /metrics"""
+
+    def __init__(self, ready_probe: Optional[Callable[[], Dict]] = None, host: str = '0.0.0.0',
+                 port: Optional[int] = None, cache_ttl: float = HEALTH_CACHE_TTL,
+                 on_request: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            ready_probe: функция состояния для /ready; ключ 'ready' - готов ли бот
+            host, port: адрес сервера (по умолчанию порт из PORT, как на Render)
+            cache_ttl: сколько секунд отдавать один и тот же ответ
+            on_request: вызывается на внешний запрос (отметка для keep-alive), см. _external
+        """
+        self.ready_probe = ready_probe
+        self.on_request = on_request
+        self.host = host
+        self.port = port if port is not None else int(os.getenv('PORT', 8080))
+        self.cache_ttl = cache_ttl
+        self.started_at = time.monotonic()
+        self.probes = 0  # Сколько раз реально считалось состояние /ready
+        self._cache: Dict[str, Tuple[float, int, bytes]] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def _cached(self, route: str, build: Callable[[], Tuple[int, Dict]]) -> web.Response:
+        now = time.monotonic()
+        cached = self._cache.get(route)
+        if cached is None or cached[0] <= now:
+            status, payload = build()
+            cached = (now + self.cache_ttl, status, json.dumps(payload, default=str).encode())
+            self._cache[route] = cached
+        return web.Response(body=cached[2], status=cached[1], content_type='application/json')
+
+    def _liveness(self) -> Tuple[int, Dict]:
+        return 200, {
+            'status': 'ok',
+            'service': SERVICE_NAME,
+            'uptime': round(time.monotonic() - self.started_at, 1),
+            'timestamp': datetime.now().isoformat(),
+        }
+
+    def _readiness(self) -> Tuple[int, Dict]:
+        self.probes += 1
+        if self.ready_probe is None:
+            return 200, {'status': 'ready'}
+        try:
+            state = self.ready_probe()
+        except Exception as e:
+            logger.error(f"Readiness probe failed: {e}")
+            return 503, {'status': 'error', 'error': str(e)}
+        ready = bool(state.get('ready'))
+        return (200 if ready else 503), {'status': 'ready' if ready else 'starting', **state}
+
+    @staticmethod
+    def _external(request: web.Request) -> bool:
+        """Запрос пришел снаружи через прокси Render (публичный URL)
+        
+        Внутренние health check'и Render ходят в контейнер напрямую, без
+        X-Forwarded-For, и не считаются трафиком для засыпания free-плана
+        """
+        return 'X-Forwarded-For' in request.headers
+
+    def _count_inbound(self, request: web.Request):
+        if self.on_request and self._external(request):
+            self.on_request()
+
+    async def health(self, request: web.Request) -> web.Response:
+        self._count_inbound(request)
+        return self._cached('health', self._liveness)
+
+    async def ready(self, request: web.Request) -> web.Response:
+        self._count_inbound(request)
+        return self._cached('ready', self._readiness)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        self._count_inbound(request)
+        return web.Response(body=metrics.registry.render().encode(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/', self.health)
+        app.router.add_get('/health', self.health)
+        app.router.add_get('/ready', self.ready)
+        app.router.add_get('/metrics', self.metrics)
+        return app
+
+    async def start(self):
+        """Запустить сервер в текущем event loop"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"🌐 Health endpoint listening on port {self.port} (/health, /ready, /metrics)")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
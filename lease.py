@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Аренда (lease) единственного экземпляра бота в базе данных
+Polling и фоновые задачи работают только у держателя аренды. При деплое новый
+экземпляр ждет, пока старый освободит аренду (или она истечет), и сразу стартует -
+без lock файлов в /tmp и долгих пауз на конфликтах getUpdates
+"""
+
+import asyncio
+import os
+import socket
+import time
+import logging
+import uuid
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'qr_bot'
+
+# Срок аренды без продления (секунды): столько ждет новый экземпляр, если старый упал
+LEASE_TTL = float(os.getenv('LEASE_TTL', '15'))
+
+# Как часто свободный экземпляр проверяет аренду
+LEASE_POLL_INTERVAL = 0.5
+
+
+def make_holder_id() -> str:
+    """Идентификатор экземпляра: хост, PID и случайный суффикс"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class BotLease:
+    """Аренда в таблице bot_lease с продлением (heartbeat)"""
+
+    def __init__(self, database, name: str = LEASE_NAME, ttl: float = LEASE_TTL,
+                 poll_interval: float = LEASE_POLL_INTERVAL, holder: Optional[str] = None):
+        self.database = database
+        self.name = name
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.holder = holder or make_holder_id()
+
+        self.held = False
+        self.lost = asyncio.Event()  # Аренду перехватили или не удалось продлить
+        self._renewed_at = 0.0
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def _try_acquire(self) -> bool:
+        try:
+            return await asyncio.to_thread(self.database.acquire_lease, self.name, self.holder, self.ttl)
+        except Exception as e:
+            logger.error(f"Lease check failed: {e}")
+            return False
+
+    async def acquire(self) -> float:
+        """Дождаться аренды
+
+        Returns:
+            Время ожидания в секундах
+        """
+        start = time.monotonic()
+        announced = False
+        while not await self._try_acquire():
+            if not announced:
+                current = await asyncio.to_thread(self.database.get_lease, self.name)
+                if current:
+                    logger.info(f"⏳ Waiting for lease held by {current['holder']} "
+                                f"(expires in {max(current['expires_at'] - time.time(), 0):.0f}s)")
+                announced = True
+            await asyncio.sleep(self.poll_interval)
+
+        self.held = True
+        self.lost.clear()
+        self._renewed_at = time.monotonic()
+        waited = time.monotonic() - start
+        logger.info(f"👑 Lease acquired by {self.holder} after {waited:.1f}s")
+        return waited
+
+    async def _heartbeat(self):
+        interval = self.ttl / 3
+        while self.held:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await asyncio.to_thread(self.database.acquire_lease, self.name, self.holder, self.ttl)
+            except Exception as e:
+                # БД недоступна: держим аренду, пока она не могла истечь
+                logger.warning(f"⚠️ Lease renewal failed: {e}")
+                renewed = time.monotonic() - self._renewed_at < self.ttl
+            else:
+                if renewed:
+                    self._renewed_at = time.monotonic()
+
+            if not renewed:
+                logger.error(f"❌ Lease lost by {self.holder}, stopping")
+                self.held = False
+                self.lost.set()
+
+    def start_heartbeat(self):
+        """Запустить фоновое продление аренды"""
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def release(self):
+        """Остановить продление и освободить аренду для следующего экземпляра"""
+        if self._heartbeat_task is not None and not self._heartbeat_task.done():
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        self._heartbeat_task = None
+
+        if not self.held:
+            return
+        self.held = False
+        try:
+            await asyncio.to_thread(self.database.release_lease, self.name, self.holder)
+            logger.info(f"🔓 Lease released by {self.holder}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release lease (expires in {self.ttl:.0f}s): {e}")
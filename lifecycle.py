@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Жизненный цикл процесса бота: остановка по сигналу и упорядоченное завершение
+Бот ждет asyncio.Event, который выставляют обработчики SIGTERM/SIGINT, и в
+простое не просыпается. При остановке шаги выполняются по порядку в пределах
+общего дедлайна; время остановки пишется в лог
+"""
+
+import asyncio
+import os
+import signal
+import time
+import logging
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Общий дедлайн остановки (секунды); Render ждет 30 с после SIGTERM
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '20'))
+
+ShutdownStep = Tuple[str, Callable[[], Awaitable]]
+
+
+def install_signal_handlers(stop_event: asyncio.Event,
+                            signals: Sequence[int] = (signal.SIGTERM, signal.SIGINT)) -> List[int]:
+    """Выставлять stop_event по сигналам (вызывать внутри работающего event loop)
+
+    Returns:
+        Сигналы, для которых обработчик установлен
+    """
+    loop = asyncio.get_running_loop()
+    installed = []
+    for sig in signals:
+        try:
+            loop.add_signal_handler(sig, _request_stop, stop_event, signal.Signals(sig).name)
+            installed.append(sig)
+        except (NotImplementedError, RuntimeError):
+            # Windows или не главный поток: остается KeyboardInterrupt
+            pass
+    return installed
+
+
+def _request_stop(stop_event: asyncio.Event, name: str):
+    if not stop_event.is_set():
+        logger.info(f"🛑 Received {name}, shutting down...")
+        stop_event.set()
+
+
+async def wait_for_any(*events: Optional[asyncio.Event]):
+    """Ждать первый из выставленных событий (None пропускаются)"""
+    waiters = [asyncio.create_task(event.wait()) for event in events if event is not None]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+
+async def run_shutdown(steps: Sequence[ShutdownStep], timeout: float = SHUTDOWN_TIMEOUT) -> float:
+    """Выполнить шаги остановки по порядку в пределах общего дедлайна
+
+    Шаг, не успевший до дедлайна или упавший, пишется в лог; следующие шаги
+    все равно выполняются (каждому достается остаток времени, но не меньше 1 с).
+
+    Returns:
+        Длительность остановки в секундах
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    for name, step in steps:
+        remaining = max(deadline - time.monotonic(), 1.0)
+        step_start = time.monotonic()
+        try:
+            await asyncio.wait_for(step(), remaining)
+            logger.info(f"  ✔️ {name} ({time.monotonic() - step_start:.2f}s)")
+        except asyncio.TimeoutError:
+            logger.error(f"  ⏰ {name} did not finish in {remaining:.1f}s, skipped")
+        except Exception as e:
+            logger.error(f"  ❌ {name} failed: {e}")
+
+    elapsed = time.monotonic() - start
+    logger.info(f"⏱️ Shutdown drained in {elapsed:.2f}s")
+    return elapsed
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram Bot API для нагрузочных тестов
+Отвечает на методы, которые вызывает бот, как настоящий API (минимальные
+объекты Message/User), и записывает вызовы: сколько и когда отправлено.
+Апдейты, добавленные через push_update, бот забирает long polling'ом (getUpdates);
+expect() ждет ответ бота в конкретный чат
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'QR Bot', 'username': 'qr_test_bot'}
+
+
+class FakeBotAPI:
+    """Локальный сервер Bot API: /bot<token>/<method>"""
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: задержка ответа на каждый метод, кроме getUpdates (сеть до Telegram)
+        """
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.sent: List[Tuple[float, str, Optional[int]]] = []  # (время, метод, chat_id)
+        self._message_ids = itertools.count(1)
+        self._waiters: List[Tuple[str, int, asyncio.Future]] = []
+        self._chat_waiters: Dict[int, List[Tuple[frozenset, asyncio.Future]]] = {}
+        self._updates: Deque[Dict] = deque()
+        self._new_updates: Optional[asyncio.Event] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        form = await request.post()
+        return {key: value for key, value in form.items() if isinstance(value, str)}
+
+    def _message(self, params: Dict, **fields) -> Dict:
+        chat_id = int(params.get('chat_id', 0))
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        message.update(fields)
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self._params(request)
+        self.calls[method] += 1
+
+        if self.latency and method != 'getUpdates':
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'getUpdates':
+            result = await self._get_updates(params)
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self._message(params, text=params.get('text', ''))
+        elif method == 'sendPhoto':
+            result = self._message(params, photo=[{'file_id': 'qr', 'file_unique_id': 'qr', 'width': 300, 'height': 300}])
+        else:
+            # answerCallbackQuery, deleteMessage, setWebhook, deleteWebhook ...
+            result = True
+
+        chat_id = int(params['chat_id']) if params.get('chat_id') else None
+        self.sent.append((time.perf_counter(), method, chat_id))
+        self._notify(method)
+        if chat_id is not None:
+            self._notify_chat(chat_id, method, params)
+        return web.json_response({'ok': True, 'result': result}, dumps=json.dumps)
+
+    async def _get_updates(self, params: Dict) -> List[Dict]:
+        """Long polling: подтвержденные (update_id < offset) апдейты удаляются,
+        при пустой очереди запрос ждет новых до таймаута клиента (не больше секунды)"""
+        offset = int(params.get('offset') or 0)
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            if self._new_updates is None:
+                self._new_updates = asyncio.Event()
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), min(float(params.get('timeout') or 0), 1.0))
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._updates, int(params.get('limit') or 100)))
+
+    def push_update(self, update: Dict):
+        """Добавить апдейт в очередь getUpdates (update_id должны возрастать)"""
+        self._updates.append(update)
+        if self._new_updates is not None:
+            self._new_updates.set()
+
+    def expect(self, chat_id: int, methods: Iterable[str]) -> asyncio.Future:
+        """Future первого следующего ответа бота в чат одним из методов: (метод, параметры)"""
+        future = asyncio.get_running_loop().create_future()
+        self._chat_waiters.setdefault(chat_id, []).append((frozenset(methods), future))
+        return future
+
+    def _notify_chat(self, chat_id: int, method: str, params: Dict):
+        waiters = self._chat_waiters.get(chat_id)
+        if not waiters:
+            return
+        for waiter in list(waiters):
+            methods, future = waiter
+            if future.done():
+                waiters.remove(waiter)
+            elif method in methods:
+                future.set_result((method, params))
+                waiters.remove(waiter)
+        if not waiters:
+            del self._chat_waiters[chat_id]
+
+    def _notify(self, method: str):
+        for waiter in list(self._waiters):
+            name, count, future = waiter
+            if name == method and self.calls[method] >= count and not future.done():
+                future.set_result(True)
+                self._waiters.remove(waiter)
+
+    async def wait_for(self, method: str, count: int, timeout: float):
+        """Дождаться count вызовов метода"""
+        if self.calls[method] >= count:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((method, count, future))
+        await asyncio.wait_for(future, timeout)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=10 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_get('/bot{token}/{method}', self.handle)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запустить сервер; возвращает base_url для Application.builder().base_url()"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f'http://{host}:{port}/bot'
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест бота в режиме long polling: сотни виртуальных сотрудников
+против fake Bot API, полностью офлайн
+Бот запускается отдельным процессом (python qr.py, как на Render) и забирает
+апдейты через getUpdates. Каждый виртуальный пользователь проходит сценарий
+шаг за шагом: отправляет апдейт, ждет ответ бота в свой чат, делает паузу
+"на подумать" и переходит к следующему шагу.
+
+Сценарии (доля пользователей):
+    button (70%) - /start → "Создать QR" → кнопка суммы → кнопка услуги → QR
+    typed  (20%) - "Создать QR" → сумма текстом → кнопка услуги → QR
+    info   (10%) - /start → "Реквизиты счета" → "Помощь"
+
+Отчет: пропускная способность (сценариев и апдейтов в секунду), перцентили
+задержки по шагам (от отправки апдейта до ответа бота), ошибки, CPU и память бота
+
+Запуск: python loadtest/polling_load.py [--users 300] [--ramp 10] [--think 0.5] [--api-latency 0.05]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import psutil
+
+from fake_bot_api import FakeBotAPI
+from telegram_updates import bot_environment, callback_update, command_update, text_update
+
+READY_TIMEOUT = 60
+STEP_TIMEOUT = 30
+STOP_TIMEOUT = 30
+
+FIRST_CHAT = 100_000
+BUTTON_AMOUNTS = range(500, 1900, 100)  # Как в get_amount_keyboard
+SERVICE_KEYS = ['uprava_barveni', 'laminace_ras', 'barveni_ras', 'laminace_oboci_ras', 'liceni_uces', 'none']
+
+
+class Step(NamedTuple):
+    """Шаг сценария: апдейт и методы, которыми бот на него отвечает"""
+    name: str
+    update: Callable[[int], Dict]
+    replies: frozenset
+
+
+def _steps(rng: random.Random) -> Dict[str, List[Step]]:
+    amount = rng.choice(BUTTON_AMOUNTS)
+    typed_amount = rng.randrange(300, 4000)
+    service = rng.choice(SERVICE_KEYS)
+    message = frozenset({'sendMessage'})
+    return {
+        'button': [
+            Step('start', lambda chat: command_update(chat, '/start'), message),
+            Step('payment', lambda chat: text_update(chat, '💰 Создать QR-код для оплаты'), message),
+            Step('amount_button', lambda chat: callback_update(chat, f'amount_{amount}'), frozenset({'editMessageText'})),
+            Step('service_qr', lambda chat: callback_update(chat, f'service_{service}'), frozenset({'sendPhoto'})),
+        ],
+        'typed': [
+            Step('payment', lambda chat: text_update(chat, '💰 Создать QR-код для оплаты'), message),
+            Step('amount_typed', lambda chat: text_update(chat, str(typed_amount)), message),
+            Step('service_qr', lambda chat: callback_update(chat, f'service_{service}'), frozenset({'sendPhoto'})),
+        ],
+        'info': [
+            Step('start', lambda chat: command_update(chat, '/start'), message),
+            Step('info', lambda chat: text_update(chat, 'ℹ️ Реквизиты счета'), message),
+            Step('help', lambda chat: text_update(chat, '❓ Помощь'), message),
+        ],
+    }
+
+
+SCENARIO_WEIGHTS = {'button': 0.7, 'typed': 0.2, 'info': 0.1}
+
+
+class Results:
+    """Задержки по шагам, ошибки и завершенные сценарии"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()  # (шаг, вид ошибки)
+        self.scenarios: Counter = Counter()
+        self.failed_scenarios: Counter = Counter()
+        self.updates = 0
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+async def virtual_user(api: FakeBotAPI, chat_id: int, scenario: str, steps: List[Step],
+                       delay: float, think: float, rng: random.Random, results: Results):
+    """Один сотрудник: шаги сценария по очереди, следующий - после ответа бота"""
+    await asyncio.sleep(delay)
+    for step in steps:
+        reply = api.expect(chat_id, step.replies)
+        sent_at = time.perf_counter()
+        api.push_update(step.update(chat_id))
+        results.updates += 1
+        try:
+            method, params = await asyncio.wait_for(reply, STEP_TIMEOUT)
+        except asyncio.TimeoutError:
+            results.errors[(step.name, 'timeout')] += 1
+            results.failed_scenarios[scenario] += 1
+            return
+        results.latencies[step.name].append(time.perf_counter() - sent_at)
+        if str(params.get('text', '')).startswith('❌'):
+            results.errors[(step.name, 'error reply')] += 1
+            results.failed_scenarios[scenario] += 1
+            return
+        if think:
+            await asyncio.sleep(rng.uniform(0, think * 2))
+    results.scenarios[scenario] += 1
+
+
+def start_bot(base_url: str, workdir: str) -> subprocess.Popen:
+    """python qr.py с fake API и временной SQLite; лог - в файл"""
+    env = dict(os.environ)
+    env.update(bot_environment(base_url, os.path.join(workdir, 'loadtest.db')))
+    env['QR_CACHE_FILE'] = os.path.join(workdir, 'qr_cache.json')
+    for name in ('RENDER', 'PORT', 'TRACE_FILE'):
+        env.pop(name, None)
+    log = open(os.path.join(workdir, 'bot.log'), 'w')
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'qr.py')], cwd=workdir, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def tail(path: str, lines: int = 20) -> str:
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return ''.join(f.readlines()[-lines:])
+
+
+async def run_load(users: int, ramp: float, think: float, api_latency: float = 0.0, seed: int = 1) -> Dict:
+    """Запустить бота и виртуальных пользователей; возвращает сводку прогона"""
+    api = FakeBotAPI(latency=api_latency)
+    base_url = await api.start()
+    rng = random.Random(seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        bot = start_bot(base_url, workdir)
+        process = psutil.Process(bot.pid)
+        try:
+            try:
+                await api.wait_for('getUpdates', 1, READY_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"Bot did not start polling:\n{tail(os.path.join(workdir, 'bot.log'))}")
+
+            results = Results()
+            cpu_before = sum(process.cpu_times()[:2])
+            scenarios = rng.choices(list(SCENARIO_WEIGHTS), weights=list(SCENARIO_WEIGHTS.values()), k=users)
+            tasks = [
+                virtual_user(api, FIRST_CHAT + i, scenario, _steps(rng)[scenario],
+                             ramp * i / users, think, random.Random(seed + i), results)
+                for i, scenario in enumerate(scenarios)
+            ]
+            start = time.perf_counter()
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+            cpu = sum(process.cpu_times()[:2]) - cpu_before
+            rss = process.memory_info().rss
+        finally:
+            if bot.poll() is None:
+                bot.send_signal(signal.SIGTERM)
+                try:
+                    await asyncio.to_thread(bot.wait, STOP_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    bot.kill()
+            await api.stop()
+
+    return {
+        'users': users,
+        'elapsed': elapsed,
+        'results': results,
+        'bot_cpu': cpu,
+        'bot_rss': rss,
+        'api_calls': dict(api.calls),
+        'exit_code': bot.returncode,
+    }
+
+
+def print_report(summary: Dict, ramp: float, think: float, api_latency: float):
+    results: Results = summary['results']
+    elapsed = summary['elapsed']
+    completed = sum(results.scenarios.values())
+    failed = sum(results.failed_scenarios.values())
+
+    print(f"👥 {summary['users']} пользователей, разгон {ramp:g} с, пауза ~{think:g} с, "
+          f"задержка API {api_latency * 1000:.0f} мс\n")
+    print(f"Сценарии: {completed} завершено, {failed} с ошибкой за {elapsed:.1f} с "
+          f"→ {completed / elapsed:.1f} сценариев/с, {results.updates / elapsed:.1f} апдейтов/с")
+    for scenario in SCENARIO_WEIGHTS:
+        print(f"  {scenario:8s} {results.scenarios[scenario]:>6} ок, {results.failed_scenarios[scenario]:>4} ошибок")
+
+    print(f"\n{'шаг':15s} {'ответов':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    for name, latencies in sorted(results.latencies.items()):
+        print(f"{name:15s} {len(latencies):>8} {percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>9.1f} {percentile(latencies, 0.99) * 1000:>9.1f} "
+              f"{max(latencies) * 1000:>9.1f}")
+
+    total_steps = results.updates
+    print(f"\nОшибки: {results.error_count} из {total_steps} шагов ({results.error_count / max(total_steps, 1):.2%})")
+    for (step, kind), count in sorted(results.errors.items()):
+        print(f"  {step}: {kind} × {count}")
+
+    calls = ', '.join(f"{method} {count}" for method, count in sorted(summary['api_calls'].items()))
+    print(f"\nВызовы Bot API: {calls}")
+    print(f"Бот: CPU {summary['bot_cpu']:.1f} с ({summary['bot_cpu'] / elapsed:.0%} ядра), "
+          f"RSS {summary['bot_rss'] / 1024 / 1024:.0f} МБ, код выхода {summary['exit_code']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота (long polling, fake Bot API)')
+    parser.add_argument('--users', type=int, default=300, help='виртуальных пользователей')
+    parser.add_argument('--ramp', type=float, default=10.0, help='за сколько секунд стартуют все пользователи')
+    parser.add_argument('--think', type=float, default=0.5, help='средняя пауза между шагами, с')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='задержка ответа Bot API, с')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='доля ошибок, выше которой код выхода 1')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args.users, args.ramp, args.think, args.api_latency, args.seed))
+    print_report(summary, args.ramp, args.think, args.api_latency)
+
+    results: Results = summary['results']
+    if results.error_count / max(results.updates, 1) > args.max_error_rate:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест scale-out режима: фронт + N воркеров против fake Bot API
+Каждый чат проходит полный сценарий оплаты (кнопка "Создать QR-код" -> сумма ->
+услуга), сумма у каждого чата своя, поэтому каждый QR рендерится заново.
+Сравнивается пропускная способность (QR/с) и задержка при разном числе воркеров
+
+Запуск: python loadtest/scale_out_load.py [чатов] [воркеры через запятую]
+Пример: python loadtest/scale_out_load.py 400 1,2,4
+"""
+
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp
+from aiohttp import web
+
+from fake_bot_api import FakeBotAPI
+from telegram_updates import bot_environment, callback_update, text_update
+from scale_out import ShardRouter, WEBHOOK_PATH, create_front_app
+
+READY_TIMEOUT = 60
+RUN_TIMEOUT = 300
+
+
+def scenario(chat_id: int, amount: int) -> list:
+    """Апдейты одного чата: сценарий оплаты с уникальной суммой"""
+    return [
+        text_update(chat_id, '💰 Создать QR-код для оплаты'),
+        text_update(chat_id, str(amount)),
+        callback_update(chat_id, 'service_none'),
+    ]
+
+
+def configure_environment(base_url: str, database_path: str):
+    """Окружение воркеров (наследуется процессами): fake API и временная SQLite"""
+    os.environ.update(bot_environment(base_url, database_path))
+    os.environ.pop('RENDER', None)
+
+
+async def run_once(workers: int, chats: int) -> dict:
+    api = FakeBotAPI()
+    base_url = await api.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(base_url, os.path.join(tmp, 'loadtest.db'))
+
+        router = ShardRouter(workers, log_level='WARNING')
+        router.start()
+        runner = web.AppRunner(create_front_app(router, secret=None))
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        front_url = f"http://127.0.0.1:{runner.addresses[0][1]}{WEBHOOK_PATH}"
+
+        try:
+            await api.wait_for('getMe', workers, READY_TIMEOUT)
+
+            first_chat = 10_000
+            posted_at = {}
+            errors = 0
+
+            async with aiohttp.ClientSession() as session:
+                async def drive(chat_id: int):
+                    nonlocal errors
+                    posted_at[chat_id] = time.perf_counter()
+                    for update in scenario(chat_id, 100 + chat_id - first_chat):
+                        async with session.post(front_url, data=json.dumps(update)) as response:
+                            if response.status != 200:
+                                errors += 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*(drive(chat_id) for chat_id in range(first_chat, first_chat + chats)))
+                await api.wait_for('sendPhoto', chats, RUN_TIMEOUT)
+                elapsed = time.perf_counter() - start
+
+            latencies = [sent_at - posted_at[chat_id] for sent_at, method, chat_id in api.sent
+                         if method == 'sendPhoto' and chat_id in posted_at]
+        finally:
+            await runner.cleanup()
+            await asyncio.to_thread(router.stop)
+            await api.stop()
+
+    latencies.sort()
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'throughput': chats / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'errors': errors,
+        'dispatched': router.dispatched,
+    }
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    worker_counts = ([int(n) for n in sys.argv[2].split(',')] if len(sys.argv) > 2
+                     else sorted({1, os.cpu_count() or 1}))
+
+    print(f"Чатов: {chats} (по 3 апдейта, каждый QR уникален), ядер: {os.cpu_count()}\n")
+    print(f"{'воркеры':>8} {'время, с':>9} {'QR/с':>8} {'p50, мс':>9} {'p95, мс':>9} {'ошибки':>7}  апдейтов по воркерам")
+    baseline = None
+    for workers in worker_counts:
+        result = asyncio.run(run_once(workers, chats))
+        baseline = baseline or result['throughput']
+        print(f"{workers:>8} {result['elapsed']:>9.2f} {result['throughput']:>8.1f} "
+              f"{result['p50'] * 1000:>9.0f} {result['p95'] * 1000:>9.0f} {result['errors']:>7}  "
+              f"{result['dispatched']}  (x{result['throughput'] / baseline:.2f})")
+
+
+if __name__ == '__main__':
+    main()
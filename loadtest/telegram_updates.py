@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Апдейты Telegram и окружение бота для нагрузочных тестов
+Апдейты - минимальные JSON объекты, которые python-telegram-bot принимает
+как настоящие (сообщение с текстом, нажатие inline кнопки)
+"""
+
+import itertools
+import time
+from typing import Dict
+
+TOKEN = '123456:LOADTEST'
+
+_update_ids = itertools.count(1)
+
+
+def _user(chat_id: int) -> dict:
+    return {'id': chat_id, 'is_bot': False, 'first_name': f'Master {chat_id}'}
+
+
+def text_update(chat_id: int, text: str) -> dict:
+    return {
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_update_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': _user(chat_id),
+            'text': text,
+        },
+    }
+
+
+def command_update(chat_id: int, command: str) -> dict:
+    """Команда (/start): Telegram помечает ее entity bot_command"""
+    update = text_update(chat_id, command)
+    update['message']['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command.split()[0])}]
+    return update
+
+
+def callback_update(chat_id: int, data: str) -> dict:
+    return {
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'from': _user(chat_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': next(_update_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': 'services',
+            },
+        },
+    }
+
+
+def bot_environment(base_url: str, database_path: str) -> Dict[str, str]:
+    """Окружение бота: fake API, временная SQLite, без календаря, отчетов и админов"""
+    return {
+        'BOT_TOKEN': TOKEN,
+        'TELEGRAM_API_URL': base_url,
+        'DATABASE_URL': '',
+        'DATABASE_PATH': database_path,
+        'GOOGLE_CALENDAR_ENABLED': 'false',
+        'DAILY_REPORT_TIME': 'off',
+        'COUNTERS_RECONCILE_HOURS': '0',
+        'ADMIN_TELEGRAM_ID': '',
+    }
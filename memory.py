@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Память процесса: RSS, места аллокаций (tracemalloc) и бюджет с мягкими лимитами
+На Render free plan - 512 МБ, при превышении платформа убивает процесс.
+Фоновая проверка сравнивает RSS с лимитами и заранее сжимает кэши
+(QR-коды, отчеты, user_data, буфер трасс): на мягком лимите - частично,
+на критическом - целиком
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import inspect
+import os
+import time
+import tracemalloc
+import logging
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Мягкий лимит RSS (МБ): выше - кэши сжимаются частично
+MEMORY_SOFT_LIMIT_MB = int(os.getenv('MEMORY_SOFT_LIMIT_MB', '380'))
+
+# Критический лимит RSS (МБ): выше - кэши сбрасываются целиком
+MEMORY_CRITICAL_LIMIT_MB = int(os.getenv('MEMORY_CRITICAL_LIMIT_MB', '450'))
+
+# Интервал проверки RSS (секунды), 0 - выключено
+MEMORY_CHECK_INTERVAL = int(os.getenv('MEMORY_CHECK_INTERVAL', '30'))
+
+# Глубина стека аллокации для tracemalloc (/mem start)
+MEMORY_TRACE_FRAMES = int(os.getenv('MEMORY_TRACE_FRAMES', '1'))
+
+SOFT = 'soft'
+CRITICAL = 'critical'
+
+# Сжатие кэша: получает уровень, возвращает сколько записей освобождено
+Shrinker = Callable[[str], Union[int, Awaitable[int]]]
+
+_process = psutil.Process()
+
+
+def rss_bytes() -> int:
+    """Resident set size процесса"""
+    return _process.memory_info().rss
+
+
+def _load_libc():
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+    except OSError:
+        return None
+
+
+_libc = _load_libc()
+
+
+def release_free_memory():
+    """Вернуть освобожденную память ОС (glibc держит ее в арене, и RSS не падает)"""
+    if _libc is not None and hasattr(_libc, 'malloc_trim'):
+        _libc.malloc_trim(0)
+
+
+class MemoryBudget:
+    """Мягкие лимиты RSS и зарегистрированные способы освободить память"""
+
+    def __init__(self, soft_limit_mb: int = MEMORY_SOFT_LIMIT_MB,
+                 critical_limit_mb: int = MEMORY_CRITICAL_LIMIT_MB,
+                 rss: Callable[[], int] = rss_bytes):
+        self.soft_limit = soft_limit_mb * 1024 * 1024
+        self.critical_limit = critical_limit_mb * 1024 * 1024
+        self.rss = rss
+        self.shrinks: Counter = Counter()  # уровень -> сколько раз сжимали
+        self.last_shrink: Optional[Dict] = None
+        self._shrinkers: List[Tuple[str, Shrinker]] = []
+
+    def register(self, name: str, shrink: Shrinker):
+        """Добавить кэш, который можно сжать (вызываются в порядке регистрации)"""
+        self._shrinkers.append((name, shrink))
+
+    def level(self, rss: int) -> Optional[str]:
+        if rss >= self.critical_limit:
+            return CRITICAL
+        if rss >= self.soft_limit:
+            return SOFT
+        return None
+
+    async def enforce(self, level: Optional[str] = None) -> Optional[Dict]:
+        """Сжать кэши, если RSS выше лимита (или принудительно до уровня level)
+
+        Returns:
+            Сводка (уровень, RSS до/после, освобождено по кэшам) или None, если лимит не превышен
+        """
+        before = self.rss()
+        level = level or self.level(before)
+        if level is None:
+            return None
+
+        freed = {}
+        for name, shrink in self._shrinkers:
+            try:
+                result = shrink(level)
+                if inspect.isawaitable(result):
+                    result = await result
+                freed[name] = result
+            except Exception as e:
+                logger.error(f"❌ Failed to shrink {name}: {e}")
+        gc.collect()
+        release_free_memory()
+
+        after = self.rss()
+        self.shrinks[level] += 1
+        self.last_shrink = {
+            'time': time.time(),
+            'level': level,
+            'rss_before': before,
+            'rss_after': after,
+            'freed': freed,
+        }
+        logger.warning(f"🧹 Memory {level} limit: RSS {before / 1024 / 1024:.0f} → {after / 1024 / 1024:.0f} MB, "
+                       f"freed {freed}")
+        return self.last_shrink
+
+
+# ----------------------------------------------------------------------
+# tracemalloc: места аллокаций по запросу (замедляет аллокации, поэтому не всегда)
+# ----------------------------------------------------------------------
+
+_previous_snapshot: Optional[tracemalloc.Snapshot] = None
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def is_tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def start_tracing(frames: int = MEMORY_TRACE_FRAMES) -> bool:
+    """Включить tracemalloc; False - уже включен (например, PYTHONTRACEMALLOC)"""
+    global _previous_snapshot
+    if tracemalloc.is_tracing():
+        return False
+    _previous_snapshot = None
+    tracemalloc.start(frames)
+    logger.info(f"🔬 tracemalloc started ({frames} frame(s))")
+    return True
+
+
+def stop_tracing() -> bool:
+    global _previous_snapshot
+    if not tracemalloc.is_tracing():
+        return False
+    tracemalloc.stop()
+    _previous_snapshot = None
+    logger.info("🔬 tracemalloc stopped")
+    return True
+
+
+def _site(statistic) -> str:
+    frame = statistic.traceback[0]
+    path = frame.filename
+    for marker in ('site-packages' + os.sep, 'lib' + os.sep):
+        if marker in path:
+            path = path.split(marker, 1)[1]
+            break
+    else:
+        path = os.path.basename(path)
+    return f'{path}:{frame.lineno}'
+
+
+def allocation_report(limit: int = 10) -> Dict:
+    """Топ мест аллокаций и рост с прошлого вызова (tracemalloc должен быть включен)
+
+    Returns:
+        {'traced', 'peak', 'top': [(место, байт, блоков)], 'growth': [(место, +байт, +блоков)]}
+    """
+    global _previous_snapshot
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    traced, peak = tracemalloc.get_traced_memory()
+    report = {
+        'traced': traced,
+        'peak': peak,
+        'top': [(_site(stat), stat.size, stat.count) for stat in snapshot.statistics('lineno')[:limit]],
+        'growth': [],
+    }
+    if _previous_snapshot is not None:
+        report['growth'] = [(_site(stat), stat.size_diff, stat.count_diff)
+                            for stat in snapshot.compare_to(_previous_snapshot, 'lineno')[:limit]
+                            if stat.size_diff > 0]
+    _previous_snapshot = snapshot
+    return report
+
+
+# Общий бюджет памяти бота
+memory_budget = MemoryBudget()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+HTTPXRequest с метриками: длительность и ошибки каждого вызова Bot API
+(sendMessage, sendPhoto, answerCallbackQuery ...) по имени метода;
+внутри обработчика вызов попадает в трассу как span telegram.<метод>
+"""
+
+import time
+from typing import Optional, Tuple
+
+from telegram.request import HTTPXRequest, RequestData
+
+from metrics import TELEGRAM_API_DURATION, TELEGRAM_API_ERRORS
+from tracing import tracer
+
+
+class MeteredRequest(HTTPXRequest):
+    """HTTPXRequest, записывающий telegram_api_duration_seconds{method}"""
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            with tracer.span(f'telegram.{api_method}', root=False) as span:
+                status, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+                if span is not None:
+                    span.attributes['http.status'] = status
+        except Exception:
+            TELEGRAM_API_ERRORS.inc(method=api_method)
+            raise
+        finally:
+            TELEGRAM_API_DURATION.observe(time.perf_counter() - start, method=api_method)
+        if status >= 400:
+            TELEGRAM_API_ERRORS.inc(method=api_method)
+        return status, payload
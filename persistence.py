@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Хранение context.user_data в базе данных (BasePersistence для python-telegram-bot)
+Состояние диалога (ожидание суммы, выбранная сумма, ожидание услуги) переживает
+перезапуск и редеплой. Чтение - лениво, при первом апдейте пользователя;
+запись - отложенная и пачкой, одной транзакцией БД
+"""
+
+import asyncio
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Set
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Как часто Application отдает измененные user_data (секунды)
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '5'))
+
+# Задержка записи: изменения за это время уходят в БД одной пачкой
+PERSISTENCE_WRITE_DELAY = 1.0
+
+
+class DatabasePersistence(BasePersistence):
+    """Persistence только для user_data поверх Database"""
+
+    def __init__(self, database, update_interval: float = PERSISTENCE_UPDATE_INTERVAL,
+                 write_delay: float = PERSISTENCE_WRITE_DELAY):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.database = database
+        self.write_delay = write_delay
+
+        self._loaded: Set[int] = set()
+        self._last_seen: Dict[int, float] = {}  # user_id -> time.monotonic() последнего апдейта
+        self._pending: Dict[int, Optional[Dict]] = {}
+        self._evicted: Set[int] = set()  # Выгружены из памяти: drop_user_data не трогает БД
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self.writes = 0  # Количество записей в БД (пачек)
+
+    # ------------------------------------------------------------------
+    # user_data
+    # ------------------------------------------------------------------
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        # Ничего не загружаем при старте: данные пользователя читаются при первом апдейте
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        """Вызывается перед каждым апдейтом; к БД обращаемся только первый раз"""
+        self._last_seen[user_id] = time.monotonic()
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+
+        # Несохраненная запись новее, чем строка в БД
+        if user_id in self._pending:
+            return
+
+        try:
+            stored = await asyncio.to_thread(self.database.get_user_state, user_id)
+        except Exception as e:
+            logger.error(f"Failed to load user_data for {user_id}: {e}")
+            return
+
+        if stored:
+            for key, value in stored.items():
+                user_data.setdefault(key, value)
+            logger.info(f"💾 Restored conversation state for user {user_id}")
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._loaded.add(user_id)
+        self._pending[user_id] = data
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        # Application.drop_user_data после evict - строка в БД остается
+        if user_id in self._evicted:
+            self._evicted.discard(user_id)
+            return
+        self._pending[user_id] = None
+        self._schedule_flush()
+
+    # ------------------------------------------------------------------
+    # Отложенная запись
+    # ------------------------------------------------------------------
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_write())
+
+    async def _delayed_write(self):
+        await asyncio.sleep(self.write_delay)
+        await self._write_pending()
+
+    async def _write_pending(self):
+        async with self._write_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self.database.save_user_states, batch)
+                self.writes += 1
+            except Exception as e:
+                # Возвращаем в очередь, если за это время не пришли более новые данные
+                for user_id, data in batch.items():
+                    self._pending.setdefault(user_id, data)
+                logger.error(f"Failed to save user_data for {len(batch)} user(s): {e}")
+
+    async def flush(self) -> None:
+        """Записать все отложенные изменения (вызывается при остановке Application)"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self._write_pending()
+
+    @property
+    def pending(self) -> int:
+        """Количество пользователей с несохраненными изменениями"""
+        return len(self._pending)
+
+    def evict(self, user_id: int):
+        """Забыть, что user_data пользователя загружены (при следующем апдейте прочитаются из БД)
+
+        Вызывается перед Application.drop_user_data: следующий drop_user_data для
+        этого пользователя только убирает данные из памяти, строка в БД остается
+        """
+        self._loaded.discard(user_id)
+        self._last_seen.pop(user_id, None)
+        self._evicted.add(user_id)
+
+    def idle_users(self, idle_seconds: float) -> List[int]:
+        """Загруженные пользователи без апдейтов idle_seconds и без несохраненных изменений"""
+        threshold = time.monotonic() - idle_seconds
+        return [user_id for user_id, seen in self._last_seen.items()
+                if seen <= threshold and user_id not in self._pending]
+
+    # ------------------------------------------------------------------
+    # Не используется: храним только user_data
+    # ------------------------------------------------------------------
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Сэмплирующий профилировщик для продакшена
+Фоновый поток раз в PROFILE_INTERVAL секунд снимает стеки всех потоков
+(event loop, пулы asyncio.to_thread, потоки БД) через sys._current_frames().
+Код бота не инструментируется, поэтому накладные расходы - доли процента
+на 100 Гц. Результат - collapsed stacks ("поток;f1;f2;f3 N"), которые
+понимают flamegraph.pl, speedscope и inferno
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Период сэмплирования (секунды): 0.01 = 100 Гц
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))
+
+# Максимальная длительность одного профиля (секунды)
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '300'))
+
+# Профиль первых N секунд после старта (0 - выключено)
+PROFILE_ON_START = int(os.getenv('PROFILE_ON_START', '0'))
+
+# Куда сохранять профили, снятые по PROFILE_ON_START
+PROFILE_DIR = os.getenv('PROFILE_DIR', '.')
+
+# Функции, в которых поток ждет работу: такие сэмплы не показываем
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),      # event loop без готовых событий
+    ('threading.py', 'wait'),        # Event.wait / Condition.wait
+    ('thread.py', '_worker'),        # свободный поток ThreadPoolExecutor
+    ('queue.py', 'get'),
+}
+
+Stack = Tuple[str, ...]
+
+
+class SamplingProfiler:
+    """Профиль всех потоков процесса по сэмплам стеков"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, include_idle: bool = False):
+        """
+        Args:
+            interval: период сэмплирования (секунды)
+            include_idle: оставить сэмплы простаивающих потоков
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+        return label
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) not in IDLE_FRAMES:
+            return False
+        # select(0) - у event loop есть готовые колбэки, это работа, а не ожидание
+        return frame.f_code.co_name != 'select' or frame.f_locals.get('timeout') != 0
+
+    def _stack(self, frame) -> Stack:
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def _sample(self, own_ident: int, thread_names: Dict[int, str]):
+        frames = sys._current_frames()
+        if not frames.keys() <= thread_names.keys():
+            # Новый поток (например, в пуле to_thread) - обновляем имена
+            thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+        for ident, frame in frames.items():
+            if ident == own_ident or (not self.include_idle and self._is_idle(frame)):
+                continue
+            self.stacks[(thread_names.get(ident, f'thread-{ident}'),) + self._stack(frame)] += 1
+        self.samples += 1
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        thread_names: Dict[int, str] = {}
+        while not self._stop.is_set():
+            self._sample(own_ident, thread_names)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.started_at is not None:
+            self.duration = time.monotonic() - self.started_at
+
+    def collapsed(self) -> str:
+        """Collapsed stacks: строка "поток;внешняя;...;внутренняя количество" на стек"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """Функции с наибольшим собственным временем (вершина стека)"""
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+        return own.most_common(limit)
+
+    def summary(self, limit: int = 5) -> str:
+        lines = [f'{self.samples} сэмплов за {self.duration:.0f} с, потоков: {len({stack[0] for stack in self.stacks})}']
+        total = sum(self.stacks.values()) or 1
+        lines.extend(f'{count / total:.0%} {label}' for label, count in self.top_functions(limit))
+        return '\n'.join(lines)
+
+
+_active: Optional[SamplingProfiler] = None
+_finish: Optional[asyncio.Event] = None
+
+
+def is_running() -> bool:
+    return _active is not None
+
+
+def finish_early():
+    """Завершить текущий профиль досрочно (остановка бота): вернется то, что успели собрать"""
+    if _finish is not None:
+        _finish.set()
+
+
+async def profile_for(seconds: float, interval: float = PROFILE_INTERVAL) -> SamplingProfiler:
+    """Профилировать процесс seconds секунд (одновременно - только один профиль)"""
+    global _active, _finish
+    if _active is not None:
+        raise RuntimeError('Profiler is already running')
+    profiler = _active = SamplingProfiler(interval)
+    _finish = asyncio.Event()
+    profiler.start()
+    logger.info(f"🔥 Sampling profiler started for {seconds:g}s ({1 / interval:.0f} Hz)")
+    try:
+        await asyncio.wait_for(_finish.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await asyncio.to_thread(profiler.stop)
+        _active = _finish = None
+    logger.info(f"🔥 Profile collected: {profiler.samples} samples, {len(profiler.stacks)} unique stacks")
+    return profiler
+
+
+def save(profiler: SamplingProfiler, directory: str = PROFILE_DIR) -> str:
+    """Записать collapsed stacks в файл; возвращает путь"""
+    path = os.path.join(directory, f"profile_{time.strftime('%Y%m%d_%H%M%S')}.collapsed")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(profiler.collapsed())
+    return path
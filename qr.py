@@ -7,10 +7,23 @@ Telegram бот для генерации QR-кодов для оплаты ус
 import os
 import logging
 import asyncio
+import hashlib
 import time
-import qrcode
+import html
+from datetime import datetime, time as dt_time
 from io import BytesIO
+from zoneinfo import ZoneInfo
+
 from dotenv import load_dotenv
+
+# Переменные окружения из .env - до импорта модулей проекта: они читают настройки при импорте
+load_dotenv()
+
+# Фазы холодного старта: импорты ниже и шаги main() - в лог и /ready
+from startup import startup
+if __name__ == '__main__':
+    startup.track_imports(__name__)
+
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 
@@ -30,6 +43,80 @@ except ImportError:
     DB_ENABLED = False
     logger.warning("⚠️ Database module not found, using in-memory stats")
 
+# Воркер scale-out режима (scale_out.py): номер процесса, None - обычный запуск
+SCALE_OUT_WORKER = os.getenv('SCALE_OUT_WORKER')
+
+# Аналитический движок в памяти (NumPy) - отчеты считаются без запросов к БД
+stats_source = None
+if DB_ENABLED and SCALE_OUT_WORKER is not None:
+    # Движок воркера видит только записи своего шарда - статистика читается из БД
+    stats_source = db
+    logger.info("📊 Scale-out worker: stats are queried from the database")
+elif DB_ENABLED:
+    try:
+        from analytics_engine import analytics_engine
+        stats_source = analytics_engine
+        logger.info("✅ In-memory analytics engine enabled")
+    except ImportError:
+        stats_source = db
+        logger.warning("⚠️ NumPy not found, stats will be queried from the database")
+
+# Состояние диалогов (context.user_data) хранится в БД и переживает перезапуск
+persistence = None
+if DB_ENABLED:
+    from persistence import DatabasePersistence
+    persistence = DatabasePersistence(db)
+
+# Google Calendar (опционально): локальный кэш событий с синхронизацией по syncToken
+CALENDAR_ENABLED = os.getenv('GOOGLE_CALENDAR_ENABLED', 'false').lower() == 'true'
+MULTI_CALENDAR = False
+if CALENDAR_ENABLED:
+    from calendar_cache import calendar_cache, CALENDAR_TIMEZONE
+    from calendar_async import CALENDAR_IDS, create_calendar_client
+    # Несколько календарей мастеров (GOOGLE_CALENDAR_IDS): расписание на сегодня
+    # забирается параллельно асинхронным клиентом вместо кэша одного календаря
+    MULTI_CALENDAR = len(CALENDAR_IDS) > 1
+    logger.info(f"✅ Google Calendar sync enabled ({len(CALENDAR_IDS)} calendar(s))")
+
+# Асинхронный клиент и расписание всех календарей на день (режим MULTI_CALENDAR)
+calendar_client = None
+calendar_agenda: list = []
+calendar_agenda_day = None
+
+# Кэш готовых QR-кодов (PNG) по строке платежа
+from qr_cache import qr_cache
+
+# Остановка по сигналу и упорядоченное завершение
+from lifecycle import install_signal_handlers, wait_for_any, run_shutdown
+
+# Метрики (Prometheus text format на /metrics)
+from metrics import registry as metrics_registry, instrument_handler
+from metered_request import MeteredRequest
+
+# Трассировка запросов (обработчик → БД → QR → Bot API), /trace
+from tracing import tracer, traced, trace_handler
+
+# Сэмплирующий профилировщик (/profile, PROFILE_ON_START)
+import profiler
+
+QR_GENERATE_DURATION = metrics_registry.histogram(
+    'qr_generate_seconds', 'QR code generation latency (cache hit or render)')
+metrics_registry.gauge('qr_cache_entries', 'QR codes in the PNG cache').set_function(lambda: len(qr_cache))
+
+# Рендеринг отчетов статистики (шаблоны + кэш по версии данных)
+from reports import MONTH_NAMES, render_stats_overview, render_month_stats, cache_size as reports_cache_size
+from reports import clear_cache as clear_reports_cache
+
+# Память процесса: RSS, tracemalloc (/mem) и сжатие кэшей у лимитов
+import memory
+from memory import memory_budget, rss_bytes, SOFT, CRITICAL
+
+metrics_registry.gauge('process_resident_memory_bytes', 'Resident memory size (RSS)').set_function(rss_bytes)
+metrics_registry.gauge('bot_startup_seconds', 'Seconds from process start to polling').set_function(
+    lambda: startup.ready_at or 0)
+MEMORY_SHRINKS = metrics_registry.counter(
+    'memory_shrinks_total', 'Cache shrinks triggered by the memory budget', ['level'])
+
 # Импорт keep-alive для предотвращения засыпания на Render
 try:
     from render_keep_alive import setup_render_keep_alive, render_keep_alive
@@ -38,16 +125,28 @@ except ImportError:
     setup_render_keep_alive = None
     render_keep_alive = None
 
-# Загружаем переменные окружения
-load_dotenv()
-
 # Конфигурация
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Адрес Bot API (по умолчанию api.telegram.org; локальный fake API - в нагрузочных тестах)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
 ADMIN_TELEGRAM_ID = os.getenv('ADMIN_TELEGRAM_ID')
 OWNER_NAME = os.getenv('OWNER_NAME', 'ULIANA EMELINA')
 ACCOUNT_NUMBER = os.getenv('ACCOUNT_NUMBER', '3247217010/3030')
 IBAN = os.getenv('IBAN', 'CZ3230300000003247217010')
 
+# Время ежедневного итогового отчета для админов (по Праге), "off" - отключить
+DAILY_REPORT_TIME = os.getenv('DAILY_REPORT_TIME', '20:00')
+SALON_TIMEZONE = ZoneInfo('Europe/Prague')
+
+# Интервал синхронизации кэша календаря (секунды)
+CALENDAR_SYNC_INTERVAL = int(os.getenv('CALENDAR_SYNC_INTERVAL', '300'))
+
+# Интервал сверки счетчиков пользователей с транзакциями (часы)
+COUNTERS_RECONCILE_HOURS = float(os.getenv('COUNTERS_RECONCILE_HOURS', '6'))
+
+# Сколько секунд без апдейтов user_data остается в памяти при нехватке (мягкий / критический лимит)
+USER_DATA_IDLE_EVICT = {SOFT: 1800, CRITICAL: 60}
+
 # Парсим список админов (поддержка нескольких ID через запятую)
 ADMIN_IDS = set()
 if ADMIN_TELEGRAM_ID:
@@ -120,6 +219,10 @@ def get_main_keyboard(show_admin: bool = False):
         [KeyboardButton('ℹ️ Реквизиты счета'), KeyboardButton('❓ Помощь')]
     ]
     
+    # Записи из календаря - QR в одно нажатие
+    if CALENDAR_ENABLED:
+        keyboard.insert(1, [KeyboardButton('📅 Клиенты сегодня')])
+    
     # Добавляем кнопку админ-панели для админов
     if show_admin:
         keyboard.append([KeyboardButton('🔧 Админ-панель')])
@@ -265,6 +368,12 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             '🔍 <b>/dbcheck</b> - Диагностика базы данных\n'
             '   Проверяет подключение к PostgreSQL,\n'
             '   версию psycopg2, тип используемой БД\n\n'
+            '🧭 <b>/trace</b> [N] - Самые медленные запросы\n'
+            '   Разбивка по этапам: БД, QR, Telegram\n\n'
+            '🔥 <b>/profile</b> [секунды] - Профиль процесса\n'
+            '   Файл collapsed stacks для flamegraph\n\n'
+            '🧠 <b>/mem</b> [start|stop|shrink] - Память процесса\n'
+            '   RSS, кэши, места аллокаций (tracemalloc)\n\n'
             '🔧 <b>Кнопки админ-панели:</b>\n'
             '   Используйте кнопку "🔧 Админ-панель" для\n'
             '   быстрого доступа ко всем командам'
@@ -347,8 +456,8 @@ async def payment_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Устанавливаем состояние ожидания суммы
     context.user_data['waiting_for_amount'] = True
 
-def generate_qr_code(amount: float, service_msg: str = None) -> BytesIO:
-    """Генерирует QR-код с данными для оплаты"""
+def build_qr_payload(amount: float, service_msg: str = None) -> str:
+    """Строка платежа SPD для QR-кода"""
     # Точный формат Air Bank с услугой
     # Формат: SPD*1.0*ACC:CZ3230300000003247217010*RN:ULIANA EMELINA*AM:500*CC:CZK*MSG:ZESVETLENI OBOCI
     
@@ -365,7 +474,14 @@ def generate_qr_code(amount: float, service_msg: str = None) -> BytesIO:
     if service_msg:
         qr_text += f"*MSG:{service_msg}"
     
-    # Создаем QR-код
+    return qr_text
+
+@traced('qr.render')
+def render_qr_png(qr_text: str) -> bytes:
+    """Рисует QR-код и возвращает PNG"""
+    # qrcode и PIL не нужны до первого QR: импорт не задерживает старт
+    import qrcode
+    
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -378,12 +494,16 @@ def generate_qr_code(amount: float, service_msg: str = None) -> BytesIO:
     # Создаем изображение
     img = qr.make_image(fill_color="black", back_color="white")
     
-    # Сохраняем в BytesIO
+    # Сохраняем в PNG
     bio = BytesIO()
     img.save(bio, 'PNG')
-    bio.seek(0)
-    
-    return bio
+    return bio.getvalue()
+
+def generate_qr_code(amount: float, service_msg: str = None) -> BytesIO:
+    """Генерирует QR-код с данными для оплаты (повторные платежи берутся из кэша)"""
+    with QR_GENERATE_DURATION.time(), tracer.span('qr.generate', root=False):
+        png = qr_cache.get_or_render(build_qr_payload(amount, service_msg), render_qr_png)
+    return BytesIO(png)
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик текстовых сообщений (кнопки и суммы)"""
@@ -401,6 +521,9 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     elif text == '❓ Помощь':
         await help_command(update, context)
         return
+    elif text == '📅 Клиенты сегодня' and CALENDAR_ENABLED:
+        await today_clients_command(update, context)
+        return
     
     # Обработка кнопок админ-панели
     elif text == '🔧 Админ-панель' and check_is_admin(int(user_id)):
@@ -708,6 +831,118 @@ async def handle_service_selection(update: Update, context: ContextTypes.DEFAULT
     service_log = service_name if service_name else "without service"
     logger.info(f"QR code generated for amount: {amount} CZK, service: {service_log}, user: {update.effective_user.id}")
 
+def calendar_option_key(event_id: str) -> str:
+    """Короткий ключ записи календаря для callback_data (лимит Telegram - 64 байта)"""
+    return hashlib.sha1(event_id.encode('utf-8')).hexdigest()[:12]
+
+def get_today_payment_options() -> list:
+    """Сегодняшние записи с известной ценой (из кэша календаря или расписания всех мастеров)"""
+    from google_calendar import parse_events_for_payment
+    if MULTI_CALENDAR:
+        if calendar_agenda_day != datetime.now(CALENDAR_TIMEZONE).date():
+            return []
+        return parse_events_for_payment(calendar_agenda)
+    return parse_events_for_payment(calendar_cache.get_events())
+
+async def refresh_calendar_agenda() -> int:
+    """Расписание всех календарей мастеров на сегодня (параллельные запросы к API)"""
+    global calendar_client, calendar_agenda, calendar_agenda_day
+    if calendar_client is None:
+        calendar_client = await asyncio.to_thread(create_calendar_client)
+        if calendar_client is None:
+            raise RuntimeError('Google Calendar authentication failed')
+    day = datetime.now(CALENDAR_TIMEZONE).date()
+    calendar_agenda = await calendar_client.fetch_agendas(CALENDAR_IDS, day)
+    calendar_agenda_day = day
+    return len(calendar_agenda)
+
+async def close_calendar_client():
+    if calendar_client is not None:
+        await calendar_client.close()
+
+def precompute_calendar_qr_codes() -> int:
+    """Заранее рисует QR-коды для сегодняшних записей (вызывается в фоновом потоке)"""
+    payloads = [build_qr_payload(float(option['price']), option['procedure'].upper())
+                for option in get_today_payment_options()]
+    return qr_cache.precompute(payloads, render_qr_png)
+
+async def today_clients_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Список сегодняшних клиентов из календаря: QR-код в одно нажатие"""
+    if MULTI_CALENDAR:
+        # Список открывают редко - показываем свежее расписание всех мастеров
+        try:
+            await refresh_calendar_agenda()
+        except Exception as e:
+            logger.error(f"Failed to fetch calendar agendas: {e}")
+    options = get_today_payment_options()
+    
+    if not options:
+        await update.message.reply_text(
+            '📭 На сегодня нет записей с известной ценой.\n\n'
+            '💰 Используйте «Создать QR-код для оплаты».'
+        )
+        return
+    
+    keyboard = [
+        [InlineKeyboardButton(option['display_text'], callback_data=f"cal_{calendar_option_key(option['event_id'])}")]
+        for option in options
+    ]
+    
+    await update.message.reply_text(
+        '📅 <b>Клиенты сегодня</b>\n\n'
+        '👇 Нажмите на запись - QR-код придет сразу:',
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def handle_calendar_payment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик выбора записи из календаря"""
+    query = update.callback_query
+    await query.answer()
+    
+    key = query.data.replace('cal_', '')
+    option = next((o for o in get_today_payment_options() if calendar_option_key(o['event_id']) == key), None)
+    
+    if option is None:
+        await query.edit_message_text('❌ Запись не найдена (календарь обновился). Откройте список заново.')
+        return
+    
+    amount = float(option['price'])
+    service_msg = option['procedure'].upper()
+    
+    # QR-код обычно уже отрисован в фоне после синхронизации календаря
+    qr_image = generate_qr_code(amount, service_msg)
+    formatted_amount = f"{amount:,.2f}".replace(',', ' ').replace('.', ',')
+    
+    await query.delete_message()
+    
+    user_id = update.effective_user.id
+    is_admin = check_is_admin(user_id)
+    
+    await context.bot.send_photo(
+        chat_id=query.message.chat_id,
+        photo=qr_image,
+        caption=f'🌿 QR-код для оплаты услуг салона\n\n'
+               f'📅 {option["event_title"]}\n'
+               f'💰 Сумма: {formatted_amount} CZK\n'
+               f'🛍️ Услуга: {service_msg}\n'
+               f'👤 Получатель: {OWNER_NAME}\n'
+               f'🏦 Счет: {ACCOUNT_NUMBER}\n\n'
+               f'📱 Покажите этот QR-код клиенту\n'
+               f'✅ Клиент сканирует код в своем банковском приложении',
+        reply_markup=get_main_keyboard(is_admin)
+    )
+    
+    # Записываем транзакцию в БД
+    if DB_ENABLED:
+        try:
+            db.add_transaction(user_id=user_id, amount=amount, service=service_msg)
+            db.add_event(user_id, 'qr_generated', f'amount:{amount},service:{service_msg},calendar:{option["event_id"]}')
+        except Exception as e:
+            logger.error(f"Database error when saving transaction: {e}")
+    
+    logger.info(f"QR code generated from calendar event {option['event_id']}: {amount} CZK, {service_msg}, user: {user_id}")
+
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Статистика использования (только для админа)"""
     user_id = str(update.effective_user.id)
@@ -718,61 +953,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     
     if DB_ENABLED:
         try:
-            # Получаем данные из БД
-            total_stats = db.get_total_stats()
-            all_users = db.get_all_users_stats()
-            popular_services = db.get_popular_services(5)
-            
-            # Получаем месячную статистику
-            current_month = db.get_monthly_stats(0)  # Текущий месяц
-            prev_month = db.get_monthly_stats(1)     # Прошлый месяц
-            
-            # Показываем тип базы данных
-            db_icon = "🐘" if db.db_type == 'postgresql' else "📝"
-            db_name = "PostgreSQL" if db.db_type == 'postgresql' else "SQLite"
-            
-            # Названия месяцев
-            month_names = ['', 'январь', 'февраль', 'март', 'апрель', 'май', 'июнь', 
-                          'июль', 'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь']
-            
-            stats_text = f'📊 **СТАТИСТИКА БОТА**\n'
-            stats_text += f'{db_icon} База данных: **{db_name}**\n\n'
-            
-            stats_text += f'**📅 За все время:**\n'
-            stats_text += f'👥 Всего пользователей: {total_stats["total_users"]}\n'
-            stats_text += f'💰 Всего транзакций: {total_stats["total_transactions"]}\n'
-            stats_text += f'💵 Общая сумма: {total_stats["total_amount"]:,.0f} CZK\n'
-            stats_text += f'📊 Средняя сумма: {total_stats["avg_amount"]:.0f} CZK\n'
-            stats_text += f'🟢 Активных за 24ч: {total_stats["active_24h"]}\n\n'
-            
-            # Текущий месяц
-            if current_month['transactions'] > 0:
-                curr_month_name = month_names[current_month['month']]
-                stats_text += f'**📅 {curr_month_name.capitalize()} {current_month["year"]}:**\n'
-                stats_text += f'💰 Транзакций: {current_month["transactions"]}\n'
-                stats_text += f'💵 Сумма: {current_month["total_amount"]:,.0f} CZK\n'
-                stats_text += f'📊 Средняя: {current_month["avg_amount"]:.0f} CZK\n'
-                stats_text += f'👥 Клиентов: {current_month["unique_users"]}\n\n'
-            
-            # Прошлый месяц
-            if prev_month['transactions'] > 0:
-                prev_month_name = month_names[prev_month['month']]
-                stats_text += f'**📅 {prev_month_name.capitalize()} {prev_month["year"]}:**\n'
-                stats_text += f'💰 Транзакций: {prev_month["transactions"]}\n'
-                stats_text += f'💵 Сумма: {prev_month["total_amount"]:,.0f} CZK\n'
-                stats_text += f'📊 Средняя: {prev_month["avg_amount"]:.0f} CZK\n'
-                stats_text += f'👥 Клиентов: {prev_month["unique_users"]}\n\n'
-            
-            if all_users:
-                stats_text += '**Топ мастеров:**\n'
-                for i, user in enumerate(all_users[:5], 1):
-                    username = user['username'] or f"ID{user['user_id']}"
-                    stats_text += f'{i}. @{username}: {user["transactions_count"]} QR, {user["total_amount"]:.0f} CZK\n'
-            
-            if popular_services:
-                stats_text += '\n**Популярные услуги:**\n'
-                for i, (service, count) in enumerate(popular_services, 1):
-                    stats_text += f'{i}. {service}: {count}x\n'
+            stats_text = render_stats_overview(stats_source, db.db_type)
             
             # Создаем кнопки для выбора других месяцев
             keyboard = []
@@ -962,24 +1143,22 @@ async def handle_stats_callback(update: Update, context: ContextTypes.DEFAULT_TY
         from datetime import datetime, timedelta
         
         keyboard = []
-        month_names = ['', 'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
-                      'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
         
         # Проверяем последние 12 месяцев и показываем только те, где есть данные
         row = []
         for offset in range(12):
             if DB_ENABLED:
-                month_stats = db.get_monthly_stats(offset)
+                month_stats = stats_source.get_monthly_stats(offset)
                 # Показываем только месяцы с транзакциями
                 if month_stats['transactions'] == 0:
                     continue
                 
-                month_name = month_names[month_stats['month']]
+                month_name = MONTH_NAMES[month_stats['month']]
                 year = month_stats['year']
             else:
                 # Если БД нет, показываем все месяцы
                 target_date = datetime.now() - timedelta(days=30 * offset)
-                month_name = month_names[target_date.month]
+                month_name = MONTH_NAMES[target_date.month]
                 year = target_date.year
             
             button_text = f"{month_name} {year}"
@@ -1014,46 +1193,7 @@ async def handle_stats_callback(update: Update, context: ContextTypes.DEFAULT_TY
         
         if DB_ENABLED:
             try:
-                from datetime import datetime, timedelta
-                month_stats = db.get_monthly_stats(offset)
-                
-                month_names = ['', 'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
-                              'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
-                
-                month_name = month_names[month_stats['month']]
-                
-                stats_text = f'📊 <b>Статистика за {month_name} {month_stats["year"]}</b>\n\n'
-                
-                if month_stats['transactions'] > 0:
-                    # Общая статистика
-                    stats_text += '<b>📈 Общие показатели:</b>\n'
-                    stats_text += f'💰 Транзакций: {month_stats["transactions"]}\n'
-                    stats_text += f'💵 Общая сумма: {month_stats["total_amount"]:,.0f} CZK\n'
-                    stats_text += f'📊 Средний чек: {month_stats["avg_amount"]:.0f} CZK\n'
-                    stats_text += f'👥 Клиентов: {month_stats["unique_users"]}\n'
-                    
-                    # Минимальная и максимальная транзакции
-                    extremes = db.get_monthly_extremes(offset)
-                    if extremes['max_amount'] > 0:
-                        stats_text += f'📉 Мин. сумма: {extremes["min_amount"]:.0f} CZK\n'
-                        stats_text += f'📈 Макс. сумма: {extremes["max_amount"]:.0f} CZK\n'
-                    
-                    # Топ мастеров за месяц
-                    top_users = db.get_monthly_top_users(offset, 5)
-                    if top_users:
-                        stats_text += '\n<b>👥 Топ мастеров:</b>\n'
-                        for i, user in enumerate(top_users, 1):
-                            username = user['username'] or f"ID{user['user_id']}"
-                            stats_text += f'{i}. @{username}: {user["transactions_count"]} QR, {user["total_amount"]:.0f} CZK\n'
-                    
-                    # Топ услуг за месяц
-                    top_services = db.get_monthly_top_services(offset, 5)
-                    if top_services:
-                        stats_text += '\n<b>🛍️ Популярные услуги:</b>\n'
-                        for i, (service, count) in enumerate(top_services, 1):
-                            stats_text += f'{i}. {service}: {count}x\n'
-                else:
-                    stats_text += '📭 Нет данных за этот период'
+                stats_text = render_month_stats(stats_source, offset)
                 
                 keyboard = [[InlineKeyboardButton("📅 Другой месяц", callback_data="stats_select_month")]]
                 
@@ -1070,61 +1210,7 @@ async def handle_stats_callback(update: Update, context: ContextTypes.DEFAULT_TY
         # Возвращаемся к общей статистике
         if DB_ENABLED:
             try:
-                # Получаем данные из БД
-                total_stats = db.get_total_stats()
-                all_users = db.get_all_users_stats()
-                popular_services = db.get_popular_services(5)
-                
-                # Получаем месячную статистику
-                current_month = db.get_monthly_stats(0)  # Текущий месяц
-                prev_month = db.get_monthly_stats(1)     # Прошлый месяц
-                
-                # Показываем тип базы данных
-                db_icon = "🐘" if db.db_type == 'postgresql' else "📝"
-                db_name = "PostgreSQL" if db.db_type == 'postgresql' else "SQLite"
-                
-                # Названия месяцев
-                month_names = ['', 'январь', 'февраль', 'март', 'апрель', 'май', 'июнь', 
-                              'июль', 'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь']
-                
-                stats_text = f'📊 **СТАТИСТИКА БОТА**\n'
-                stats_text += f'{db_icon} База данных: **{db_name}**\n\n'
-                
-                stats_text += f'**📅 За все время:**\n'
-                stats_text += f'👥 Всего пользователей: {total_stats["total_users"]}\n'
-                stats_text += f'💰 Всего транзакций: {total_stats["total_transactions"]}\n'
-                stats_text += f'💵 Общая сумма: {total_stats["total_amount"]:,.0f} CZK\n'
-                stats_text += f'📊 Средняя сумма: {total_stats["avg_amount"]:.0f} CZK\n'
-                stats_text += f'🟢 Активных за 24ч: {total_stats["active_24h"]}\n\n'
-                
-                # Текущий месяц
-                if current_month['transactions'] > 0:
-                    curr_month_name = month_names[current_month['month']]
-                    stats_text += f'**📅 {curr_month_name.capitalize()} {current_month["year"]}:**\n'
-                    stats_text += f'💰 Транзакций: {current_month["transactions"]}\n'
-                    stats_text += f'💵 Сумма: {current_month["total_amount"]:,.0f} CZK\n'
-                    stats_text += f'📊 Средняя: {current_month["avg_amount"]:.0f} CZK\n'
-                    stats_text += f'👥 Клиентов: {current_month["unique_users"]}\n\n'
-                
-                # Прошлый месяц
-                if prev_month['transactions'] > 0:
-                    prev_month_name = month_names[prev_month['month']]
-                    stats_text += f'**📅 {prev_month_name.capitalize()} {prev_month["year"]}:**\n'
-                    stats_text += f'💰 Транзакций: {prev_month["transactions"]}\n'
-                    stats_text += f'💵 Сумма: {prev_month["total_amount"]:,.0f} CZK\n'
-                    stats_text += f'📊 Средняя: {prev_month["avg_amount"]:.0f} CZK\n'
-                    stats_text += f'👥 Клиентов: {prev_month["unique_users"]}\n\n'
-                
-                if all_users:
-                    stats_text += '**Топ мастеров:**\n'
-                    for i, user in enumerate(all_users[:5], 1):
-                        username = user['username'] or f"ID{user['user_id']}"
-                        stats_text += f'{i}. @{username}: {user["transactions_count"]} QR, {user["total_amount"]:.0f} CZK\n'
-                
-                if popular_services:
-                    stats_text += '\n**Популярные услуги:**\n'
-                    for i, (service, count) in enumerate(popular_services, 1):
-                        stats_text += f'{i}. {service}: {count}x\n'
+                stats_text = render_stats_overview(stats_source, db.db_type)
                 
                 # Создаем кнопки для выбора других месяцев
                 keyboard = [[InlineKeyboardButton("📅 Другой месяц", callback_data="stats_select_month")]]
@@ -1282,6 +1368,7 @@ async def dbcheck_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if DB_ENABLED:
         from database import db
         check_text += f'📊 Тип БД: <b>{db.db_type.upper()}</b>\n'
+        check_text += f'🗂️ Версия схемы: <b>{db.schema_version}</b>\n'
         
         if db.db_type == 'postgresql':
             check_text += '🐘 PostgreSQL активен\n'
@@ -1303,6 +1390,293 @@ async def dbcheck_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     await update.message.reply_text(check_text, parse_mode='HTML')
 
+# Ограничения ответа /trace (лимит сообщения Telegram - 4096 символов)
+TRACE_REPORT_MAX_TRACES = 8
+TRACE_REPORT_MAX_SPANS = 10
+
+def render_trace_report(traces: list, total: int) -> str:
+    """Текст /trace: трассы с разбивкой по span'ам (HTML)"""
+    lines = [f'🧭 <b>МЕДЛЕННЫЕ ЗАПРОСЫ</b> (из последних {total})\n']
+    for number, trace in enumerate(traces, 1):
+        root = trace.root
+        started = datetime.fromtimestamp(root.start_time, SALON_TIMEZONE).strftime('%H:%M:%S')
+        status = ' ❌' if root.error else ''
+        lines.append(f'{number}. <b>{html.escape(root.name)}</b> - {root.duration * 1000:.0f} мс ({started}){status}')
+        spans = list(trace.tree())[1:]
+        for depth, span in spans[:TRACE_REPORT_MAX_SPANS]:
+            duration = f'{span.duration * 1000:.1f} мс' if span.duration is not None else 'не завершен'
+            error = ' ❌' if span.error else ''
+            lines.append(f'<code>{"  " * depth}└ {html.escape(span.name)} {duration}</code>{error}')
+        if len(spans) > TRACE_REPORT_MAX_SPANS:
+            lines.append(f'<code>  … еще {len(spans) - TRACE_REPORT_MAX_SPANS}</code>')
+        lines.append('')
+    return '\n'.join(lines)
+
+async def trace_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Самые медленные из последних запросов с разбивкой по span'ам (только для админа)
+    Формат: /trace [количество]
+    """
+    user_id = str(update.effective_user.id)
+    
+    if not check_is_admin(int(user_id)):
+        await update.message.reply_text('❌ У вас нет доступа к этой команде.')
+        return
+    
+    args = update.message.text.split()
+    try:
+        limit = int(args[1]) if len(args) > 1 else 5
+    except ValueError:
+        limit = 5
+    limit = min(max(limit, 1), TRACE_REPORT_MAX_TRACES)
+    
+    traces = tracer.slowest(limit)
+    if not traces:
+        await update.message.reply_text('🧭 Трасс пока нет (или TRACE_ENABLED=false).')
+        return
+    
+    await update.message.reply_text(render_trace_report(traces, len(tracer.recent)), parse_mode='HTML')
+
+def profile_document(sampled: profiler.SamplingProfiler) -> BytesIO:
+    """Collapsed stacks профиля как файл для отправки в Telegram"""
+    document = BytesIO(sampled.collapsed().encode('utf-8'))
+    document.name = f'profile_{datetime.now(SALON_TIMEZONE).strftime("%Y%m%d_%H%M%S")}.collapsed'
+    return document
+
+async def send_profile(message, seconds: int) -> None:
+    """Снять профиль и ответить файлом (фоновая задача /profile)"""
+    try:
+        sampled = await profiler.profile_for(seconds)
+        await message.reply_document(
+            document=profile_document(sampled),
+            caption=f'🔥 Профиль процесса\n\n{sampled.summary()}\n\n'
+                    f'flamegraph.pl или speedscope.app'
+        )
+    except Exception as e:
+        logger.error(f"❌ Profile error: {e}")
+        await message.reply_text(f'❌ Ошибка профилирования: {e}')
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сэмплирующий профиль всех потоков за N секунд (только для админа)
+    Формат: /profile [секунды]
+    """
+    user_id = str(update.effective_user.id)
+    
+    if not check_is_admin(int(user_id)):
+        await update.message.reply_text('❌ У вас нет доступа к этой команде.')
+        return
+    
+    args = update.message.text.split()
+    try:
+        seconds = int(args[1]) if len(args) > 1 else 30
+    except ValueError:
+        seconds = 30
+    seconds = min(max(seconds, 1), profiler.PROFILE_MAX_SECONDS)
+    
+    if profiler.is_running():
+        await update.message.reply_text('⏳ Профиль уже снимается, дождитесь результата.')
+        return
+    
+    await update.message.reply_text(f'🔥 Снимаю профиль {seconds} с...')
+    # Обработчик не ждет окончания окна: апдейты обрабатываются по очереди
+    context.application.create_task(send_profile(update.message, seconds), update=update)
+
+async def profile_on_start(bot) -> None:
+    """Профиль первых PROFILE_ON_START секунд: файл в PROFILE_DIR и админам"""
+    try:
+        sampled = await profiler.profile_for(profiler.PROFILE_ON_START)
+        path = await asyncio.to_thread(profiler.save, sampled)
+        logger.info(f"🔥 Startup profile saved to {path}")
+        for admin_id in ADMIN_IDS:
+            await bot.send_document(
+                chat_id=admin_id,
+                document=profile_document(sampled),
+                caption=f'🔥 Профиль после запуска\n\n{sampled.summary()}'
+            )
+    except Exception as e:
+        logger.error(f"❌ Startup profile error: {e}")
+
+def shrink_qr_cache(level: str) -> int:
+    """Мягкий лимит - оставить половину самых свежих QR, критический - очистить"""
+    return qr_cache.trim(len(qr_cache) // 2 if level == SOFT else 0)
+
+def shrink_reports_cache(level: str) -> int:
+    size = reports_cache_size()
+    clear_reports_cache()
+    return size
+
+def shrink_trace_buffer(level: str) -> int:
+    """Буфер трасс для /trace сбрасывается только на критическом лимите"""
+    if level != CRITICAL:
+        return 0
+    size = len(tracer.recent)
+    tracer.recent.clear()
+    return size
+
+memory_budget.register('qr_cache', shrink_qr_cache)
+memory_budget.register('reports', shrink_reports_cache)
+memory_budget.register('traces', shrink_trace_buffer)
+
+async def evict_idle_user_data(application: Application, level: str) -> int:
+    """Выгрузить из памяти user_data неактивных пользователей
+    Состояние сначала сохраняется в БД и прочитается оттуда при следующем апдейте
+    """
+    if persistence is None:
+        return 0
+    await application.update_persistence()
+    await persistence.flush()
+    evicted = 0
+    for user_id in persistence.idle_users(USER_DATA_IDLE_EVICT[level]):
+        # После evict persistence не удаляет строку в БД на drop_user_data
+        persistence.evict(user_id)
+        application.drop_user_data(user_id)
+        evicted += 1
+    if evicted:
+        # Сразу отдаем удаление в persistence: иначе изменения вернувшегося пользователя
+        # до следующего update_persistence были бы пропущены как удаленные
+        await application.update_persistence()
+    return evicted
+
+async def check_memory(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Фоновая проверка RSS: у лимита сжимаем кэши, пока платформа не убила процесс"""
+    result = await memory_budget.enforce()
+    if result:
+        MEMORY_SHRINKS.inc(level=result['level'])
+
+def format_megabytes(size: int) -> str:
+    return f'{size / 1024 / 1024:.1f} МБ'
+
+def render_memory_report(user_data_count: int, allocations: dict = None) -> str:
+    """Текст /mem: RSS и лимиты, размеры кэшей, места аллокаций (HTML)"""
+    qr_stats = qr_cache.stats()
+    lines = [
+        '🧠 <b>ПАМЯТЬ</b>\n',
+        f'RSS: <b>{format_megabytes(rss_bytes())}</b> '
+        f'(лимиты {format_megabytes(memory_budget.soft_limit)} / {format_megabytes(memory_budget.critical_limit)})',
+        f'QR кэш: {qr_stats["entries"]} ({format_megabytes(qr_stats["bytes"])})',
+        f'Отчеты: {reports_cache_size()}, трассы: {len(tracer.recent)}, user_data: {user_data_count}',
+        f'Сжатий: мягких {memory_budget.shrinks[SOFT]}, критических {memory_budget.shrinks[CRITICAL]}',
+    ]
+    last = memory_budget.last_shrink
+    if last:
+        when = datetime.fromtimestamp(last['time'], SALON_TIMEZONE).strftime('%d.%m %H:%M')
+        freed = ', '.join(f'{name} {count}' for name, count in last['freed'].items())
+        lines.append(f'Последнее ({when}, {last["level"]}): {format_megabytes(last["rss_before"])} → '
+                     f'{format_megabytes(last["rss_after"])}; {html.escape(freed)}')
+    
+    if allocations is None:
+        lines.append('\n🔬 tracemalloc выключен: /mem start')
+        return '\n'.join(lines)
+    
+    lines.append(f'\n🔬 tracemalloc: {format_megabytes(allocations["traced"])} '
+                 f'(пик {format_megabytes(allocations["peak"])})')
+    lines.append('<b>Топ аллокаций:</b>')
+    lines.extend(f'<code>{size / 1024:8.0f} КБ {count:>7} {html.escape(site)}</code>'
+                 for site, size, count in allocations['top'])
+    if allocations['growth']:
+        lines.append('<b>Рост с прошлого /mem:</b>')
+        lines.extend(f'<code>+{size / 1024:7.0f} КБ {count:>+7} {html.escape(site)}</code>'
+                     for site, size, count in allocations['growth'])
+    return '\n'.join(lines)
+
+async def mem_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Память процесса (только для админа)
+    Формат: /mem [start|stop|shrink [critical]]
+    """
+    user_id = str(update.effective_user.id)
+    
+    if not check_is_admin(int(user_id)):
+        await update.message.reply_text('❌ У вас нет доступа к этой команде.')
+        return
+    
+    args = update.message.text.split()
+    action = args[1].lower() if len(args) > 1 else ''
+    
+    if action == 'start':
+        started = memory.start_tracing()
+        await update.message.reply_text('🔬 tracemalloc включен. Аллокации замедляются - не забудьте /mem stop.'
+                                        if started else '🔬 tracemalloc уже включен.')
+        return
+    if action == 'stop':
+        stopped = memory.stop_tracing()
+        await update.message.reply_text('🔬 tracemalloc выключен.' if stopped else '🔬 tracemalloc не был включен.')
+        return
+    if action == 'shrink':
+        level = CRITICAL if len(args) > 2 and args[2].lower() == CRITICAL else SOFT
+        await memory_budget.enforce(level)
+        MEMORY_SHRINKS.inc(level=level)
+    
+    allocations = None
+    if memory.is_tracing():
+        allocations = await asyncio.to_thread(memory.allocation_report)
+    
+    await update.message.reply_text(
+        render_memory_report(len(context.application.user_data), allocations), parse_mode='HTML')
+
+async def send_daily_report(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отправляет итоги дня всем админам (задача JobQueue)"""
+    from analytics import format_end_of_day_report
+    
+    try:
+        # Отчет уходит по времени салона - и день берем местный, а не UTC
+        report = format_end_of_day_report(datetime.now(SALON_TIMEZONE).strftime('%Y-%m-%d'))
+    except Exception as e:
+        logger.error(f"Failed to build daily report: {e}")
+        return
+    
+    for admin_id in ADMIN_IDS:
+        try:
+            await context.bot.send_message(chat_id=int(admin_id), text=report, parse_mode='HTML')
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to send daily report to admin {admin_id}: {e}")
+    
+    logger.info(f"🌙 Daily report sent to {len(ADMIN_IDS)} admin(s)")
+
+async def reconcile_user_counters(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сверяет счетчики транзакций в users с таблицей transactions (задача JobQueue)"""
+    try:
+        fixed = await asyncio.to_thread(db.reconcile_user_counters)
+        logger.info(f"👥 User counters reconciled, fixed: {fixed}")
+    except Exception as e:
+        logger.error(f"Failed to reconcile user counters: {e}")
+
+async def expire_events(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сворачивает старые события в дневные агрегаты и удаляет сырые строки (задача JobQueue)"""
+    try:
+        await asyncio.to_thread(db.expire_events)
+    except Exception as e:
+        logger.error(f"Failed to expire events: {e}")
+
+async def refresh_calendar_cache(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Инкрементально синхронизирует кэш событий календаря и заранее рисует QR (задача JobQueue)"""
+    try:
+        if MULTI_CALENDAR:
+            await refresh_calendar_agenda()
+        else:
+            await asyncio.to_thread(calendar_cache.sync)
+    except Exception as e:
+        logger.error(f"Failed to sync calendar cache: {e}")
+        return
+    await precompute_today_qr()
+
+async def reload_calendar_cache(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Перечитывает файл кэша календаря, который синхронизирует основной экземпляр (задача JobQueue воркера)"""
+    try:
+        reloaded = await asyncio.to_thread(calendar_cache.reload)
+    except Exception as e:
+        logger.error(f"Failed to reload calendar cache: {e}")
+        return
+    if reloaded:
+        await precompute_today_qr()
+
+async def precompute_today_qr() -> None:
+    """Заранее рисует QR-коды сегодняшних записей после обновления кэша календаря"""
+    try:
+        rendered = await asyncio.to_thread(precompute_calendar_qr_codes)
+        if rendered:
+            logger.info(f"🔳 Precomputed {rendered} QR code(s) for today's appointments")
+    except Exception as e:
+        logger.error(f"Failed to precompute calendar QR codes: {e}")
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик ошибок согласно рекомендациям Context7"""
     logger.error(f"Exception while handling an update: {context.error}")
@@ -1333,70 +1707,59 @@ async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         reply_markup=get_main_keyboard(is_admin)
     )
 
-def main():
-    """Главная функция"""
-    
-    # 🚀 КРИТИЧНО: Запускаем health endpoint ПЕРВЫМ (до всех блокирующих операций)
-    # Render health check имеет таймаут 5 секунд, поэтому endpoint должен быть доступен немедленно
-    if os.getenv('RENDER'):
-        try:
-            from render_keep_alive import create_simple_health_endpoint
-            create_simple_health_endpoint()
-            logger.info("🌐 Health endpoint started BEFORE bot initialization")
-        except Exception as e:
-            logger.error(f"❌ Failed to start health endpoint: {e}")
-    
-    if not BOT_TOKEN:
-        logger.error("BOT_TOKEN not found in environment variables!")
-        return
-    
-    # Проверяем единственность экземпляра на Render с улучшенным контролем
-    lock_file = '/tmp/qr_bot.lock' if os.getenv('RENDER') else None
-    
-    if lock_file:
-        try:
-            if os.path.exists(lock_file):
-                # Читаем PID старого процесса
-                with open(lock_file, 'r') as f:
-                    old_pid = f.read().strip()
-                
-                # Проверяем возраст lock файла
-                import time
-                lock_age = time.time() - os.path.getmtime(lock_file)
-                
-                if lock_age > 180:  # 3 минуты (более агрессивно)
-                    logger.warning(f"⚠️ Removing stale lock file (>3 minutes old, PID: {old_pid})")
-                    os.remove(lock_file)
-                else:
-                    logger.error(f"❌ Another bot instance is running (PID: {old_pid}, age: {lock_age:.0f}s)")
-                    logger.info("🔄 Waiting for old instance to shutdown gracefully...")
-                    
-                    # Даем старому процессу 30 секунд на graceful shutdown
-                    import time
-                    for i in range(30):
-                        time.sleep(1)
-                        if not os.path.exists(lock_file):
-                            logger.info("✅ Old instance shutdown detected")
-                            break
-                        if i == 29:
-                            logger.warning("⚠️ Force removing lock file after 30s wait")
-                            os.remove(lock_file)
-            
-            # Создаем lock файл с текущим PID
-            with open(lock_file, 'w') as f:
-                f.write(str(os.getpid()))
-            logger.info(f"🔒 Lock file created with PID: {os.getpid()}")
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Could not manage lock file: {e}")
-    
-    logger.info("Starting QR Payment Bot...")
-    
-    # Инициализируем переменную для keep-alive задачи
-    keep_alive_task = None
-    
-    # Создаем приложение БЕЗ post_init callback
-    application = Application.builder().token(BOT_TOKEN).build()
+def get_readiness(application: Application, bot_lease=None) -> dict:
+    """Состояние для /ready: только данные в памяти, без запросов к БД и API"""
+    polling = bool(application.updater and application.updater.running)
+    state = {
+        'ready': application.running and polling and (bot_lease is None or bot_lease.held),
+        'mode': 'polling',
+        'polling': polling,
+        'lease': {'held': bot_lease.held, 'holder': bot_lease.holder} if bot_lease else None,
+        'database': db.pool_status() if DB_ENABLED else None,
+        'update_queue': application.update_queue.qsize(),
+        'pending_user_data': persistence.pending if persistence is not None else 0,
+        'startup_seconds': startup.ready_at,
+        'caches': {
+            'qr': qr_cache.stats(),
+            'reports': reports_cache_size(),
+        },
+        'memory': {
+            'rss': rss_bytes(),
+            'soft_limit': memory_budget.soft_limit,
+            'shrinks': dict(memory_budget.shrinks),
+        },
+    }
+    if os.getenv('RENDER') and render_keep_alive:
+        state['keep_alive'] = render_keep_alive.stats()
+    if CALENDAR_ENABLED:
+        if MULTI_CALENDAR:
+            state['caches']['calendar'] = {'calendars': len(CALENDAR_IDS), 'events': len(calendar_agenda),
+                                           'day': calendar_agenda_day}
+        else:
+            state['caches']['calendar'] = {'events': len(calendar_cache), 'last_sync': calendar_cache.last_sync}
+    return state
+
+def build_application(token: str = None, base_url: str = None, polling: bool = True,
+                      primary: bool = True) -> Application:
+    """Создает Application с обработчиками и фоновыми задачами
+    
+    Args:
+        token: токен бота (по умолчанию BOT_TOKEN)
+        base_url: адрес Bot API (по умолчанию api.telegram.org)
+        polling: False - без Updater, апдейты передаются в application.update_queue
+        primary: только основной экземпляр отправляет ежедневный отчет, сверяет счетчики, чистит события
+            и синхронизирует календарь с API
+    """
+    # Вызовы Bot API (кроме long polling getUpdates) - с метриками
+    builder = Application.builder().token(token or BOT_TOKEN).request(MeteredRequest(connection_pool_size=256))
+    if base_url:
+        builder = builder.base_url(base_url)
+    if not polling:
+        # Апдейты приходят извне (воркер scale-out режима), Updater не нужен
+        builder = builder.updater(None)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
     
     # Добавляем обработчики команд
     application.add_handler(CommandHandler("start", start))
@@ -1409,6 +1772,9 @@ def main():
     application.add_handler(CommandHandler("backup", backup_command))
     application.add_handler(CommandHandler("addtx", addtx_command))
     application.add_handler(CommandHandler("dbcheck", dbcheck_command))
+    application.add_handler(CommandHandler("trace", trace_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("mem", mem_command))
     
     # Обработчик для выбора сумм (inline кнопки)
     application.add_handler(CallbackQueryHandler(handle_amount_selection, pattern=r'^amount_'))
@@ -1419,6 +1785,9 @@ def main():
     # Обработчик для статистики по месяцам (inline кнопки)
     application.add_handler(CallbackQueryHandler(handle_stats_callback, pattern=r'^stats_'))
     
+    # Обработчик записей из календаря (QR в одно нажатие)
+    application.add_handler(CallbackQueryHandler(handle_calendar_payment, pattern=r'^cal_'))
+    
     # Обработчик для удаления транзакций (inline кнопки)
     application.add_handler(CallbackQueryHandler(handle_delete_transaction, pattern=r'^(del_tx_|confirm_del_|cancel_del)'))
     
@@ -1428,23 +1797,173 @@ def main():
     # Обработчик для неизвестных команд
     application.add_handler(MessageHandler(filters.COMMAND, unknown_command))
     
+    # Метрики и трассировка: длительность и ошибки каждого обработчика, корневой span на апдейт
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = instrument_handler(trace_handler(handler.callback))
+    
     # Добавляем обработчик ошибок (Context7 рекомендация)
     application.add_error_handler(error_handler)
     
+    # Ежедневный итоговый отчет для админов (из таблицы дневных агрегатов)
+    if primary and DB_ENABLED and ADMIN_IDS and DAILY_REPORT_TIME.lower() != 'off':
+        if application.job_queue:
+            try:
+                hour, minute = (int(part) for part in DAILY_REPORT_TIME.split(':'))
+                application.job_queue.run_daily(
+                    send_daily_report,
+                    time=dt_time(hour=hour, minute=minute, tzinfo=SALON_TIMEZONE),
+                    name='daily_report'
+                )
+                logger.info(f"🌙 Daily report scheduled at {DAILY_REPORT_TIME} (Europe/Prague)")
+            except ValueError:
+                logger.error(f"❌ Invalid DAILY_REPORT_TIME: {DAILY_REPORT_TIME} (expected HH:MM)")
+        else:
+            logger.warning("⚠️ JobQueue not available (install python-telegram-bot[job-queue]), daily report disabled")
+    
+    # Периодическая сверка денормализованных счетчиков пользователей
+    if primary and DB_ENABLED and application.job_queue and COUNTERS_RECONCILE_HOURS > 0:
+        application.job_queue.run_repeating(
+            reconcile_user_counters,
+            interval=COUNTERS_RECONCILE_HOURS * 3600,
+            first=300,
+            name='reconcile_user_counters'
+        )
+        logger.info(f"👥 User counters reconciliation every {COUNTERS_RECONCILE_HOURS:g}h")
+    
+    # Ретеншн событий: раз в сутки старые дни - в агрегаты (и архив); на PostgreSQL старые дневные
+    # партиции отсоединяются и удаляются (DETACH + DROP), новые создаются на неделю вперед
+    if primary and DB_ENABLED and application.job_queue:
+        application.job_queue.run_repeating(
+            expire_events,
+            interval=24 * 3600,
+            first=600,
+            name='events_retention'
+        )
+    
+    # Бюджет памяти: у лимитов RSS сжимаем кэши (на каждом экземпляре)
+    if application.job_queue and memory.MEMORY_CHECK_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            check_memory,
+            interval=memory.MEMORY_CHECK_INTERVAL,
+            first=memory.MEMORY_CHECK_INTERVAL,
+            name='memory_budget'
+        )
+    
+    # Фоновая синхронизация календаря: экран оплаты читает события из кэша без запросов к API
+    if CALENDAR_ENABLED:
+        if application.job_queue and primary:
+            application.job_queue.run_repeating(
+                refresh_calendar_cache,
+                interval=CALENDAR_SYNC_INTERVAL,
+                first=1,
+                name='calendar_sync'
+            )
+            logger.info(f"📅 Calendar sync every {CALENDAR_SYNC_INTERVAL}s")
+        elif application.job_queue and not MULTI_CALENDAR:
+            # Остальные воркеры scale-out режима только перечитывают файл кэша основного;
+            # расписание нескольких календарей они запрашивают по кнопке "Клиенты сегодня"
+            application.job_queue.run_repeating(
+                reload_calendar_cache,
+                interval=CALENDAR_SYNC_INTERVAL,
+                first=CALENDAR_SYNC_INTERVAL,
+                name='calendar_reload'
+            )
+        elif not application.job_queue:
+            logger.warning("⚠️ JobQueue not available, calendar sync disabled")
+    
+    return application
+
+async def connect_database() -> None:
+    """Подключение к БД и схема в фоне (до этого запросы к БД ждут подключения)"""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(db.connect)
+        logger.info(f"🗄️ Database ready in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        # Следующий запрос к БД попробует подключиться снова
+        logger.error(f"❌ Database connection failed: {e}")
+    finally:
+        startup.record('database connect + schema', started)
+
+async def warm_up_qr() -> None:
+    """Импорт qrcode/PIL в фоне после старта, чтобы первый QR не ждал"""
+    with startup.phase('qr warm-up (qrcode, PIL)'):
+        await asyncio.to_thread(render_qr_png, build_qr_payload(1))
+
+def main():
+    """Главная функция"""
+    
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN not found in environment variables!")
+        return
+    
+    # Единственный экземпляр: аренда в БД (polling стартует, как только старый экземпляр ее освободит)
+    bot_lease = None
+    if DB_ENABLED:
+        from lease import BotLease
+        bot_lease = BotLease(db)
+    
+    logger.info("Starting QR Payment Bot...")
+    
+    # Инициализируем переменную для keep-alive задачи
+    keep_alive_task = None
+    db_connect_task = None
+    
+    # Создаем приложение БЕЗ post_init callback
+    with startup.phase('build application'):
+        application = build_application(base_url=TELEGRAM_API_URL)
+    
+    metrics_registry.gauge('bot_update_queue_size', 'Updates waiting for a handler').set_function(
+        application.update_queue.qsize)
+    if persistence is not None:
+        metrics_registry.gauge('bot_pending_user_data', 'Users with unsaved conversation state').set_function(
+            lambda: persistence.pending)
+        memory_budget.register('user_data', lambda level: evict_idle_user_data(application, level))
+    
+    # Health endpoint в том же event loop (aiohttp); на Render - обязательно
+    health_server = None
+    if os.getenv('RENDER') or os.getenv('PORT'):
+        from health_server import HealthServer
+        health_server = HealthServer(
+            ready_probe=lambda: get_readiness(application, bot_lease),
+            on_request=render_keep_alive.mark_inbound if render_keep_alive else None
+        )
+    
     # Запускаем бота с manual lifecycle management согласно Context7
     logger.info("Starting bot...")
     
-    async def run_bot():
-        """Manual lifecycle management согласно Context7 рекомендациям"""
-        nonlocal keep_alive_task
+    async def start_bot():
+        """Запуск: снимок кэша QR, аренда, JobQueue, polling, keep-alive"""
+        nonlocal keep_alive_task, db_connect_task
         
-        try:
-            # Manual initialization
+        # БД подключается в фоне, параллельно с загрузкой кэша QR и getMe
+        if DB_ENABLED:
+            db_connect_task = asyncio.create_task(connect_database())
+        
+        with startup.phase('qr cache snapshot'):
+            loaded = await asyncio.to_thread(qr_cache.load)
+        if loaded:
+            logger.info(f"🖼️ QR cache snapshot loaded: {loaded} code(s)")
+        
+        # Manual initialization
+        with startup.phase('application.initialize (getMe)'):
             await application.initialize()
+        
+        # Ждем аренду до старта JobQueue и polling: фоновые задачи тоже не должны дублироваться
+        # (аренда хранится в БД - здесь ждем фоновое подключение)
+        if bot_lease:
+            with startup.phase('lease'):
+                await bot_lease.acquire()
+            bot_lease.start_heartbeat()
+        
+        with startup.phase('application.start'):
             await application.start()
-            
-            # Проверяем на конфликты при запуске polling
-            max_retries = 3
+        
+        # Старый экземпляр уже остановил polling; конфликт возможен только
+        # с его последним long-poll запросом, поэтому повторяем часто
+        max_retries = 10
+        with startup.phase('start polling'):
             for attempt in range(max_retries):
                 try:
                     await application.updater.start_polling()
@@ -1453,55 +1972,113 @@ def main():
                     if "Conflict" in str(e) and "getUpdates" in str(e):
                         logger.warning(f"🔄 Telegram API conflict detected (attempt {attempt + 1}/{max_retries})")
                         if attempt < max_retries - 1:
-                            logger.info("⏳ Waiting 10 seconds for old instance to shutdown...")
-                            await asyncio.sleep(10)
+                            await asyncio.sleep(1)
                             continue
                         else:
                             logger.error("❌ Failed to resolve Telegram API conflict after all retries")
                             raise
                     else:
                         raise  # Другая ошибка, не связанная с конфликтом
-            
-            # Настройка keep-alive ПОСЛЕ запуска event loop
-            if os.getenv('RENDER') and setup_render_keep_alive:
-                try:
-                    keep_alive_coro = setup_render_keep_alive()
-                    keep_alive_task = asyncio.create_task(keep_alive_coro)
-                    logger.info("✅ Render keep-alive activated after event loop start")
-                except Exception as e:
-                    logger.warning(f"⚠️ Keep-alive setup failed: {e}")
-            elif os.getenv('RENDER'):
-                logger.warning("⚠️ Running on Render but keep-alive module not available")
-            
-            # Держим бота активным
-            logger.info("🤖 Bot is running... Press Ctrl+C to stop")
+        startup.mark_ready()
+        application.create_task(warm_up_qr())
+        
+        # Настройка keep-alive ПОСЛЕ запуска event loop
+        if os.getenv('RENDER') and setup_render_keep_alive:
             try:
-                # Бесконечный цикл для поддержания работы
-                while True:
-                    await asyncio.sleep(1)
-            except KeyboardInterrupt:
-                logger.info("Received interrupt signal, shutting down gracefully...")
-                
-        finally:
-            # Manual shutdown
-            logger.info("🔄 Starting graceful shutdown...")
-            
-            # Останавливаем keep-alive задачу
-            if keep_alive_task and not keep_alive_task.done():
-                keep_alive_task.cancel()
+                keep_alive_coro = setup_render_keep_alive(start_health_endpoint=health_server is None)
+                keep_alive_task = asyncio.create_task(keep_alive_coro)
+                logger.info("✅ Render keep-alive activated after event loop start")
+            except Exception as e:
+                logger.warning(f"⚠️ Keep-alive setup failed: {e}")
+        elif os.getenv('RENDER'):
+            logger.warning("⚠️ Running on Render but keep-alive module not available")
+        
+        if profiler.PROFILE_ON_START > 0:
+            application.create_task(profile_on_start(application.bot))
+    
+    async def stop_keep_alive():
+        if keep_alive_task and not keep_alive_task.done():
+            keep_alive_task.cancel()
+            try:
+                await keep_alive_task
+            except asyncio.CancelledError:
+                pass
+        if os.getenv('RENDER') and render_keep_alive:
+            render_keep_alive.stop()
+            await render_keep_alive.close()
+    
+    async def stop_polling():
+        if application.updater.running:
+            await application.updater.stop()
+    
+    async def stop_profiler():
+        # Идущий профиль отправляется сразу, а не по истечении окна
+        profiler.finish_early()
+    
+    async def stop_application():
+        # Дожидается текущих обработчиков и останавливает JobQueue
+        if application.running:
+            await application.stop()
+    
+    async def save_qr_cache():
+        saved = await asyncio.to_thread(qr_cache.save)
+        logger.info(f"🖼️ QR cache snapshot saved: {saved} code(s)")
+    
+    async def release_lease():
+        if bot_lease:
+            await bot_lease.release()
+    
+    async def stop_health_server():
+        if health_server:
+            await health_server.stop()
+    
+    async def run_bot():
+        """Работа до SIGTERM/SIGINT (или потери аренды), затем упорядоченная остановка"""
+        stop_event = asyncio.Event()
+        install_signal_handlers(stop_event)
+        
+        # 🚀 Health endpoint ПЕРВЫМ: Render проверяет /health через несколько секунд после старта
+        if health_server:
+            try:
+                with startup.phase('health endpoint'):
+                    await health_server.start()
+            except Exception as e:
+                logger.error(f"❌ Failed to start health endpoint: {e}")
+        
+        startup_task = asyncio.create_task(start_bot())
+        stop_requested = asyncio.create_task(stop_event.wait())
+        try:
+            done, _ = await asyncio.wait({startup_task, stop_requested}, return_when=asyncio.FIRST_COMPLETED)
+            if startup_task in done:
+                startup_task.result()
+                logger.info("🤖 Bot is running... Press Ctrl+C to stop")
+                # Без периодических пробуждений: ждем сигнал или потерю аренды
+                await wait_for_any(stop_event, bot_lease.lost if bot_lease else None)
+            else:
+                # Сигнал пришел во время запуска (например, пока ждали аренду)
+                startup_task.cancel()
                 try:
-                    await keep_alive_task
+                    await startup_task
                 except asyncio.CancelledError:
-                    logger.info("Keep-alive task cancelled")
-            
-            # Останавливаем render keep-alive instance
-            if os.getenv('RENDER') and render_keep_alive:
-                render_keep_alive.stop()
+                    pass
+        finally:
+            stop_requested.cancel()
+            logger.info("🔄 Starting graceful shutdown...")
             
-            # Manual shutdown sequence
-            await application.updater.stop()
-            await application.stop()
-            await application.shutdown()
+            # Порядок важен: сначала перестаем принимать апдейты, затем дорабатываем
+            # обработчики, сохраняем состояние диалогов (flush в shutdown) и кэш QR,
+            # и только потом отдаем аренду следующему экземпляру
+            await run_shutdown([
+                ('keep-alive stopped', stop_keep_alive),
+                ('polling stopped', stop_polling),
+                ('profiler stopped', stop_profiler),
+                ('handlers and jobs drained', stop_application),
+                ('pending DB writes flushed', application.shutdown),
+                ('QR cache snapshot saved', save_qr_cache),
+                ('lease released', release_lease),
+                ('calendar client closed', close_calendar_client),
+                ('health endpoint stopped', stop_health_server),
+            ])
             
             logger.info("✅ Graceful shutdown completed")
     
@@ -1511,15 +2088,6 @@ def main():
     except Exception as e:
         logger.error(f"Bot error: {e}")
     finally:
-        # Удаляем lock файл
-        lock_file = '/tmp/qr_bot.lock' if os.getenv('RENDER') else None
-        if lock_file and os.path.exists(lock_file):
-            try:
-                os.remove(lock_file)
-                logger.info("🗑️ Lock file removed")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not remove lock file: {e}")
-        
         logger.info("Bot stopped.")
 
 if __name__ == '__main__':
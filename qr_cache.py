@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Кэш готовых QR-кодов (PNG) по строке платежа
+Одинаковая сумма и услуга дают одинаковый SPD payload, поэтому картинка
+рендерится один раз; для записей календаря QR рисуются заранее в фоне
+"""
+
+import base64
+import json
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Максимум QR-кодов в кэше (PNG ~1-2 КБ каждый)
+QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', '512'))
+
+# Снимок кэша на диске: сохраняется при остановке, читается при старте
+QR_CACHE_FILE = os.getenv('QR_CACHE_FILE', 'qr_cache.json')
+
+
+class QRCache:
+    """LRU кэш PNG байтов QR-кодов, потокобезопасный"""
+
+    def __init__(self, max_entries: int = QR_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, payload: str) -> Optional[bytes]:
+        """PNG из кэша или None"""
+        with self._lock:
+            png = self._entries.get(payload)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(payload)
+            self.hits += 1
+            return png
+
+    def put(self, payload: str, png: bytes):
+        """Сохранить PNG (самая старая запись вытесняется при переполнении)"""
+        with self._lock:
+            self._entries[payload] = png
+            self._entries.move_to_end(payload)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_render(self, payload: str, render: Callable[[str], bytes]) -> bytes:
+        """PNG из кэша, при промахе - рендер и сохранение"""
+        png = self.get(payload)
+        if png is None:
+            png = render(payload)
+            self.put(payload, png)
+        return png
+
+    def precompute(self, payloads: Iterable[str], render: Callable[[str], bytes]) -> int:
+        """Заранее отрендерить QR-коды, которых еще нет в кэше
+
+        Returns:
+            Количество новых QR-кодов
+        """
+        rendered = 0
+        for payload in payloads:
+            with self._lock:
+                if payload in self._entries:
+                    continue
+            self.put(payload, render(payload))
+            rendered += 1
+        return rendered
+
+    def __contains__(self, payload: str) -> bool:
+        return payload in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._entries.clear()
+
+    def trim(self, keep: int) -> int:
+        """Оставить keep самых свежих записей; возвращает сколько вытеснено"""
+        with self._lock:
+            removed = 0
+            while len(self._entries) > max(keep, 0):
+                self._entries.popitem(last=False)
+                removed += 1
+            return removed
+
+    def save(self, path: str = QR_CACHE_FILE) -> int:
+        """Сохранить снимок кэша атомарно (запись во временный файл + rename)
+
+        Returns:
+            Количество сохраненных QR-кодов
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        data = {payload: base64.b64encode(png).decode('ascii') for payload, png in entries}
+
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, path)
+        return len(data)
+
+    def load(self, path: str = QR_CACHE_FILE) -> int:
+        """Загрузить снимок кэша (если файл есть)
+
+        Returns:
+            Количество загруженных QR-кодов
+        """
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ QR cache snapshot is unreadable, ignoring: {e}")
+            return 0
+
+        # Порядок в снимке - от старых к новым, как в LRU
+        for payload, png in data.items():
+            self.put(payload, base64.b64decode(png))
+        return min(len(data), self.max_entries)
+
+    def stats(self) -> Dict:
+        """Статистика кэша"""
+        return {
+            'entries': len(self._entries),
+            'bytes': sum(len(png) for png in list(self._entries.values())),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Общий кэш QR-кодов бота
+qr_cache = QRCache()
@@ -8,66 +8,145 @@ import asyncio
 import aiohttp
 import logging
 import os
+import random
+import time
+from collections import deque
 from datetime import datetime
+from typing import Deque, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Базовая задержка повтора после неудачного пинга (секунды)
+RETRY_BASE_DELAY = 15
+
+# Сколько последних пингов хранить для статистики задержки
+PING_HISTORY_SIZE = 50
+
 class RenderKeepAlive:
-    """Класс для поддержания активности Render сервиса"""
+    """Класс для поддержания активности Render сервиса
+    
+    Render усыпляет бесплатный сервис после 15 минут без входящих HTTP запросов.
+    Пинг уходит только если входящих запросов не было ping_interval секунд;
+    все пинги идут через одну сессию, ошибки повторяются с backoff и джиттером.
+    """
     
-    def __init__(self, app_url: str = None, ping_interval: int = 720):
+    def __init__(self, app_url: str = None, ping_interval: int = 720, initial_delay: float = 30,
+                 retry_delay: float = RETRY_BASE_DELAY):
         """
         :param app_url: URL вашего Render приложения
-        :param ping_interval: Интервал пинга в секундах (по умолчанию 12 минут)
+        :param ping_interval: Максимум секунд без входящих запросов (по умолчанию 12 минут)
+        :param initial_delay: Пауза перед первой проверкой (дает время боту запуститься)
+        :param retry_delay: Базовая задержка повтора после неудачного пинга
         """
         self.app_url = app_url or os.getenv('RENDER_EXTERNAL_URL', 'http://localhost:8080')
         self.ping_interval = ping_interval
+        self.initial_delay = initial_delay
+        self.retry_delay = retry_delay
         self.is_running = False
         
-    async def ping_self(self):
-        """Пингует собственный health endpoint"""
-        try:
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._last_inbound = time.monotonic()
+        self._failures = 0
+        self.pings_sent = 0
+        self.pings_skipped = 0
+        self.history: Deque[Tuple[float, Optional[float], bool]] = deque(maxlen=PING_HISTORY_SIZE)
+    
+    def mark_inbound(self):
+        """Отметить внешний входящий HTTP запрос (он тоже не дает Render усыпить сервис)
+        
+        Внутренние health check'и Render сюда не попадают: они не будят сервис
+        """
+        self._last_inbound = time.monotonic()
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Одна сессия на весь процесс: DNS кэш и keep-alive соединение переиспользуются"""
+        if self._session is None or self._session.closed:
             # Используем ClientTimeout согласно Context7 рекомендациям
             timeout = aiohttp.ClientTimeout(
                 total=10,           # Общий таймаут
                 sock_connect=5,     # Таймаут подключения к сокету
                 sock_read=5         # Таймаут чтения сокета
             )
-            
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(f"{self.app_url}/health") as response:
-                    if response.status == 200:
-                        logger.info(f"✅ Keep-alive ping successful: {datetime.now().strftime('%H:%M:%S')}")
-                        return True
-                    else:
-                        logger.warning(f"⚠️ Keep-alive ping failed with status: {response.status}")
-                        return False
+            self._session = aiohttp.ClientSession(
+                timeout=timeout,
+                connector=aiohttp.TCPConnector(limit=1, ttl_dns_cache=self.ping_interval * 2)
+            )
+        return self._session
+    
+    async def ping_self(self):
+        """Пингует собственный health endpoint"""
+        start = time.monotonic()
+        ok = False
+        try:
+            async with self._get_session().get(f"{self.app_url}/health") as response:
+                await response.read()
+                if response.status == 200:
+                    ok = True
+                    logger.info(f"✅ Keep-alive ping successful: {datetime.now().strftime('%H:%M:%S')} "
+                                f"({(time.monotonic() - start) * 1000:.0f} ms)")
+                else:
+                    logger.warning(f"⚠️ Keep-alive ping failed with status: {response.status}")
         except asyncio.TimeoutError:
             logger.warning("⏰ Keep-alive ping timeout")
-            return False
         except aiohttp.ClientConnectorError as e:
             logger.warning(f"🔌 Keep-alive connection error: {e}")
-            return False
         except Exception as e:
             logger.error(f"❌ Keep-alive ping error: {e}")
-            return False
+        
+        self.pings_sent += 1
+        self.history.append((time.time(), time.monotonic() - start if ok else None, ok))
+        if ok:
+            self.mark_inbound()
+        return ok
+    
+    def _retry_delay(self) -> float:
+        """Экспоненциальный backoff с джиттером, не дольше ping_interval"""
+        cap = min(self.retry_delay * 2 ** (self._failures - 1), self.ping_interval)
+        return cap / 2 + random.uniform(0, cap / 2)
     
     async def keep_alive_loop(self):
         """Основной цикл keep-alive"""
         logger.info(f"🚀 Starting keep-alive service for {self.app_url}")
         if self.ping_interval >= 60:
-            logger.info(f"⏰ Ping interval: {self.ping_interval // 60} minutes")
+            logger.info(f"⏰ Ping after {self.ping_interval // 60} minutes without inbound traffic")
         else:
-            logger.info(f"⏰ Ping interval: {self.ping_interval} seconds")
+            logger.info(f"⏰ Ping after {self.ping_interval} seconds without inbound traffic")
         
         self.is_running = True
         
-        # Ждем 30 секунд перед первым пингом (дает время боту запуститься)
-        await asyncio.sleep(30)
+        # Ждем перед первой проверкой (дает время боту запуститься)
+        await asyncio.sleep(self.initial_delay)
         
         while self.is_running:
-            await self.ping_self()
-            await asyncio.sleep(self.ping_interval)
+            idle = time.monotonic() - self._last_inbound
+            if idle < self.ping_interval:
+                last_inbound = self._last_inbound
+                await asyncio.sleep(self.ping_interval - idle)
+                # Пока ждали, пришли запросы - пинг не нужен, окно сдвигается
+                if self._last_inbound != last_inbound:
+                    self.pings_skipped += 1
+                continue
+            
+            if await self.ping_self():
+                self._failures = 0
+                continue
+            
+            self._failures += 1
+            await asyncio.sleep(self._retry_delay())
+    
+    def stats(self) -> Dict:
+        """Статистика пингов и задержки (для /ready)"""
+        latencies = [latency for _, latency, ok in self.history if ok]
+        last = latencies[-1] if latencies else None
+        latencies.sort()
+        return {
+            'pings_sent': self.pings_sent,
+            'pings_skipped': self.pings_skipped,
+            'failures_in_row': self._failures,
+            'idle_seconds': round(time.monotonic() - self._last_inbound, 1),
+            'latency_ms_p50': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            'latency_ms_last': round(last * 1000, 1) if last is not None else None,
+        }
     
     def start(self):
         """Запускает keep-alive как фоновую задачу"""
@@ -79,6 +158,12 @@ class RenderKeepAlive:
         """Останавливает keep-alive"""
         self.is_running = False
         logger.info("⏹️ Keep-alive task stopped")
+    
+    async def close(self):
+        """Закрыть сессию (при остановке бота)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
 # Создание глобального экземпляра
 render_keep_alive = RenderKeepAlive()
@@ -180,11 +265,12 @@ def create_simple_health_endpoint():
     except Exception as e:
         logger.error(f"❌ Failed to start simple health endpoint: {e}")
 
-def setup_render_keep_alive(app_url: str = None):
+def setup_render_keep_alive(app_url: str = None, start_health_endpoint: bool = True):
     """
     Настройка keep-alive для Render
     
     :param app_url: URL вашего Render приложения (например: https://your-app.onrender.com)
+    :param start_health_endpoint: False, если health endpoint уже поднят (health_server.py)
     :return: корутину для запуска в asyncio.create_task()
     """
     
@@ -201,7 +287,9 @@ def setup_render_keep_alive(app_url: str = None):
         logger.info(f"🔧 Keep-alive configured for: {app_url}")
     
     # Создаем health endpoint
-    if os.getenv('FLASK_APP'):
+    if not start_health_endpoint:
+        pass
+    elif os.getenv('FLASK_APP'):
         create_flask_health_endpoint()
     else:
         create_simple_health_endpoint()
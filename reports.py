@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Рендеринг отчетов статистики
+Шаблоны компилируются один раз при импорте и заполняются за один проход
+через str.join; готовый текст кэшируется по версии снимка данных
+"""
+
+from datetime import datetime, timezone
+from typing import Callable, Dict, Hashable, Tuple
+
+# Названия месяцев (индекс = номер месяца)
+MONTH_NAMES = ('', 'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+               'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь')
+
+# Максимум закэшированных представлений (кэш хранит только последнюю версию каждого)
+MAX_CACHED_VIEWS = 128
+
+_cache: Dict[Hashable, Tuple[Hashable, str]] = {}
+
+
+def cached(key: Hashable, source, render: Callable[[], str]) -> str:
+    """Возвращает отчет из кэша, если версия данных источника не менялась
+
+    Источник без атрибута version (прямые запросы к БД) не кэшируется.
+    В версию входит текущий час UTC: отчеты со смещением месяцев и "за 24ч"
+    зависят от времени, даже если данные не менялись.
+    """
+    version = getattr(source, 'version', None)
+    if version is None:
+        return render()
+
+    stamp = (version, datetime.now(timezone.utc).strftime('%Y-%m-%d %H'))
+    entry = _cache.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+
+    text = render()
+    if len(_cache) >= MAX_CACHED_VIEWS:
+        _cache.clear()
+    _cache[key] = (stamp, text)
+    return text
+
+
+def clear_cache():
+    """Очистить кэш отчетов"""
+    _cache.clear()
+
+
+def cache_size() -> int:
+    """Количество закэшированных представлений"""
+    return len(_cache)
+
+
+# ----------------------------------------------------------------------
+# Общая статистика /stats (Markdown)
+# ----------------------------------------------------------------------
+
+_OVERVIEW_HEADER = (
+    '📊 **СТАТИСТИКА БОТА**\n'
+    '{db_icon} База данных: **{db_name}**\n\n'
+    '**📅 За все время:**\n'
+    '👥 Всего пользователей: {total_users}\n'
+    '💰 Всего транзакций: {total_transactions}\n'
+    '💵 Общая сумма: {total_amount:,.0f} CZK\n'
+    '📊 Средняя сумма: {avg_amount:.0f} CZK\n'
+    '📍 Медиана: {median_amount:.0f} CZK, P90: {p90_amount:.0f} CZK\n'
+    '🟢 Активных за 24ч: {active_24h}\n\n'
+).format
+
+_OVERVIEW_MONTH = (
+    '**📅 {month_name} {year}:**\n'
+    '💰 Транзакций: {transactions}\n'
+    '💵 Сумма: {total_amount:,.0f} CZK\n'
+    '📊 Средняя: {avg_amount:.0f} CZK\n'
+    '👥 Клиентов: {unique_users}\n\n'
+).format
+
+_OVERVIEW_USER = '{0}. @{1}: {2} QR, {3:.0f} CZK\n'.format
+_SERVICE_ROW = '{0}. {1}: {2}x\n'.format
+
+_DB_LABELS = {
+    'postgresql': ('🐘', 'PostgreSQL'),
+    'sqlite': ('📝', 'SQLite'),
+}
+
+
+def render_stats_overview(source, db_type: str) -> str:
+    """Общая статистика бота: за все время, текущий и прошлый месяц, топы"""
+    return cached(('overview', db_type), source, lambda: _render_stats_overview(source, db_type))
+
+
+def _render_stats_overview(source, db_type: str) -> str:
+    total_stats = source.get_total_stats()
+    all_users = source.get_all_users_stats()
+    popular_services = source.get_popular_services(5)
+    db_icon, db_name = _DB_LABELS.get(db_type, _DB_LABELS['sqlite'])
+
+    parts = [_OVERVIEW_HEADER(db_icon=db_icon, db_name=db_name, **total_stats)]
+
+    # Текущий и прошлый месяц
+    for offset in (0, 1):
+        month = source.get_monthly_stats(offset)
+        if month['transactions'] > 0:
+            parts.append(_OVERVIEW_MONTH(month_name=MONTH_NAMES[month['month']], **month))
+
+    if all_users:
+        parts.append('**Топ мастеров:**\n')
+        parts.extend(
+            _OVERVIEW_USER(i, user['username'] or f"ID{user['user_id']}",
+                           user['transactions_count'], user['total_amount'])
+            for i, user in enumerate(all_users[:5], 1)
+        )
+
+    if popular_services:
+        parts.append('\n**Популярные услуги:**\n')
+        parts.extend(_SERVICE_ROW(i, service, count) for i, (service, count) in enumerate(popular_services, 1))
+
+    return ''.join(parts)
+
+
+# ----------------------------------------------------------------------
+# Статистика за выбранный месяц (HTML)
+# ----------------------------------------------------------------------
+
+_MONTH_HEADER = '📊 <b>Статистика за {0} {1}</b>\n\n'.format
+
+_MONTH_TOTALS = (
+    '<b>📈 Общие показатели:</b>\n'
+    '💰 Транзакций: {transactions}\n'
+    '💵 Общая сумма: {total_amount:,.0f} CZK\n'
+    '📊 Средний чек: {avg_amount:.0f} CZK\n'
+    '📍 Медиана: {median_amount:.0f} CZK\n'
+    '📈 P90: {p90_amount:.0f} CZK\n'
+    '👥 Клиентов: {unique_users}\n'
+).format
+
+_MONTH_EXTREMES = (
+    '📉 Мин. сумма: {min_amount:.0f} CZK\n'
+    '📈 Макс. сумма: {max_amount:.0f} CZK\n'
+).format
+
+_DISTRIBUTION_ROW = '{0} CZK: {1} {2}\n'.format
+_MONTH_USER = '{0}. @{1}: {2} QR, {3:.0f} CZK, медиана {4:.0f}\n'.format
+
+
+def render_month_stats(source, month_offset: int) -> str:
+    """Статистика за месяц: показатели, распределение чеков, топ мастеров и услуг"""
+    return cached(('month', month_offset), source, lambda: _render_month_stats(source, month_offset))
+
+
+def _render_month_stats(source, month_offset: int) -> str:
+    month_stats = source.get_monthly_stats(month_offset)
+    parts = [_MONTH_HEADER(MONTH_NAMES[month_stats['month']], month_stats['year'])]
+
+    if month_stats['transactions'] <= 0:
+        parts.append('📭 Нет данных за этот период')
+        return ''.join(parts)
+
+    parts.append(_MONTH_TOTALS(**month_stats))
+
+    # Минимальная и максимальная транзакции
+    extremes = source.get_monthly_extremes(month_offset)
+    if extremes['max_amount'] > 0:
+        parts.append(_MONTH_EXTREMES(**extremes))
+
+    # Распределение чеков по интервалам
+    histogram = source.get_amount_histogram(month_offset)
+    distribution = histogram.distribution(500)
+    if distribution:
+        parts.append('\n<b>💳 Распределение чеков:</b>\n')
+        for low, high, count in distribution:
+            bar = '█' * max(1, round(count / histogram.total * 10))
+            range_text = f'{low}–{high}' if high is not None else f'{low}+'
+            parts.append(_DISTRIBUTION_ROW(range_text, bar, count))
+
+    # Топ мастеров за месяц
+    top_users = source.get_monthly_top_users(month_offset, 5)
+    if top_users:
+        parts.append('\n<b>👥 Топ мастеров:</b>\n')
+        for i, user in enumerate(top_users, 1):
+            median = source.get_amount_histogram(month_offset, user['user_id']).median
+            parts.append(_MONTH_USER(i, user['username'] or f"ID{user['user_id']}",
+                                     user['transactions_count'], user['total_amount'], median))
+
+    # Топ услуг за месяц
+    top_services = source.get_monthly_top_services(month_offset, 5)
+    if top_services:
+        parts.append('\n<b>🛍️ Популярные услуги:</b>\n')
+        parts.extend(_SERVICE_ROW(i, service, count) for i, (service, count) in enumerate(top_services, 1))
+
+    return ''.join(parts)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Scale-out режим: webhook фронт + N процессов-воркеров
+Фронт принимает апдейты от Telegram и раскладывает их по воркерам по chat_id.
+Шард чата считается через crc32 и не меняется между перезапусками: все апдейты
+одного чата обрабатывает один процесс в порядке поступления, его user_data
+живут только в этом воркере, а генерация QR использует все ядра
+"""
+
+import asyncio
+import json
+import os
+import signal
+import logging
+import multiprocessing
+import zlib
+from typing import Dict, List, Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+
+# Количество воркеров (по умолчанию - по числу ядер)
+SCALE_OUT_WORKERS = int(os.getenv('SCALE_OUT_WORKERS', '0')) or os.cpu_count() or 1
+
+# Адрес Bot API (в нагрузочном тесте - локальный fake сервер)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
+# Webhook: публичный адрес, путь и секрет (заголовок X-Telegram-Bot-Api-Secret-Token)
+WEBHOOK_PATH = '/webhook'
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or (
+    f"{os.getenv('RENDER_EXTERNAL_URL').rstrip('/')}{WEBHOOK_PATH}" if os.getenv('RENDER_EXTERNAL_URL') else None
+)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# Общий размер пула соединений PostgreSQL, делится между воркерами
+TOTAL_DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '3'))
+
+# Сколько ждать воркеры при остановке (секунды)
+WORKER_STOP_TIMEOUT = 30
+
+
+def shard_for(chat_id: Optional[int], workers: int) -> int:
+    """Номер воркера для чата (стабилен между перезапусками, в отличие от hash())"""
+    if chat_id is None:
+        return 0
+    return zlib.crc32(str(chat_id).encode()) % workers
+
+
+def extract_chat_id(update: Dict) -> Optional[int]:
+    """chat_id апдейта (для апдейтов без чата - id пользователя)"""
+    for key, payload in update.items():
+        if key == 'update_id' or not isinstance(payload, dict):
+            continue
+        if 'chat' in payload:
+            return payload['chat']['id']
+        message = payload.get('message')
+        if isinstance(message, dict) and 'chat' in message:
+            return message['chat']['id']
+        for user_key in ('from', 'user'):
+            if isinstance(payload.get(user_key), dict):
+                return payload[user_key]['id']
+    return None
+
+
+# ----------------------------------------------------------------------
+# Воркер
+# ----------------------------------------------------------------------
+
+def worker_snapshot_path(path: str, index: int) -> str:
+    """Снимок кэша QR воркера: qr_cache.json -> qr_cache.worker-0.json
+    (воркеры сохраняются одновременно и затирали бы общий файл)
+    """
+    root, ext = os.path.splitext(path)
+    return f'{root}.worker-{index}{ext}'
+
+
+def worker_main(index: int, workers: int, updates, pool_size: int, log_level: str = 'INFO'):
+    """Точка входа процесса-воркера"""
+    logging.basicConfig(
+        format=f'%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s',
+        level=log_level,
+        force=True
+    )
+    # Размер пула читается при импорте database
+    os.environ['DB_POOL_SIZE'] = str(pool_size)
+    # qr.py в воркере берет статистику из общей БД, а не из движка в памяти своего шарда
+    os.environ['SCALE_OUT_WORKER'] = str(index)
+    try:
+        asyncio.run(_run_worker(index, workers, updates))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(index: int, workers: int, updates):
+    from telegram import Update
+    import qr
+    from qr_cache import QR_CACHE_FILE
+
+    snapshot = worker_snapshot_path(QR_CACHE_FILE, index)
+    loaded = await asyncio.to_thread(qr.qr_cache.load, snapshot)
+    if loaded:
+        logger.info(f"🖼️ QR cache snapshot loaded: {loaded} code(s)")
+
+    # Календарь синхронизирует с API только воркер 0, остальные читают его файл кэша
+    application = qr.build_application(base_url=TELEGRAM_API_URL, polling=False, primary=index == 0)
+    await application.initialize()
+    await application.start()
+    logger.info(f"👷 Worker {index + 1}/{workers} ready (PID: {os.getpid()})")
+
+    loop = asyncio.get_running_loop()
+    processed = 0
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, updates.get)
+            if raw is None:
+                break
+            await application.update_queue.put(Update.de_json(json.loads(raw), application.bot))
+            processed += 1
+    finally:
+        # Application.stop дорабатывает уже поставленные в очередь апдейты
+        await application.stop()
+        await application.shutdown()
+        try:
+            saved = await asyncio.to_thread(qr.qr_cache.save, snapshot)
+            logger.info(f"🖼️ QR cache snapshot saved: {saved} code(s)")
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to save QR cache snapshot: {e}")
+        logger.info(f"👷 Worker {index + 1}/{workers} stopped after {processed} updates")
+
+
+# ----------------------------------------------------------------------
+# Фронт
+# ----------------------------------------------------------------------
+
+class ShardRouter:
+    """Процессы-воркеры и их очереди апдейтов"""
+
+    def __init__(self, workers: int = SCALE_OUT_WORKERS, db_pool_size: int = TOTAL_DB_POOL_SIZE,
+                 log_level: str = 'INFO'):
+        self.workers = workers
+        # spawn: воркер импортирует бота с нуля, без копии event loop и соединений фронта
+        context = multiprocessing.get_context('spawn')
+        self.queues = [context.Queue() for _ in range(workers)]
+        pool_size = max(1, db_pool_size // workers)
+        self.processes = [
+            context.Process(target=worker_main, args=(index, workers, queue, pool_size, log_level),
+                            name=f'qr-worker-{index}')
+            for index, queue in enumerate(self.queues)
+        ]
+        self.dispatched = [0] * workers
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        logger.info(f"🚀 Started {self.workers} worker(s)")
+
+    def dispatch(self, raw: bytes) -> int:
+        """Передать апдейт воркеру его чата
+
+        Returns:
+            Номер воркера
+
+        Raises:
+            ValueError: тело запроса - не JSON объект
+        """
+        update = json.loads(raw)
+        if not isinstance(update, dict):
+            raise ValueError('update must be a JSON object')
+        shard = shard_for(extract_chat_id(update), self.workers)
+        self.queues[shard].put(raw)
+        self.dispatched[shard] += 1
+        return shard
+
+    def alive(self) -> List[bool]:
+        return [process.is_alive() for process in self.processes]
+
+    def stop(self, timeout: float = WORKER_STOP_TIMEOUT):
+        """Остановить воркеры, дав им доработать очереди"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"⚠️ {process.name} did not stop in {timeout:.0f}s, terminating")
+                process.terminate()
+                process.join()
+        logger.info(f"✅ Workers stopped, dispatched per worker: {self.dispatched}")
+
+
+def create_front_app(router, secret: Optional[str] = WEBHOOK_SECRET) -> web.Application:
+    """aiohttp приложение фронта: webhook и health check"""
+
+    async def webhook(request: web.Request) -> web.Response:
+        if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+            return web.Response(status=403)
+        try:
+            router.dispatch(await request.read())
+        except ValueError:
+            return web.Response(status=400)
+        return web.Response(text='ok')
+
+    async def health(request: web.Request) -> web.Response:
+        alive = router.alive()
+        return web.json_response(
+            {'status': 'ok' if all(alive) else 'degraded', 'workers': len(alive), 'alive': sum(alive)},
+            status=200 if all(alive) else 503
+        )
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, webhook)
+    app.router.add_get('/health', health)
+    return app
+
+
+async def run_front(router: ShardRouter, host: str = '0.0.0.0', port: int = None):
+    """Фронт до SIGTERM/SIGINT"""
+    port = port or int(os.getenv('PORT', 8080))
+    runner = web.AppRunner(create_front_app(router))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"🌐 Webhook front listening on {host}:{port}{WEBHOOK_PATH}")
+
+    if WEBHOOK_URL:
+        from telegram import Bot
+        async with Bot(BOT_TOKEN, base_url=TELEGRAM_API_URL) as bot:
+            await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET, drop_pending_updates=False)
+        logger.info(f"🔗 Webhook set to {WEBHOOK_URL}")
+    else:
+        logger.warning("⚠️ WEBHOOK_URL not set, webhook must be configured manually")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    """Запуск фронта и воркеров"""
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN not found in environment variables!")
+        return
+
+    router = ShardRouter()
+    router.start()
+    try:
+        asyncio.run(run_front(router))
+    finally:
+        router.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Фазы холодного старта: импорты и шаги инициализации с длительностями
+Импорты модуля бота замеряются автоматически (обертка над __import__ на время
+старта), шаги main() - явными фазами. Итог пишется в лог, когда бот начал
+принимать апдейты, и отдается в /ready
+"""
+
+import builtins
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Импорты быстрее этого порога (секунды) не попадают в отчет
+IMPORT_REPORT_THRESHOLD = 0.005
+
+
+class StartupRecorder:
+    """Фазы старта: (имя, начало от запуска процесса, длительность) в секундах"""
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        # Запуск интерпретатора и site-packages - до импорта этого модуля
+        self.interpreter = max(time.time() - psutil.Process().create_time(), 0.0)
+        self.phases: List[Tuple[str, float, float]] = []
+        self.ready_at: Optional[float] = None
+        self._tracked: Set[str] = set()
+        self._builtin_import = builtins.__import__
+
+    def elapsed(self) -> float:
+        """Секунды с запуска процесса"""
+        return self.interpreter + time.perf_counter() - self._origin
+
+    def record(self, name: str, started: float):
+        """Завершенная фаза (started - time.perf_counter() начала)"""
+        self.phases.append((name, self.interpreter + started - self._origin, time.perf_counter() - started))
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    # ------------------------------------------------------------------
+    # Импорты
+    # ------------------------------------------------------------------
+
+    def track_imports(self, module_name: str):
+        """Замерять импорты верхнего уровня, которые выполняет модуль module_name"""
+        self._tracked.add(module_name)
+        builtins.__import__ = self._timed_import
+
+    def stop_tracking_imports(self):
+        builtins.__import__ = self._builtin_import
+        self._tracked.clear()
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if (level or name in sys.modules or not globals
+                or globals.get('__name__') not in self._tracked):
+            return self._builtin_import(name, globals, locals, fromlist, level)
+        started = time.perf_counter()
+        try:
+            return self._builtin_import(name, globals, locals, fromlist, level)
+        finally:
+            if time.perf_counter() - started >= IMPORT_REPORT_THRESHOLD:
+                self.record(f'import {name}', started)
+
+    # ------------------------------------------------------------------
+    # Отчет
+    # ------------------------------------------------------------------
+
+    def mark_ready(self):
+        """Бот принимает апдейты: фиксируем время старта и пишем отчет в лог"""
+        self.ready_at = self.elapsed()
+        self.stop_tracking_imports()
+        logger.info(f"🚀 Cold start: ready in {self.ready_at:.2f}s (interpreter {self.interpreter:.2f}s)")
+        for name, offset, duration in self.phases:
+            logger.info(f"  ⏱️ {offset:7.3f}s +{duration * 1000:7.1f} ms  {name}")
+
+    def as_dict(self) -> Dict:
+        return {
+            'ready_at': round(self.ready_at, 3) if self.ready_at is not None else None,
+            'interpreter': round(self.interpreter, 3),
+            'phases': [{'name': name, 'offset': round(offset, 3), 'duration': round(duration, 3)}
+                       for name, offset, duration in self.phases],
+        }
+
+
+# Фазы старта процесса бота
+startup = StartupRecorder()
@@ -0,0 +1,85 @@
+"""
+Тесты для гистограммы сумм чеков
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from amount_histogram import AmountHistogram, bucket_for, BUCKET_WIDTH, OVERFLOW_BUCKET
+
+
+class TestBuckets:
+    """Тесты распределения сумм по корзинам"""
+
+    @pytest.mark.parametrize("amount,bucket", [
+        (0, 0),
+        (99.99, 0),
+        (100, 1),
+        (1500, 15),
+        (1_000_000, OVERFLOW_BUCKET),
+        (-50, 0),
+    ])
+    def test_bucket_for(self, amount, bucket):
+        assert bucket_for(amount) == bucket
+
+
+class TestQuantiles:
+    """Тесты медианы и перцентилей"""
+
+    def test_empty(self):
+        histogram = AmountHistogram()
+        assert histogram.median == 0.0
+        assert histogram.p90 == 0.0
+
+    def test_close_to_exact(self):
+        amounts = [500, 800, 800, 1000, 1200, 1400, 1500, 1500, 1800, 2500]
+        histogram = AmountHistogram()
+        for amount in amounts:
+            histogram.add(amount)
+
+        # Ошибка не больше ширины корзины
+        assert abs(histogram.median - 1300) <= BUCKET_WIDTH
+        assert abs(histogram.p90 - 1800) <= BUCKET_WIDTH
+
+    def test_remove(self):
+        histogram = AmountHistogram()
+        histogram.add(1500)
+        histogram.add(500)
+        histogram.remove(500)
+
+        assert histogram.total == 1
+        assert 1500 <= histogram.median <= 1600
+
+    def test_merge(self):
+        first = AmountHistogram()
+        second = AmountHistogram()
+        first.add(500)
+        second.add(1500)
+        second.add(1500)
+
+        merged = first + second
+
+        assert merged.total == 3
+        assert first.total == 1
+        assert 1500 <= merged.median <= 1600
+
+
+class TestDistribution:
+    """Тесты крупных интервалов для отображения"""
+
+    def test_distribution(self):
+        histogram = AmountHistogram()
+        for amount in (500, 700, 1200, 50000):
+            histogram.add(amount)
+
+        assert histogram.distribution(500) == [
+            (500, 999, 2),
+            (1000, 1499, 1),
+            (OVERFLOW_BUCKET * BUCKET_WIDTH, None, 1),
+        ]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
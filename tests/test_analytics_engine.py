@@ -0,0 +1,190 @@
+"""
+Тесты для аналитического движка в памяти
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from database import Database
+from analytics_engine import AnalyticsEngine
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Временная SQLite база с тестовыми данными"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'test_stats.db'))
+    database = Database()
+
+    database.add_or_update_user(1, 'anna', 'Anna')
+    database.add_or_update_user(2, 'marie', 'Marie')
+    database.add_or_update_user(3, 'petra', 'Petra')
+
+    database.add_transaction(1, 1500.0, 'LAMINACE ŘAS')
+    database.add_transaction(1, 800.0, 'ÚPRAVA')
+    database.add_transaction(2, 1000.0, 'ÚPRAVA')
+    database.add_event(1, 'start')
+
+    # Транзакции прошлого месяца
+    with database.get_connection() as conn:
+        conn.execute(
+            "INSERT INTO transactions (user_id, amount, service, timestamp) "
+            "VALUES (?, ?, ?, datetime('now', 'start of month', '-10 days'))",
+            (2, 2200.0, 'LÍČENÍ & ÚČES')
+        )
+        conn.execute(
+            "INSERT INTO transactions (user_id, amount, service, timestamp) "
+            "VALUES (?, ?, ?, datetime('now', 'start of month', '-20 days'))",
+            (3, 500.0, None)
+        )
+        # Агрегаты пересобираются из транзакций
+        conn.execute("DELETE FROM amount_buckets")
+        conn.execute("DELETE FROM daily_rollups")
+    database.backfill_aggregates()
+    database.reconcile_user_counters()
+    return database
+
+
+@pytest.fixture
+def engine(database):
+    """Движок, подписанный на изменения тестовой базы"""
+    engine = AnalyticsEngine(database, initial_capacity=2)
+    database.add_listener(engine)
+    return engine
+
+
+class TestEngineMatchesDatabase:
+    """Результаты движка совпадают с SQL запросами (порядок при равенстве не важен)"""
+
+    def test_total_stats(self, database, engine):
+        assert engine.get_total_stats() == database.get_total_stats()
+
+    def test_popular_services(self, database, engine):
+        assert dict(engine.get_popular_services(10)) == dict(database.get_popular_services(10))
+
+    @pytest.mark.parametrize("offset", [0, 1, 2])
+    def test_monthly_stats(self, database, engine, offset):
+        expected = database.get_monthly_stats(offset)
+        actual = engine.get_monthly_stats(offset)
+        if expected['transactions']:
+            assert actual == expected
+        else:
+            assert actual['transactions'] == 0
+
+    @pytest.mark.parametrize("offset", [0, 1])
+    def test_monthly_extremes(self, database, engine, offset):
+        assert engine.get_monthly_extremes(offset) == database.get_monthly_extremes(offset)
+
+    @pytest.mark.parametrize("offset", [0, 1])
+    def test_monthly_top_users(self, database, engine, offset):
+        assert engine.get_monthly_top_users(offset, 5) == database.get_monthly_top_users(offset, 5)
+
+    @pytest.mark.parametrize("offset", [0, 1])
+    def test_monthly_top_services(self, database, engine, offset):
+        assert dict(engine.get_monthly_top_services(offset, 5)) == dict(database.get_monthly_top_services(offset, 5))
+
+    def test_daily_stats(self, database, engine):
+        expected = database.get_daily_stats(7)
+        actual = engine.get_daily_stats(7)
+        assert [(d['date'], d['transactions'], d['total_amount']) for d in actual] == \
+               [(d['date'], d['transactions'], d['total_amount']) for d in expected]
+
+    def test_daily_stats_near_salon_midnight(self, database):
+        from datetime import datetime, timedelta, timezone
+        from database import SALON_TIMEZONE
+
+        midnight = datetime.now(SALON_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+        with database.get_connection() as conn:
+            for minutes in (-30, 30):
+                timestamp = (midnight + timedelta(minutes=minutes)).astimezone(timezone.utc)
+                conn.execute("INSERT INTO transactions (user_id, amount, timestamp) VALUES (?, ?, ?)",
+                             (3, 100.0 + minutes, timestamp.strftime('%Y-%m-%d %H:%M:%S')))
+            conn.execute("DELETE FROM daily_rollups")
+        database.backfill_aggregates()
+
+        expected = database.get_daily_stats(7)
+        assert AnalyticsEngine(database).get_daily_stats(7) == expected
+        assert expected[0]['date'] == midnight.strftime('%Y-%m-%d')
+
+    def test_all_users_stats(self, database, engine):
+        expected = database.get_all_users_stats()
+        actual = engine.get_all_users_stats()
+        keys = ('user_id', 'username', 'transactions_count', 'total_amount')
+        assert [tuple(u[k] for k in keys) for u in actual] == [tuple(u[k] for k in keys) for u in expected]
+
+
+class TestIncrementalUpdates:
+    """Инкрементальные обновления без перезагрузки из БД"""
+
+    def test_add_transaction_appends(self, database, engine):
+        before = engine.get_total_stats()
+        version = engine.version
+
+        database.add_transaction(3, 1200.0, 'LÍČENÍ')
+
+        after = engine.get_total_stats()
+        assert after['total_transactions'] == before['total_transactions'] + 1
+        assert after['total_amount'] == before['total_amount'] + 1200.0
+        assert engine.version > version
+        assert after == database.get_total_stats()
+
+    def test_capacity_grows(self, database, engine):
+        engine.get_total_stats()
+        for _ in range(10):
+            database.add_transaction(1, 100.0, 'ÚPRAVA')
+
+        assert dict(engine.get_popular_services(10)) == dict(database.get_popular_services(10))
+
+    def test_delete_transaction(self, database, engine):
+        engine.get_total_stats()
+        tx_id = database.add_transaction(2, 999.0, 'TEST')
+
+        assert database.delete_transaction(tx_id)
+
+        assert engine.get_total_stats() == database.get_total_stats()
+        assert dict(engine.get_popular_services(10)) == dict(database.get_popular_services(10))
+
+    def test_recent_transactions(self, database, engine):
+        tx_id = database.add_transaction(3, 700.0, 'BARVENÍ ŘAS')
+
+        recent = engine.get_recent_transactions(1)
+
+        assert recent[0]['id'] == tx_id
+        assert recent[0]['username'] == 'petra'
+        assert recent[0]['service'] == 'BARVENÍ ŘAS'
+
+    def test_histograms_follow_changes(self, database, engine):
+        engine.get_total_stats()
+        tx_id = database.add_transaction(3, 2600.0, 'LÍČENÍ')
+
+        assert engine.get_amount_histogram(0, 3) == database.get_amount_histogram(0, 3)
+        assert engine.get_amount_histogram(0, 3).total == 1
+
+        database.delete_transaction(tx_id)
+
+        assert engine.get_amount_histogram(0, 3).total == 0
+        assert engine.get_amount_histogram() == database.get_amount_histogram()
+
+    def test_daily_rollups_follow_changes(self, database, engine):
+        today = database.get_daily_stats(1)[0]
+        tx_id = database.add_transaction(1, 450.5, 'ÚPRAVA')
+
+        updated = database.get_daily_rollup(today['date'])
+        assert updated['transactions'] == today['transactions'] + 1
+        assert updated['total_amount'] == today['total_amount'] + 450.5
+        assert engine.get_daily_stats(7) == database.get_daily_stats(7)
+
+        database.delete_transaction(tx_id)
+
+        assert database.get_daily_rollup(today['date']) == today
+
+    def test_new_user_counted(self, database, engine):
+        engine.get_total_stats()
+        database.add_or_update_user(4, 'elena', 'Elena')
+
+        assert engine.get_total_stats()['total_users'] == 4
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -3,6 +3,7 @@
 """
 import sys
 import os
+import subprocess
 from datetime import datetime
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -14,6 +15,8 @@ from google_calendar import (
     format_event_info,
     parse_events_for_payment,
     get_mock_today_events,
+    normalize_text,
+    ProcedureMatcher,
     PROCEDURE_PRICES,
     PROCEDURE_ALIASES
 )
@@ -63,6 +66,56 @@ class TestProcedureExtraction:
         assert procedure is None
 
 
+class TestProcedureMatcher:
+    """Тесты автомата Ахо-Корасик для поиска процедур"""
+    
+    def test_normalize_text(self):
+        """Тест удаления диакритики и регистра"""
+        assert normalize_text('Úprava OBOČÍ, řasy') == 'uprava oboci, rasy'
+    
+    def test_longest_match_wins(self):
+        """Тест что комбинированная услуга не сводится к более короткому ключу"""
+        assert extract_procedure_from_title("laminace řas + úprava obočí") == "laminace řas + úprava obočí"
+        assert extract_procedure_from_title("Laminace obočí a řas - Eva") == "laminace obočí a řas"
+    
+    def test_without_diacritics(self):
+        """Тест заголовка, набранного без диакритики"""
+        assert extract_procedure_from_title("Laminace ras + uprava oboci - Anna") == "laminace řas + úprava obočí"
+    
+    def test_longer_alias_beats_shorter_procedure(self):
+        """Тест что длинный алиас важнее короткого основного названия"""
+        assert extract_procedure_from_title("Líčení svatební - Jana") == "svatební líčení"
+    
+    def test_primary_preferred_on_equal_length(self):
+        """Тест что при равной длине выбирается основное название"""
+        matcher = ProcedureMatcher({'barvení řas': 500}, {'barveni ras': 'other'})
+        assert matcher.match("BARVENÍ ŘAS") == "barvení řas"
+    
+    def test_overlapping_patterns(self):
+        """Тест перекрывающихся паттернов (суффиксные ссылки)"""
+        matcher = ProcedureMatcher({'abcd': 1, 'bc': 2, 'bcde': 3}, {})
+        assert matcher.match("xabcdex") == "abcd"
+        assert matcher.match("xbcdex") == "bcde"
+        assert matcher.match("xbcx") == "bc"
+    
+    @pytest.mark.parametrize("title", [
+        "Úprava a barvení obočí - Marie",
+        "Zesvětlení s úpravou a tonováním",
+        "Depilace horní ret + konzultace",
+        "večerní líčení & účes",
+        "botox řas, laminace",
+        "Konzultace návrh",
+    ])
+    def test_matches_brute_force(self, title):
+        """Тест совпадения с полным перебором всех ключей"""
+        candidates = [(len(normalize_text(p)), 1, p) for p in PROCEDURE_PRICES
+                      if normalize_text(p) in normalize_text(title)]
+        candidates += [(len(normalize_text(a)), 0, p) for a, p in PROCEDURE_ALIASES.items()
+                       if normalize_text(a) in normalize_text(title)]
+        expected = max(candidates, key=lambda c: c[:2])[2]
+        assert extract_procedure_from_title(title) == expected
+
+
 class TestProcedurePricing:
     """Тесты получения цены процедуры"""
     
@@ -213,6 +266,28 @@ class TestMockData:
             assert event_date == today
 
 
+class TestLazyImport:
+    """Тесты ленивой загрузки библиотек Google"""
+    
+    def test_import_does_not_load_google_libraries(self):
+        """Тест что импорт модуля не тянет googleapiclient и oauth"""
+        code = (
+            "import sys, google_calendar\n"
+            "heavy = [m for m in ('googleapiclient', 'google_auth_oauthlib', 'google.oauth2') if m in sys.modules]\n"
+            "print(','.join(heavy))"
+        )
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == ''
+    
+    def test_service_created_lazily(self):
+        """Тест что calendar_service создается при первом обращении и переиспользуется"""
+        import google_calendar
+        
+        assert google_calendar.calendar_service is google_calendar.get_calendar_service()
+        assert google_calendar.calendar_service.service is None
+
+
 class TestPriceDictionary:
     """Тесты словаря цен"""
     
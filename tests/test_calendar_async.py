@@ -0,0 +1,210 @@
+"""
+Тесты для асинхронного клиента календаря (локальный stub сервер Calendar API)
+"""
+import sys
+import os
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from calendar_async import AsyncCalendarClient
+from calendar_cache import CALENDAR_TIMEZONE
+
+DAY = datetime(2024, 3, 15).date()
+
+
+class FakeCredentials:
+    """Учетные данные с подсчетом обновлений токена"""
+
+    def __init__(self, token='token-1', expiry=None):
+        self.token = token
+        self.expiry = expiry
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = f'token-{self.refreshes + 1}'
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+
+def make_event(event_id, hour, minute=0):
+    start = datetime.combine(DAY, datetime.min.time()).replace(hour=hour, minute=minute, tzinfo=CALENDAR_TIMEZONE)
+    return {
+        'id': event_id,
+        'summary': f'Laminace řas - {event_id}',
+        'start': {'dateTime': start.isoformat()},
+        'end': {'dateTime': (start + timedelta(hours=1)).isoformat()},
+    }
+
+
+class CalendarStub:
+    """Stub Calendar API: календари, страницы, задержка ответа, отзыв токена"""
+
+    def __init__(self, calendars, delay=0.0, page_size=2, valid_tokens=('token-1',)):
+        self.calendars = calendars
+        self.delay = delay
+        self.page_size = page_size
+        self.valid_tokens = set(valid_tokens)
+        self.requests = []
+
+    async def handle(self, request):
+        calendar_id = request.match_info['calendar_id']
+        self.requests.append((calendar_id, request.headers.get('Authorization'), dict(request.query)))
+        await asyncio.sleep(self.delay)
+
+        if request.headers.get('Authorization', '').removeprefix('Bearer ') not in self.valid_tokens:
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        if calendar_id not in self.calendars:
+            return web.json_response({'error': 'notFound'}, status=404)
+
+        items = self.calendars[calendar_id]
+        start = int(request.query.get('pageToken', 0))
+        body = {'items': items[start:start + self.page_size]}
+        if start + self.page_size < len(items):
+            body['nextPageToken'] = str(start + self.page_size)
+        return web.json_response(body)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/calendars/{calendar_id}/events', self.handle)
+        return app
+
+
+def run_with_stub(stub, credentials, scenario):
+    """Запускает stub сервер и сценарий с клиентом в одном event loop"""
+    async def main():
+        server = TestServer(stub.app())
+        await server.start_server()
+        client = AsyncCalendarClient(credentials, base_url=str(server.make_url('')))
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+            await server.close()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def stub():
+    return CalendarStub({
+        'anna': [make_event('a1', 9), make_event('a2', 13), make_event('a3', 17)],
+        'marie': [make_event('m1', 10, 30)],
+        'petra': [make_event('p1', 8)],
+    })
+
+
+class TestFetchAgendas:
+    """Параллельная выборка и слияние календарей"""
+
+    def test_merged_and_sorted(self, stub):
+        events = run_with_stub(stub, FakeCredentials(),
+                               lambda c: c.fetch_agendas(['anna', 'marie', 'petra'], DAY))
+
+        assert [e['id'] for e in events] == ['p1', 'a1', 'm1', 'a2', 'a3']
+        assert {e['calendarId'] for e in events} == {'anna', 'marie', 'petra'}
+
+    def test_pagination(self, stub):
+        events = run_with_stub(stub, FakeCredentials(), lambda c: c.fetch_agendas(['anna'], DAY))
+
+        assert len(events) == 3
+        assert [query.get('pageToken') for _, _, query in stub.requests] == [None, '2']
+
+    def test_day_window(self, stub):
+        run_with_stub(stub, FakeCredentials(), lambda c: c.fetch_agendas(['marie'], DAY))
+
+        query = stub.requests[0][2]
+        assert query['timeMin'].startswith('2024-03-15T00:00:00')
+        assert query['timeMax'].startswith('2024-03-16T00:00:00')
+        assert query['singleEvents'] == 'true'
+
+    def test_calendars_fetched_concurrently(self, stub):
+        stub.delay = 0.3
+
+        async def scenario(client):
+            start = time.perf_counter()
+            await client.fetch_agendas(['marie', 'petra', 'anna'], DAY)
+            return time.perf_counter() - start
+
+        # Три календаря по 0.3 с (у anna две страницы): последовательно было бы >= 1.2 с
+        assert run_with_stub(stub, FakeCredentials(), scenario) < 0.9
+
+    def test_failed_calendar_skipped(self, stub):
+        events = run_with_stub(stub, FakeCredentials(),
+                               lambda c: c.fetch_agendas(['marie', 'missing'], DAY))
+
+        assert [e['id'] for e in events] == ['m1']
+
+
+class TestToken:
+    """Переиспользование и обновление токена"""
+
+    def test_token_reused_across_calls(self, stub):
+        credentials = FakeCredentials(expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1))
+
+        async def scenario(client):
+            await client.fetch_agendas(['anna', 'marie'], DAY)
+            await client.fetch_agendas(['petra'], DAY)
+
+        run_with_stub(stub, credentials, scenario)
+
+        assert credentials.refreshes == 0
+        assert {auth for _, auth, _ in stub.requests} == {'Bearer token-1'}
+
+    def test_expired_token_refreshed_once(self, stub):
+        stub.valid_tokens = {'token-2'}
+        credentials = FakeCredentials(expiry=datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=1))
+
+        events = run_with_stub(stub, credentials, lambda c: c.fetch_agendas(['anna', 'marie', 'petra'], DAY))
+
+        assert credentials.refreshes == 1
+        assert len(events) == 5
+
+    def test_revoked_token_retried(self, stub):
+        stub.valid_tokens = {'token-2'}
+        credentials = FakeCredentials(expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1))
+
+        events = run_with_stub(stub, credentials, lambda c: c.fetch_agendas(['marie'], DAY))
+
+        assert credentials.refreshes == 1
+        assert [e['id'] for e in events] == ['m1']
+
+
+class TestBotAgenda:
+    """Бот берет сегодняшних клиентов из расписаний всех мастеров"""
+
+    def test_today_options_from_all_calendars(self, stub, monkeypatch):
+        import qr
+
+        monkeypatch.setattr(qr, 'MULTI_CALENDAR', True)
+        monkeypatch.setattr(qr, 'CALENDAR_IDS', ['anna', 'marie', 'missing'], raising=False)
+        monkeypatch.setattr(qr, 'CALENDAR_TIMEZONE', CALENDAR_TIMEZONE, raising=False)
+        monkeypatch.setattr(qr, 'calendar_client', None)
+        monkeypatch.setattr(qr, 'calendar_agenda', [])
+        monkeypatch.setattr(qr, 'calendar_agenda_day', None)
+
+        class Today(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.combine(DAY, datetime.min.time()).replace(hour=8, tzinfo=tz)
+
+        monkeypatch.setattr(qr, 'datetime', Today)
+
+        async def scenario(client):
+            monkeypatch.setattr(qr, 'create_calendar_client', lambda: client, raising=False)
+            fetched = await qr.refresh_calendar_agenda()
+            return fetched, qr.get_today_payment_options()
+
+        fetched, options = run_with_stub(stub, FakeCredentials(), scenario)
+
+        assert fetched == 4
+        assert [option['event_id'] for option in options] == ['a1', 'm1', 'a2', 'a3']
+        assert qr.calendar_agenda_day == DAY
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,262 @@
+"""
+Тесты для кэша событий календаря с синхронизацией по syncToken
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from calendar_cache import CalendarEventCache, CALENDAR_TIMEZONE
+
+
+class FakeHttpError(Exception):
+    """Аналог googleapiclient.errors.HttpError (нужен только resp.status)"""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = type('Resp', (), {'status': status})()
+
+
+class FakeRequest:
+    def __init__(self, handler, params):
+        self._handler = handler
+        self._params = params
+
+    def execute(self):
+        return self._handler(self._params)
+
+
+class FakeEventsApi:
+    """Заглушка service.events() с серверным состоянием, страницами и syncToken"""
+
+    def __init__(self, page_size=2):
+        self.events = {}
+        self.changes = []      # id событий, измененных после последней выдачи токена
+        self.tokens = {}       # syncToken -> номер версии
+        self.version = 0
+        self.page_size = page_size
+        self.calls = []
+        self.expire_tokens = False
+
+    def put(self, event):
+        self.events[event['id']] = event
+        self.changes.append(event['id'])
+
+    def cancel(self, event_id):
+        self.events[event_id] = {'id': event_id, 'status': 'cancelled'}
+        self.changes.append(event_id)
+
+    def list(self, **params):
+        return FakeRequest(self._list, params)
+
+    def _list(self, params):
+        self.calls.append(params)
+        if 'syncToken' in params:
+            assert 'timeMin' not in params and 'timeMax' not in params
+            if self.expire_tokens or params['syncToken'] not in self.tokens:
+                raise FakeHttpError(410)
+            ids = list(dict.fromkeys(self.changes))
+            items = [self.events[i] for i in ids]
+        else:
+            items = [e for e in self.events.values() if e.get('status') != 'cancelled'
+                     and (e['start'].get('dateTime') or e['start']['date']) < params['timeMax']]
+
+        start = int(params.get('pageToken', 0))
+        page = items[start:start + self.page_size]
+        response = {'items': page}
+        if start + self.page_size < len(items):
+            response['nextPageToken'] = str(start + self.page_size)
+        else:
+            self.version += 1
+            token = f"token-{self.version}"
+            self.tokens[token] = self.version
+            self.changes = []
+            response['nextSyncToken'] = token
+        return response
+
+
+def make_event(event_id, day, hour, summary='Laminace řas - Anna'):
+    start = datetime.combine(day, datetime.min.time()).replace(hour=hour, tzinfo=CALENDAR_TIMEZONE)
+    return {
+        'id': event_id,
+        'summary': summary,
+        'start': {'dateTime': start.isoformat()},
+        'end': {'dateTime': (start + timedelta(hours=1)).isoformat()},
+    }
+
+
+@pytest.fixture
+def today():
+    return datetime.now(CALENDAR_TIMEZONE).date()
+
+
+@pytest.fixture
+def api(today):
+    api = FakeEventsApi()
+    api.put(make_event('a', today, 14))
+    api.put(make_event('b', today, 9, 'Úprava obočí - Marie'))
+    api.put(make_event('c', today + timedelta(days=1), 10))
+    return api
+
+
+@pytest.fixture
+def cache(api, tmp_path):
+    return CalendarEventCache(lambda: api, 'salon', str(tmp_path / 'calendar_cache.json'))
+
+
+class TestSync:
+    """Полная и инкрементальная синхронизация"""
+
+    def test_initial_full_sync(self, api, cache, today):
+        assert cache.sync() == 3
+
+        assert [e['id'] for e in cache.get_events(today)] == ['b', 'a']
+        assert [e['id'] for e in cache.get_events(today + timedelta(days=1))] == ['c']
+        assert 'timeMin' in api.calls[0]
+        assert cache.sync_token is not None
+        assert cache.window_day == today.isoformat()
+
+    def test_pagination(self, api, cache):
+        cache.sync()
+
+        assert len(api.calls) == 2
+        assert api.calls[1]['pageToken'] == '2'
+        assert len(cache) == 3
+
+    def test_incremental_sync_uses_token(self, api, cache, today):
+        cache.sync()
+        api.calls.clear()
+        api.put(make_event('d', today, 16))
+        api.cancel('a')
+
+        assert cache.sync() == 2
+
+        assert [call.get('syncToken') for call in api.calls] == ['token-1']
+        assert [e['id'] for e in cache.get_events(today)] == ['b', 'd']
+
+    def test_expired_token_triggers_full_sync(self, api, cache, today):
+        cache.sync()
+        api.calls.clear()
+        api.expire_tokens = True
+        api.put(make_event('d', today, 16))
+
+        cache.sync()
+
+        assert 'syncToken' in api.calls[0]
+        assert 'timeMin' in api.calls[1]
+        assert [e['id'] for e in cache.get_events(today)] == ['b', 'a', 'd']
+
+    def test_new_day_triggers_full_sync(self, api, cache, today):
+        cache.sync()
+        api.calls.clear()
+        cache.window_day = (today - timedelta(days=1)).isoformat()
+
+        cache.sync()
+
+        assert 'syncToken' not in api.calls[0]
+        assert 'timeMax' in api.calls[0]
+        assert cache.window_day == today.isoformat()
+
+    def test_other_errors_propagate(self, api, cache):
+        cache.sync()
+
+        def broken(params):
+            raise FakeHttpError(500)
+        api._list = broken
+
+        with pytest.raises(FakeHttpError):
+            cache.sync()
+
+    def test_api_unavailable(self, tmp_path):
+        cache = CalendarEventCache(lambda: None, 'salon', str(tmp_path / 'cache.json'))
+
+        assert cache.sync() == 0
+        assert cache.get_events() == []
+
+
+class TestEvents:
+    """Выдача событий по дням"""
+
+    def test_all_day_event_spans_days(self, tmp_path, today):
+        api = FakeEventsApi()
+        api.put({
+            'id': 'vacation',
+            'summary': 'Dovolená',
+            'start': {'date': today.isoformat()},
+            'end': {'date': (today + timedelta(days=2)).isoformat()},
+        })
+        cache = CalendarEventCache(lambda: api, 'salon')
+        cache.sync()
+
+        assert [e['id'] for e in cache.get_events(today + timedelta(days=1))] == ['vacation']
+        assert cache.get_events(today + timedelta(days=2)) == []
+
+    def test_old_events_pruned(self, api, cache, today):
+        api.put(make_event('old', today - timedelta(days=30), 10))
+
+        cache.sync()
+
+        assert len(cache) == 3
+
+
+    def test_events_beyond_horizon_skipped(self, api, tmp_path, today):
+        api.put(make_event('far', today + timedelta(days=40), 10))
+        cache = CalendarEventCache(lambda: api, 'salon', future_days=30)
+
+        cache.sync()
+        horizon = datetime.fromisoformat(api.calls[0]['timeMax'])
+        assert horizon == datetime.combine(today + timedelta(days=31), datetime.min.time(), CALENDAR_TIMEZONE)
+        assert len(cache) == 3
+
+        # Изменения по syncToken приходят и за горизонтом - в кэш они не попадают
+        api.put(make_event('later', today + timedelta(days=35), 10))
+        api.put(make_event('soon', today + timedelta(days=20), 10))
+        cache.sync()
+        assert len(cache) == 4
+        assert [e['id'] for e in cache.get_events(today + timedelta(days=20))] == ['soon']
+
+
+class TestPersistence:
+    """Кэш переживает перезапуск"""
+
+    def test_reload_from_file(self, api, cache, tmp_path, today):
+        cache.sync()
+        api.calls.clear()
+
+        restored = CalendarEventCache(lambda: api, 'salon', str(tmp_path / 'calendar_cache.json'))
+
+        assert [e['id'] for e in restored.get_events(today)] == ['b', 'a']
+        assert restored.sync_token == cache.sync_token
+        assert api.calls == []
+
+        restored.sync()
+        assert 'syncToken' in api.calls[0]
+
+    def test_reload_picks_up_file_written_by_other_process(self, api, cache, tmp_path, today):
+        reader = CalendarEventCache(lambda: None, 'salon', str(tmp_path / 'calendar_cache.json'))
+        assert reader.reload() is False
+
+        cache.sync()
+        assert reader.reload() is True
+        assert [e['id'] for e in reader.get_events(today)] == ['b', 'a']
+        assert reader.reload() is False
+
+        api.put(make_event('d', today, 18))
+        cache.sync()
+        os.utime(cache.cache_file, (0, reader._file_mtime + 1))
+        assert reader.reload() is True
+        assert [e['id'] for e in reader.get_events(today)] == ['b', 'a', 'd']
+
+    def test_other_calendar_ignored(self, api, cache, tmp_path, today):
+        cache.sync()
+
+        other = CalendarEventCache(lambda: api, 'other', str(tmp_path / 'calendar_cache.json'))
+
+        assert other.get_events(today) == []
+        assert other.sync_token is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,303 @@
+"""
+Тесты для счетчиков пользователей, версий схемы, дневных агрегатов и ретеншна событий в базе данных
+"""
+import sys
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from database import Database, salon_day
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Временная SQLite база с двумя мастерами"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'test_counters.db'))
+    database = Database()
+    database.add_or_update_user(1, 'anna', 'Anna')
+    database.add_or_update_user(2, 'marie', 'Marie')
+    return database
+
+
+class TestUserCounters:
+    """Счетчики transactions_count / total_amount в таблице users"""
+
+    def test_new_user_has_zero_counters(self, database):
+        stats = database.get_user_stats(1)
+
+        assert stats['transactions_count'] == 0
+        assert stats['total_amount'] == 0.0
+
+    def test_add_transaction_updates_counters(self, database):
+        database.add_transaction(1, 1500.0, 'ÚPRAVA')
+        database.add_transaction(1, 800.5, 'LAMINACE ŘAS')
+
+        stats = database.get_user_stats(1)
+        assert stats['transactions_count'] == 2
+        assert stats['total_amount'] == 2300.5
+
+    def test_delete_transaction_updates_counters(self, database):
+        database.add_transaction(1, 1500.0)
+        tx_id = database.add_transaction(1, 700.0)
+
+        database.delete_transaction(tx_id)
+
+        stats = database.get_user_stats(1)
+        assert stats['transactions_count'] == 1
+        assert stats['total_amount'] == 1500.0
+
+    def test_unknown_user(self, database):
+        assert database.get_user_stats(999) is None
+
+    def test_leaderboard_order(self, database):
+        database.add_transaction(2, 500.0)
+        database.add_transaction(1, 900.0)
+        database.add_transaction(1, 100.0)
+
+        users = database.get_all_users_stats()
+
+        assert [(u['user_id'], u['transactions_count'], u['total_amount']) for u in users] == \
+               [(1, 2, 1000.0), (2, 1, 500.0)]
+
+
+class TestReconciliation:
+    """Сверка счетчиков с таблицей transactions"""
+
+    def test_consistent_counters_untouched(self, database):
+        database.add_transaction(1, 1500.0)
+
+        assert database.reconcile_user_counters() == 0
+
+    def test_drift_is_fixed(self, database):
+        database.add_transaction(1, 1500.0)
+        with database.get_connection() as conn:
+            conn.execute("INSERT INTO transactions (user_id, amount) VALUES (2, 400.0)")
+            conn.execute("UPDATE users SET total_amount = 0 WHERE user_id = 1")
+
+        assert database.reconcile_user_counters() == 2
+        assert database.get_user_stats(1)['total_amount'] == 1500.0
+        assert database.get_user_stats(2)['transactions_count'] == 1
+
+    def test_columns_added_to_existing_database(self, tmp_path, monkeypatch):
+        path = tmp_path / 'legacy.db'
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, "
+                         "last_name TEXT, first_seen TIMESTAMP, last_seen TIMESTAMP, "
+                         "total_requests INTEGER DEFAULT 0, is_admin BOOLEAN DEFAULT 0)")
+            conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+                         "amount REAL NOT NULL, service TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+            conn.execute("INSERT INTO users (user_id, username) VALUES (7, 'petra')")
+            conn.execute("INSERT INTO transactions (user_id, amount) VALUES (7, 1200.0)")
+            conn.execute("INSERT INTO transactions (user_id, amount) VALUES (7, 300.0)")
+
+        monkeypatch.setenv('DATABASE_PATH', str(path))
+        stats = Database().get_user_stats(7)
+
+        assert stats['transactions_count'] == 2
+        assert stats['total_amount'] == 1500.0
+
+
+class TestSchemaMigrations:
+    """Версии схемы: миграции применяются один раз и по порядку"""
+
+    @staticmethod
+    def versions(path):
+        with sqlite3.connect(path) as conn:
+            return [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+
+    def test_new_database_at_latest_version(self, database, tmp_path):
+        import database as database_module
+
+        assert database.schema_version == database_module.SCHEMA_VERSION
+        assert self.versions(tmp_path / 'test_counters.db') == [
+            version for version, _, _ in database_module.MIGRATIONS]
+
+    def test_current_schema_reads_single_row(self, database, monkeypatch):
+        import database as database_module
+
+        statements = []
+        connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        monkeypatch.setattr(database_module.sqlite3, 'connect', traced_connect)
+        database.init_db()
+
+        assert [statement for statement in statements if statement not in ('BEGIN', 'COMMIT')] == [
+            'SELECT MAX(version) as version FROM schema_version']
+
+    def test_legacy_database_upgraded(self, tmp_path, monkeypatch):
+        import database as database_module
+
+        path = tmp_path / 'legacy.db'
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, "
+                         "last_name TEXT, first_seen TIMESTAMP, last_seen TIMESTAMP, "
+                         "total_requests INTEGER DEFAULT 0, is_admin BOOLEAN DEFAULT 0)")
+            conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+                         "amount REAL NOT NULL, service TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+            conn.execute("INSERT INTO users (user_id, username) VALUES (7, 'petra')")
+            conn.execute("INSERT INTO transactions (user_id, amount, timestamp) VALUES (7, 1200.0, '2024-03-05 10:00:00')")
+
+        monkeypatch.setenv('DATABASE_PATH', str(path))
+        database = Database()
+
+        assert self.versions(path) == list(range(1, database_module.SCHEMA_VERSION + 1))
+        assert database.get_daily_rollup('2024-03-05')['transactions'] == 1
+        assert database.get_user_stats(7)['transactions_count'] == 1
+
+    def test_new_migration_applied_once(self, database, monkeypatch, tmp_path):
+        import database as database_module
+
+        calls = []
+
+        def migrate_note_column(self, cursor):
+            calls.append(self.schema_version)
+            cursor.execute('ALTER TABLE events ADD COLUMN note TEXT')
+
+        monkeypatch.setattr(Database, '_migrate_note_column', migrate_note_column, raising=False)
+        monkeypatch.setattr(database_module, 'MIGRATIONS',
+                            database_module.MIGRATIONS + [(99, 'event notes', '_migrate_note_column')])
+        monkeypatch.setattr(database_module, 'SCHEMA_VERSION', 99)
+        latest = database.schema_version
+
+        database.init_db()
+        database.init_db()
+
+        assert calls == [latest]
+        assert database.schema_version == 99
+        assert self.versions(tmp_path / 'test_counters.db')[-1] == 99
+
+
+class TestDailyRollups:
+    """Дневные агрегаты ведутся по местной дате салона (Europe/Prague), а не по UTC"""
+
+    def test_salon_day(self):
+        assert salon_day('2024-03-05 22:59:59') == '2024-03-05'
+        assert salon_day('2024-03-05 23:00:00') == '2024-03-06'
+        assert salon_day(datetime(2024, 7, 1, 22, 30)) == '2024-07-02'
+
+    def test_backfill_uses_salon_day(self, database):
+        with database.get_connection() as conn:
+            conn.execute("INSERT INTO transactions (user_id, amount, timestamp) VALUES (1, 700.0, '2024-03-05 22:30:00')")
+            conn.execute("INSERT INTO transactions (user_id, amount, timestamp) VALUES (1, 900.0, '2024-03-05 23:30:00')")
+            conn.execute("DELETE FROM daily_rollups")
+        database.backfill_aggregates()
+
+        assert database.get_daily_rollup('2024-03-05')['total_amount'] == 700.0
+        assert database.get_daily_rollup('2024-03-06')['total_amount'] == 900.0
+
+    def test_utc_rollups_rebuilt_by_migration(self, database):
+        database.add_transaction(1, 500.0)
+        with database.get_connection() as conn:
+            conn.execute("UPDATE daily_rollups SET day = '1999-01-01'")
+            cursor = database._get_cursor(conn)
+            database._migrate_daily_rollups_salon_day(cursor)
+
+        assert database.get_daily_rollup('1999-01-01')['transactions'] == 0
+        assert database.get_daily_stats(1)[0]['transactions'] == 1
+
+
+class TestEventsRetention:
+    """Старые события сворачиваются в event_rollups, сырые строки удаляются"""
+
+    @staticmethod
+    def add_event(database, user_id, event_type, days_ago):
+        timestamp = (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+        with database.get_connection() as conn:
+            conn.execute("INSERT INTO events (user_id, event_type, timestamp) VALUES (?, ?, ?)",
+                         (user_id, event_type, timestamp))
+        return timestamp[:10]
+
+    def test_old_days_rolled_up(self, database):
+        old_day = self.add_event(database, 1, 'start', 40)
+        self.add_event(database, 1, 'qr_generated', 40)
+        self.add_event(database, 2, 'qr_generated', 40)
+        self.add_event(database, 2, 'start', 2)
+        database.add_event(1, 'start')
+
+        result = database.expire_events(retention_days=30, archive_dir='')
+
+        assert result == {'days': [old_day], 'events': 3, 'archives': []}
+        with database.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2
+            rollups = conn.execute("SELECT event_type, events, users FROM event_rollups WHERE day = ? "
+                                   "ORDER BY event_type", (old_day,)).fetchall()
+        assert [tuple(row) for row in rollups] == [('*', 3, 2), ('qr_generated', 2, 2), ('start', 1, 1)]
+        assert database.get_total_stats()['active_24h'] == 1
+        assert database.expire_events(retention_days=30, archive_dir='')['days'] == []
+
+    def test_archive_written(self, database, tmp_path):
+        import gzip
+        import json
+
+        old_day = self.add_event(database, 1, 'payment_start', 45)
+        result = database.expire_events(retention_days=30, archive_dir=str(tmp_path / 'archive'))
+
+        path = tmp_path / 'archive' / f'events-{old_day}.jsonl.gz'
+        assert result['archives'] == [str(path)]
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert [(record['user_id'], record['event_type']) for record in records] == [(1, 'payment_start')]
+        assert records[0]['timestamp'].startswith(old_day)
+
+    def test_late_rows_do_not_overwrite_archive(self, database, tmp_path):
+        import gzip
+
+        archive_dir = str(tmp_path / 'archive')
+        old_day = self.add_event(database, 1, 'start', 45)
+        first = database.expire_events(retention_days=30, archive_dir=archive_dir)['archives']
+        self.add_event(database, 2, 'qr_generated', 45)
+        second = database.expire_events(retention_days=30, archive_dir=archive_dir)['archives']
+
+        assert first == [str(tmp_path / 'archive' / f'events-{old_day}.jsonl.gz')]
+        assert second == [str(tmp_path / 'archive' / f'events-{old_day}.2.jsonl.gz')]
+        with gzip.open(first[0], 'rt', encoding='utf-8') as f:
+            assert '"start"' in f.read()
+        with gzip.open(second[0], 'rt', encoding='utf-8') as f:
+            assert '"qr_generated"' in f.read()
+        with database.get_connection() as conn:
+            assert conn.execute("SELECT events FROM event_rollups WHERE day = ? AND event_type = '*'",
+                                (old_day,)).fetchone()[0] == 2
+
+    def test_rolled_back_day_leaves_no_archive(self, database, tmp_path, monkeypatch):
+        archive_dir = tmp_path / 'archive'
+        old_day = self.add_event(database, 1, 'start', 45)
+        expire_day = Database._expire_events_day
+
+        def failing_expire_day(self, *args):
+            expire_day(self, *args)
+            raise sqlite3.OperationalError('database is locked')
+
+        monkeypatch.setattr(Database, '_expire_events_day', failing_expire_day)
+        with pytest.raises(sqlite3.OperationalError):
+            database.expire_events(retention_days=30, archive_dir=str(archive_dir))
+        assert list(archive_dir.iterdir()) == []
+
+        monkeypatch.setattr(Database, '_expire_events_day', expire_day)
+        result = database.expire_events(retention_days=30, archive_dir=str(archive_dir))
+        assert result['archives'] == [str(archive_dir / f'events-{old_day}.jsonl.gz')]
+        assert sorted(path.name for path in archive_dir.iterdir()) == [f'events-{old_day}.jsonl.gz']
+
+    def test_zero_retention_keeps_everything(self, database):
+        self.add_event(database, 1, 'start', 400)
+
+        assert database.expire_events(retention_days=0, archive_dir='')['events'] == 0
+        with database.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 1
+
+    def test_active_users_query_uses_timestamp_index(self, database):
+        with database.get_connection() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT COUNT(DISTINCT user_id) FROM events "
+                                "WHERE timestamp > datetime('now', '-1 day')").fetchall()
+        assert any('idx_events_timestamp' in row[-1] for row in plan)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
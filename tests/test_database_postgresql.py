@@ -0,0 +1,127 @@
+"""
+Тесты дневных партиций events на PostgreSQL
+
+Запускаются только против локального сервера (без DATABASE_URL - пропуск):
+    DATABASE_URL=postgresql://postgres@localhost:5432/postgres DATABASE_SSLMODE=disable \
+        python -m pytest tests/test_database_postgresql.py
+Таблицы бота в этой базе будут удалены!
+"""
+import sys
+import os
+import gzip
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import database as database_module
+from database import Database, EVENTS_PARTITIONS_AHEAD
+
+pytestmark = pytest.mark.skipif(
+    database_module.DB_TYPE != 'postgresql' or os.getenv('DATABASE_SSLMODE') != 'disable',
+    reason='нужен локальный PostgreSQL: DATABASE_URL и DATABASE_SSLMODE=disable'
+)
+
+BOT_TABLES = ('schema_version, event_rollups, daily_rollups, amount_buckets, user_data, '
+              'bot_lease, events, transactions, users')
+
+
+def drop_tables():
+    database = Database()
+    with database.get_connection() as conn:
+        conn.cursor().execute(f'DROP TABLE IF EXISTS {BOT_TABLES} CASCADE')
+    database.close()
+
+
+@pytest.fixture
+def legacy_database(monkeypatch):
+    """База на версии 8 (events без партиций) с пользователями"""
+    drop_tables()
+    monkeypatch.setattr(database_module, 'MIGRATIONS', database_module.MIGRATIONS[:8])
+    monkeypatch.setattr(database_module, 'SCHEMA_VERSION', 8)
+    database = Database()
+    database.add_or_update_user(1, 'anna', 'Anna')
+    database.add_or_update_user(2, 'marie', 'Marie')
+    monkeypatch.undo()
+    yield database
+    database.close()
+    drop_tables()
+
+
+def add_event(database, user_id, event_type, days_ago):
+    timestamp = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days_ago)
+    with database.get_connection() as conn:
+        conn.cursor().execute('INSERT INTO events (user_id, event_type, timestamp) VALUES (%s, %s, %s)',
+                              (user_id, event_type, timestamp))
+    return timestamp.date()
+
+
+def fetch(database, query, params=()):
+    with database.get_connection() as conn:
+        cursor = database._get_cursor(conn)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+class TestEventPartitions:
+    """Миграция events в дневные партиции и ретеншн через DETACH + DROP"""
+
+    def test_migration_keeps_rows_and_ids(self, legacy_database):
+        add_event(legacy_database, 1, 'start', 45)
+        add_event(legacy_database, 2, 'qr_generated', 3)
+        legacy_database.add_event(1, 'start')
+        before = fetch(legacy_database, 'SELECT id, user_id, event_type, timestamp FROM events ORDER BY id')
+
+        legacy_database.init_db()
+
+        assert legacy_database.schema_version == database_module.SCHEMA_VERSION
+        assert fetch(legacy_database, "SELECT relkind FROM pg_class WHERE oid = to_regclass('events')")[0]['relkind'] == 'p'
+        assert fetch(legacy_database, 'SELECT id, user_id, event_type, timestamp FROM events ORDER BY id') == before
+        assert fetch(legacy_database, 'SELECT COUNT(*) as n FROM events_default')[0]['n'] == 1
+        legacy_database.add_event(2, 'start')
+        assert fetch(legacy_database, 'SELECT MAX(id) as id FROM events')[0]['id'] == before[-1]['id'] + 1
+        assert legacy_database.get_total_stats()['active_24h'] == 2
+
+    def test_partitions_created_ahead(self, legacy_database):
+        legacy_database.init_db()
+        today = datetime.now(timezone.utc).date()
+        # Строка дня за горизонтом партиций ждет в default-партиции
+        add_event(legacy_database, 1, 'start', -(EVENTS_PARTITIONS_AHEAD + 2))
+
+        with legacy_database.get_connection() as conn:
+            cursor = legacy_database._get_cursor(conn)
+            far_day = today + timedelta(days=EVENTS_PARTITIONS_AHEAD + 2)
+            legacy_database._ensure_event_partitions(cursor, far_day, far_day)
+            partitions = legacy_database._event_partitions(cursor)
+
+        assert all(today + timedelta(days=offset) in partitions for offset in range(EVENTS_PARTITIONS_AHEAD + 1))
+        assert fetch(legacy_database, 'SELECT COUNT(*) as n FROM events_default')[0]['n'] == 0
+        assert fetch(legacy_database, f'SELECT COUNT(*) as n FROM {partitions[far_day]}')[0]['n'] == 1
+
+    def test_expired_partitions_dropped(self, legacy_database, tmp_path):
+        old_day = add_event(legacy_database, 1, 'start', 45)
+        legacy_database.init_db()
+        partition_day = add_event(legacy_database, 1, 'qr_generated', 20)
+        add_event(legacy_database, 2, 'qr_generated', 20)
+        add_event(legacy_database, 2, 'start', 2)
+
+        result = legacy_database.expire_events(retention_days=10, archive_dir=str(tmp_path))
+
+        assert result['events'] == 3
+        assert {old_day.isoformat(), partition_day.isoformat()} <= set(result['days'])
+        assert sorted(os.path.basename(path) for path in result['archives']) == [
+            f'events-{old_day}.jsonl.gz', f'events-{partition_day}.jsonl.gz']
+        with gzip.open(tmp_path / f'events-{partition_day}.jsonl.gz', 'rt', encoding='utf-8') as f:
+            assert len(f.readlines()) == 2
+        with legacy_database.get_connection() as conn:
+            partitions = legacy_database._event_partitions(legacy_database._get_cursor(conn))
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=10)
+        assert min(partitions) == cutoff
+        assert fetch(legacy_database, 'SELECT COUNT(*) as n FROM events')[0]['n'] == 1
+        rollup = fetch(legacy_database, "SELECT events, users FROM event_rollups WHERE day = %s AND event_type = '*'",
+                       (partition_day.isoformat(),))
+        assert [tuple(row.values()) for row in rollup] == [(2, 2)]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,95 @@
+"""
+Тесты для health endpoint (/health, /ready) в event loop бота
+"""
+import sys
+import os
+import asyncio
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from health_server import HealthServer
+
+
+def get_all(server, paths):
+    """GET по списку путей; возвращает [(статус, json)]"""
+    async def main():
+        async with TestClient(TestServer(server.app())) as client:
+            results = []
+            for path in paths:
+                if path is None:
+                    await asyncio.sleep(server.cache_ttl * 1.5)
+                    continue
+                response = await client.get(path)
+                results.append((response.status, json.loads(await response.text())))
+            return results
+    return asyncio.run(main())
+
+
+class TestHealth:
+    """Liveness"""
+
+    def test_health_ok(self):
+        [(status, body)] = get_all(HealthServer(), ['/health'])
+
+        assert status == 200
+        assert body['status'] == 'ok'
+        assert body['service'] == 'qr-payment-bot'
+
+
+class TestReady:
+    """Readiness и кэширование ответов"""
+
+    def test_not_ready_is_503(self):
+        server = HealthServer(ready_probe=lambda: {'ready': False, 'polling': False})
+        [(status, body)] = get_all(server, ['/ready'])
+
+        assert status == 503
+        assert body['status'] == 'starting'
+        assert body['polling'] is False
+
+    def test_ready_is_200(self):
+        server = HealthServer(ready_probe=lambda: {'ready': True, 'update_queue': 0})
+        [(status, body)] = get_all(server, ['/ready'])
+
+        assert status == 200
+        assert body['update_queue'] == 0
+
+    def test_probe_computed_once_per_ttl(self):
+        server = HealthServer(ready_probe=lambda: {'ready': True}, cache_ttl=0.2)
+        get_all(server, ['/ready'] * 20)
+        assert server.probes == 1
+
+        get_all(server, [None, '/ready', '/ready'])
+        assert server.probes == 2
+
+    def test_probe_error_is_503(self):
+        def broken():
+            raise RuntimeError('pool closed')
+
+        [(status, body)] = get_all(HealthServer(ready_probe=broken), ['/ready'])
+
+        assert status == 503
+        assert body['error'] == 'pool closed'
+
+
+class TestBotReadiness:
+    """Состояние бота для /ready"""
+
+    def test_not_ready_before_start(self):
+        import qr
+        application = qr.build_application(token='123456:TEST')
+
+        state = qr.get_readiness(application)
+
+        assert state['ready'] is False
+        assert state['polling'] is False
+        assert state['database']['type'] == 'sqlite'
+        assert 'entries' in state['caches']['qr']
+        json.dumps(state, default=str)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
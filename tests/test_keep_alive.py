@@ -0,0 +1,167 @@
+"""
+Тесты для keep-alive: общая сессия, пропуск пингов при входящем трафике, backoff
+"""
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from render_keep_alive import RenderKeepAlive
+from health_server import HealthServer
+
+
+class HealthStub:
+    """Health endpoint, запоминающий запросы и TCP соединения"""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.requests = 0
+        self.connections = set()
+
+    async def handle(self, request):
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+        return web.json_response({'status': 'ok'}, status=self.status)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/health', self.handle)
+        return app
+
+
+def run_keep_alive(stub, duration, traffic_every=None, start_idle=False, **kwargs):
+    """Крутит keep_alive_loop duration секунд; traffic_every - частота входящих запросов"""
+    async def main():
+        server = TestServer(stub.app())
+        await server.start_server()
+        keep_alive = RenderKeepAlive(str(server.make_url('')).rstrip('/'), initial_delay=0, **kwargs)
+        if start_idle:
+            # Входящих запросов не было уже целое окно
+            keep_alive._last_inbound -= keep_alive.ping_interval
+        loop_task = asyncio.create_task(keep_alive.keep_alive_loop())
+        try:
+            elapsed = 0.0
+            while elapsed < duration:
+                step = traffic_every or duration
+                await asyncio.sleep(step)
+                elapsed += step
+                if traffic_every:
+                    keep_alive.mark_inbound()
+        finally:
+            keep_alive.stop()
+            loop_task.cancel()
+            await keep_alive.close()
+            await server.close()
+        return keep_alive
+    return asyncio.run(main())
+
+
+class TestScheduling:
+    """Когда уходят пинги"""
+
+    def test_idle_service_is_pinged(self):
+        stub = HealthStub()
+        keep_alive = run_keep_alive(stub, duration=0.75, ping_interval=0.2)
+
+        assert 2 <= stub.requests <= 4
+        assert keep_alive.pings_sent == stub.requests
+
+    def test_pings_skipped_while_traffic_arrives(self):
+        stub = HealthStub()
+        keep_alive = run_keep_alive(stub, duration=0.8, traffic_every=0.05, ping_interval=0.2)
+
+        assert stub.requests == 0
+        assert keep_alive.pings_skipped >= 2
+
+    def test_single_pooled_connection(self):
+        stub = HealthStub()
+        run_keep_alive(stub, duration=0.75, ping_interval=0.2)
+
+        assert stub.requests >= 2
+        assert len(stub.connections) == 1
+
+
+class TestFailures:
+    """Backoff с джиттером и статистика"""
+
+    def test_retry_delay_grows_with_jitter(self):
+        keep_alive = RenderKeepAlive('http://localhost', ping_interval=720, retry_delay=15)
+
+        for failures, cap in [(1, 15), (2, 30), (3, 60), (10, 720)]:
+            keep_alive._failures = failures
+            delays = [keep_alive._retry_delay() for _ in range(50)]
+            assert all(cap / 2 <= delay <= cap for delay in delays)
+            assert len(set(delays)) > 1
+
+    def test_failed_pings_retried_sooner(self):
+        stub = HealthStub(status=500)
+        keep_alive = run_keep_alive(stub, duration=0.5, start_idle=True, ping_interval=10, retry_delay=0.05)
+
+        # Без ошибок второй пинг был бы только через 10 с
+        assert stub.requests >= 3
+        assert keep_alive.stats()['failures_in_row'] == stub.requests
+        assert keep_alive.stats()['latency_ms_p50'] is None
+
+    def test_latency_history(self):
+        keep_alive = run_keep_alive(HealthStub(), duration=0.5, ping_interval=0.2)
+
+        stats = keep_alive.stats()
+        assert stats['latency_ms_p50'] is not None
+        assert len(keep_alive.history) == stats['pings_sent']
+
+    def test_last_latency_is_newest_ping(self):
+        keep_alive = RenderKeepAlive('http://localhost')
+        keep_alive.history.extend([(1.0, 0.300, True), (2.0, 0.010, True), (3.0, None, False)])
+
+        assert keep_alive.stats()['latency_ms_last'] == 10.0
+        assert keep_alive.stats()['latency_ms_p50'] == 300.0
+
+
+def run_with_probes(duration, headers=None, ping_interval=0.2):
+    """Keep-alive пингует настоящий HealthServer, пока в /health непрерывно ходят пробы"""
+    async def main():
+        keep_alive = RenderKeepAlive(initial_delay=0, ping_interval=ping_interval)
+        health = HealthServer(on_request=keep_alive.mark_inbound, cache_ttl=0)
+        server = TestServer(health.app())
+        await server.start_server()
+        keep_alive.app_url = str(server.make_url('')).rstrip('/')
+        loop_task = asyncio.create_task(keep_alive.keep_alive_loop())
+        try:
+            async with aiohttp.ClientSession() as session:
+                deadline = asyncio.get_running_loop().time() + duration
+                while asyncio.get_running_loop().time() < deadline:
+                    async with session.get(keep_alive.app_url + '/health', headers=headers) as response:
+                        await response.read()
+                    await asyncio.sleep(0.02)
+        finally:
+            keep_alive.stop()
+            loop_task.cancel()
+            await keep_alive.close()
+            await server.close()
+        return keep_alive
+    return asyncio.run(main())
+
+
+class TestInboundTraffic:
+    """Что считается входящим трафиком"""
+
+    def test_internal_health_checks_do_not_suppress_pings(self):
+        # Внутренние пробы Render (без X-Forwarded-For) не будят free-план
+        keep_alive = run_with_probes(0.75)
+
+        assert keep_alive.pings_sent >= 2
+
+    def test_external_requests_suppress_pings(self):
+        keep_alive = run_with_probes(0.75, headers={'X-Forwarded-For': '203.0.113.7'})
+
+        assert keep_alive.pings_sent == 0
+        assert keep_alive.pings_skipped >= 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,110 @@
+"""
+Тесты для аренды единственного экземпляра бота
+"""
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from database import Database
+from lease import BotLease
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Временная SQLite база"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'test_lease.db'))
+    return Database()
+
+
+class TestLeaseRow:
+    """Методы Database для таблицы bot_lease"""
+
+    def test_single_holder(self, database):
+        assert database.acquire_lease('bot', 'old', ttl=15, now=1000)
+        assert not database.acquire_lease('bot', 'new', ttl=15, now=1005)
+        assert database.get_lease('bot')['holder'] == 'old'
+
+    def test_renew_by_holder(self, database):
+        database.acquire_lease('bot', 'old', ttl=15, now=1000)
+
+        assert database.acquire_lease('bot', 'old', ttl=15, now=1010)
+        assert database.get_lease('bot')['expires_at'] == 1025
+
+    def test_expired_lease_taken_over(self, database):
+        database.acquire_lease('bot', 'old', ttl=15, now=1000)
+
+        assert database.acquire_lease('bot', 'new', ttl=15, now=1016)
+        assert not database.acquire_lease('bot', 'old', ttl=15, now=1017)
+
+    def test_release_only_by_holder(self, database):
+        database.acquire_lease('bot', 'old', ttl=15, now=1000)
+
+        assert not database.release_lease('bot', 'new')
+        assert database.release_lease('bot', 'old')
+        assert database.get_lease('bot') is None
+
+
+class TestBotLease:
+    """Передача аренды между экземплярами"""
+
+    def test_handoff_after_release(self, database):
+        async def scenario():
+            old = BotLease(database, holder='old', ttl=15, poll_interval=0.05)
+            new = BotLease(database, holder='new', ttl=15, poll_interval=0.05)
+            await old.acquire()
+
+            waiting = asyncio.create_task(new.acquire())
+            await asyncio.sleep(0.2)
+            assert not waiting.done()
+
+            released_at = time.monotonic()
+            await old.release()
+            await waiting
+            return time.monotonic() - released_at
+
+        # Новый экземпляр стартует сразу, а не через TTL
+        assert asyncio.run(scenario()) < 1.0
+        assert database.get_lease('qr_bot')['holder'] == 'new'
+
+    def test_takeover_after_expiry(self, database):
+        database.acquire_lease('qr_bot', 'crashed', ttl=0.3)
+
+        async def scenario():
+            lease = BotLease(database, holder='new', ttl=15, poll_interval=0.05)
+            return await lease.acquire()
+
+        waited = asyncio.run(scenario())
+        assert 0.2 < waited < 1.5
+
+    def test_heartbeat_keeps_lease(self, database):
+        async def scenario():
+            lease = BotLease(database, holder='old', ttl=0.3, poll_interval=0.05)
+            await lease.acquire()
+            lease.start_heartbeat()
+            await asyncio.sleep(0.6)
+            taken = database.acquire_lease('qr_bot', 'new', ttl=15)
+            await lease.release()
+            return taken
+
+        assert asyncio.run(scenario()) is False
+
+    def test_lost_lease_signalled(self, database):
+        async def scenario():
+            lease = BotLease(database, holder='old', ttl=0.3, poll_interval=0.05)
+            await lease.acquire()
+            lease.start_heartbeat()
+            database.release_lease('qr_bot', 'old')
+            database.acquire_lease('qr_bot', 'new', ttl=15)
+            await asyncio.wait_for(lease.lost.wait(), timeout=1)
+            await lease.release()
+
+        asyncio.run(scenario())
+        assert database.get_lease('qr_bot')['holder'] == 'new'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,72 @@
+"""
+Тесты для остановки бота по сигналу и упорядоченного завершения
+"""
+import sys
+import os
+import asyncio
+import signal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from lifecycle import install_signal_handlers, run_shutdown, wait_for_any
+
+
+class TestSignals:
+    """SIGTERM выставляет событие остановки"""
+
+    def test_sigterm_sets_stop_event(self):
+        async def scenario():
+            stop_event = asyncio.Event()
+            assert signal.SIGTERM in install_signal_handlers(stop_event)
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(stop_event.wait(), timeout=1)
+            return stop_event.is_set()
+
+        assert asyncio.run(scenario())
+
+    def test_wait_for_any(self):
+        async def scenario():
+            stop_event, lease_lost = asyncio.Event(), asyncio.Event()
+            asyncio.get_running_loop().call_later(0.05, lease_lost.set)
+            await asyncio.wait_for(wait_for_any(stop_event, lease_lost, None), timeout=1)
+            return stop_event.is_set(), lease_lost.is_set()
+
+        assert asyncio.run(scenario()) == (False, True)
+
+
+class TestRunShutdown:
+    """Шаги выполняются по порядку в пределах дедлайна"""
+
+    def test_steps_in_order(self):
+        order = []
+
+        def step(name):
+            async def run():
+                order.append(name)
+            return name, run
+
+        asyncio.run(run_shutdown([step('polling'), step('flush'), step('lease')], timeout=5))
+        assert order == ['polling', 'flush', 'lease']
+
+    def test_hanging_and_failing_steps_do_not_block_the_rest(self):
+        done = []
+
+        async def hang():
+            await asyncio.sleep(60)
+
+        async def fail():
+            raise RuntimeError('db is down')
+
+        async def release():
+            done.append('lease')
+
+        elapsed = asyncio.run(run_shutdown([('hang', hang), ('fail', fail), ('lease', release)], timeout=0.2))
+
+        assert done == ['lease']
+        # Зависший шаг получает остаток дедлайна, но не меньше секунды
+        assert elapsed < 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
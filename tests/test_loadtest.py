@@ -0,0 +1,102 @@
+"""
+Тесты для нагрузочного стенда: очередь getUpdates fake Bot API и прогон сценариев
+"""
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'loadtest')))
+
+import aiohttp
+import pytest
+from fake_bot_api import FakeBotAPI
+from telegram_updates import text_update
+
+
+async def call(session, api, method, **params):
+    async with session.post(f'{api.url}123:TEST/{method}', json=params) as response:
+        return (await response.json())['result']
+
+
+class TestFakeBotAPI:
+    """getUpdates и ожидание ответа в чат"""
+
+    def test_get_updates_confirms_by_offset(self):
+        async def main():
+            api = FakeBotAPI()
+            await api.start()
+            try:
+                first, second = text_update(1, 'a'), text_update(2, 'b')
+                api.push_update(first)
+                api.push_update(second)
+                async with aiohttp.ClientSession() as session:
+                    both = await call(session, api, 'getUpdates', offset=0, timeout=0)
+                    rest = await call(session, api, 'getUpdates', offset=second['update_id'], timeout=0)
+                    empty = await call(session, api, 'getUpdates', offset=second['update_id'] + 1, timeout=0)
+                return both, rest, empty, second
+            finally:
+                await api.stop()
+
+        both, rest, empty, second = asyncio.run(main())
+        assert len(both) == 2
+        assert rest == [second]
+        assert empty == []
+
+    def test_long_poll_wakes_on_new_update(self):
+        async def main():
+            api = FakeBotAPI()
+            await api.start()
+            try:
+                async with aiohttp.ClientSession() as session:
+                    poll = asyncio.create_task(call(session, api, 'getUpdates', timeout=10))
+                    await asyncio.sleep(0.1)
+                    started = time.perf_counter()
+                    api.push_update(text_update(1, 'hi'))
+                    updates = await poll
+                    return updates, time.perf_counter() - started
+            finally:
+                await api.stop()
+
+        updates, waited = asyncio.run(main())
+        assert len(updates) == 1
+        assert waited < 0.5
+
+    def test_expect_reply_in_chat(self):
+        async def main():
+            api = FakeBotAPI()
+            await api.start()
+            try:
+                photo = api.expect(42, {'sendPhoto'})
+                async with aiohttp.ClientSession() as session:
+                    await call(session, api, 'sendMessage', chat_id=7, text='other chat')
+                    await call(session, api, 'sendMessage', chat_id=42, text='not a photo')
+                    assert not photo.done()
+                    await call(session, api, 'sendPhoto', chat_id=42)
+                return await asyncio.wait_for(photo, 1)
+            finally:
+                await api.stop()
+
+        method, params = asyncio.run(main())
+        assert method == 'sendPhoto'
+        assert params['chat_id'] == 42
+
+
+class TestPollingLoad:
+    """Сквозной прогон: python qr.py против fake Bot API"""
+
+    def test_small_run_completes_without_errors(self):
+        from polling_load import SCENARIO_WEIGHTS, run_load
+
+        summary = asyncio.run(run_load(users=6, ramp=0.5, think=0))
+
+        results = summary['results']
+        assert results.error_count == 0
+        assert sum(results.scenarios.values()) == 6
+        assert set(results.scenarios) <= set(SCENARIO_WEIGHTS)
+        assert summary['api_calls']['sendPhoto'] == len(results.latencies['service_qr'])
+        assert summary['exit_code'] == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
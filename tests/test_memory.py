@@ -0,0 +1,228 @@
+"""
+Тесты для бюджета памяти: уровни лимитов, сжатие кэшей, tracemalloc и /mem
+"""
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import memory
+from memory import MemoryBudget, SOFT, CRITICAL
+from qr_cache import QRCache
+
+MB = 1024 * 1024
+
+
+class TestMemoryBudget:
+    """Лимиты RSS и вызов зарегистрированных сжатий"""
+
+    def test_levels(self):
+        budget = MemoryBudget(soft_limit_mb=100, critical_limit_mb=200)
+        assert budget.level(50 * MB) is None
+        assert budget.level(100 * MB) == SOFT
+        assert budget.level(250 * MB) == CRITICAL
+
+    def test_below_limit_does_nothing(self):
+        calls = []
+        budget = MemoryBudget(soft_limit_mb=100, critical_limit_mb=200, rss=lambda: 10 * MB)
+        budget.register('cache', calls.append)
+
+        assert asyncio.run(budget.enforce()) is None
+        assert calls == []
+
+    def test_shrinkers_called_with_level(self):
+        calls = []
+
+        async def shrink_async(level):
+            calls.append(('async', level))
+            return 3
+
+        def shrink_sync(level):
+            calls.append(('sync', level))
+            return 5
+
+        budget = MemoryBudget(soft_limit_mb=100, critical_limit_mb=200, rss=lambda: 150 * MB)
+        budget.register('first', shrink_sync)
+        budget.register('second', shrink_async)
+
+        result = asyncio.run(budget.enforce())
+        assert calls == [('sync', SOFT), ('async', SOFT)]
+        assert result['freed'] == {'first': 5, 'second': 3}
+        assert budget.shrinks[SOFT] == 1
+        assert budget.last_shrink is result
+
+    def test_failing_shrinker_does_not_stop_others(self):
+        calls = []
+
+        def broken(level):
+            raise RuntimeError('boom')
+
+        budget = MemoryBudget(soft_limit_mb=100, critical_limit_mb=200, rss=lambda: 10 * MB)
+        budget.register('broken', broken)
+        budget.register('cache', calls.append)
+
+        result = asyncio.run(budget.enforce(CRITICAL))
+        assert calls == [CRITICAL]
+        assert 'broken' not in result['freed']
+
+
+class TestCacheShrinking:
+    """Сжатие кэшей бота"""
+
+    def test_qr_cache_trim_keeps_newest(self):
+        cache = QRCache(max_entries=10)
+        for i in range(6):
+            cache.put(f'payload-{i}', b'png')
+
+        assert cache.trim(2) == 4
+        assert 'payload-5' in cache and 'payload-4' in cache
+        assert 'payload-0' not in cache
+        assert cache.trim(5) == 0
+
+    def test_bot_shrinkers(self):
+        import qr
+        from reports import cached
+
+        qr.qr_cache.clear()
+        for i in range(10):
+            qr.qr_cache.put(f'payload-{i}', b'png')
+
+        class Source:
+            version = 1
+
+        cached('memory-test', Source(), lambda: 'text')
+
+        assert qr.shrink_qr_cache(SOFT) == 5
+        assert qr.shrink_reports_cache(SOFT) >= 1
+        assert qr.reports_cache_size() == 0
+        assert qr.shrink_trace_buffer(SOFT) == 0
+        assert qr.shrink_qr_cache(CRITICAL) == 5
+        assert len(qr.qr_cache) == 0
+
+
+class TestUserDataEviction:
+    """Вытеснение user_data неактивных пользователей"""
+
+    def test_idle_users_excludes_recent_and_pending(self, tmp_path, monkeypatch):
+        from database import Database
+        from persistence import DatabasePersistence
+
+        monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'memory.db'))
+        persistence = DatabasePersistence(Database(), write_delay=60)
+
+        async def main():
+            await persistence.refresh_user_data(1, {})
+            await persistence.refresh_user_data(2, {})
+            await persistence.refresh_user_data(3, {})
+            persistence._last_seen[1] -= 100
+            persistence._last_seen[2] -= 100
+            await persistence.update_user_data(2, {'amount': 700})
+            idle = persistence.idle_users(50)
+            await persistence.flush()
+            return idle
+
+        assert asyncio.run(main()) == [1]
+
+    def test_evicted_state_reloaded_from_database(self, tmp_path, monkeypatch):
+        import qr
+        from database import Database
+        from persistence import DatabasePersistence
+        from telegram.ext import ApplicationBuilder
+
+        monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'memory.db'))
+        database = Database()
+        persistence = DatabasePersistence(database, write_delay=60)
+        monkeypatch.setattr(qr, 'persistence', persistence)
+        application = ApplicationBuilder().token('123:TEST').persistence(persistence).build()
+
+        async def main():
+            for user_id in (1, 2):
+                await persistence.refresh_user_data(user_id, application.user_data[user_id])
+                application.user_data[user_id]['amount'] = 700 + user_id
+            application.mark_data_for_update_persistence(user_ids=[1, 2])
+            persistence._last_seen[1] = time.monotonic() - 3600
+
+            evicted = await qr.evict_idle_user_data(application, SOFT)
+            # Следующий цикл persistence не удаляет строку вытесненного пользователя
+            await application.update_persistence()
+            await persistence.flush()
+
+            reloaded = {}
+            await persistence.refresh_user_data(1, reloaded)
+            return evicted, set(application.user_data), reloaded
+
+        evicted, user_ids, reloaded = asyncio.run(main())
+        assert evicted == 1
+        assert user_ids == {2}
+        assert reloaded == {'amount': 701}
+        assert database.get_user_state(1) == {'amount': 701}
+
+    def test_real_drop_still_deletes_row(self, tmp_path, monkeypatch):
+        from database import Database
+        from persistence import DatabasePersistence
+
+        monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'memory.db'))
+        database = Database()
+        persistence = DatabasePersistence(database, write_delay=60)
+
+        async def main():
+            await persistence.update_user_data(1, {'amount': 700})
+            await persistence.flush()
+            persistence.evict(1)
+            await persistence.drop_user_data(1)
+            await persistence.flush()
+            kept = database.get_user_state(1)
+            await persistence.drop_user_data(1)
+            await persistence.flush()
+            return kept, database.get_user_state(1)
+
+        assert asyncio.run(main()) == ({'amount': 700}, None)
+
+
+class TestAllocations:
+    """tracemalloc по запросу"""
+
+    def test_allocation_report_and_growth(self):
+        assert memory.start_tracing()
+        try:
+            memory.allocation_report()
+            hoard = [bytearray(1024) for _ in range(2000)]
+            report = memory.allocation_report()
+        finally:
+            memory.stop_tracing()
+
+        assert report['traced'] > 2 * MB
+        assert any(site.startswith('test_memory.py:') for site, _, _ in report['top'])
+        assert any(site.startswith('test_memory.py:') and size >= 2 * MB for site, size, _ in report['growth'])
+        assert not memory.is_tracing()
+        del hoard
+
+    def test_memory_report_text(self):
+        import qr
+
+        text = qr.render_memory_report(3)
+        assert 'RSS' in text
+        assert 'user_data: 3' in text
+        assert '/mem start' in text
+
+        allocations = {'traced': 2 * MB, 'peak': 3 * MB, 'top': [('qr.py:10', 4096, 2)],
+                       'growth': [('<stdin>:1', 2048, 1)]}
+        text = qr.render_memory_report(0, allocations)
+        assert 'qr.py:10' in text
+        assert '&lt;stdin&gt;:1' in text
+
+    def test_mem_command_registered(self):
+        import qr
+        application = qr.build_application(token='123456:TEST')
+
+        commands = {command for group in application.handlers.values() for handler in group
+                    for command in getattr(handler, 'commands', ())}
+        assert 'mem' in commands
+        assert application.job_queue.get_jobs_by_name('memory_budget')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
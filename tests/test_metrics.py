@@ -0,0 +1,147 @@
+"""
+Тесты для реестра метрик и его подключения к обработчикам, БД и Bot API
+"""
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from metrics import (DB_DURATION, HANDLER_DURATION, HANDLER_ERRORS, TELEGRAM_API_DURATION,
+                     Registry, instrument_handler)
+
+
+class TestRegistry:
+    """Метрики и текстовый формат"""
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        requests = registry.counter('requests_total', 'Requests', ['route'])
+        requests.inc(route='/health')
+        requests.inc(2, route='/health')
+        registry.gauge('queue_size', 'Queue').set_function(lambda: 7)
+
+        text = registry.render()
+        assert '# TYPE requests_total counter' in text
+        assert 'requests_total{route="/health"} 3' in text
+        assert 'queue_size 7' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            latency.observe(value)
+
+        text = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert 'latency_seconds_count 4' in text
+        assert 'latency_seconds_sum 4.25' in text
+
+    def test_quantile_estimate(self):
+        latency = Registry().histogram('latency_seconds', 'Latency', buckets=(0.01, 0.1, 1.0))
+        for _ in range(98):
+            latency.observe(0.005)
+        latency.observe(0.5)
+        latency.observe(0.5)
+
+        assert latency.quantile(0.5) == 0.01
+        assert latency.quantile(0.99) == 1.0
+
+    def test_same_name_returns_same_metric(self):
+        registry = Registry()
+        assert registry.counter('x_total', 'X') is registry.counter('x_total', 'X')
+        with pytest.raises(ValueError):
+            registry.gauge('x_total', 'X')
+
+    def test_wrong_labels_rejected(self):
+        counter = Registry().counter('x_total', 'X', ['handler'])
+        with pytest.raises(ValueError):
+            counter.inc(method='start')
+
+    def test_label_values_escaped(self):
+        registry = Registry()
+        registry.counter('x_total', 'X', ['name']).inc(name='say "hi"')
+
+        assert 'x_total{name="say \\"hi\\""} 1' in registry.render()
+
+
+class TestInstrumentation:
+    """Обработчики, методы БД и вызовы Bot API"""
+
+    def test_handler_duration_and_errors(self):
+        async def ok_handler(update, context):
+            return 'done'
+
+        async def broken_handler(update, context):
+            raise RuntimeError('boom')
+
+        before = HANDLER_DURATION.count(handler='ok_handler')
+        assert asyncio.run(instrument_handler(ok_handler)(None, None)) == 'done'
+        with pytest.raises(RuntimeError):
+            asyncio.run(instrument_handler(broken_handler)(None, None))
+
+        assert HANDLER_DURATION.count(handler='ok_handler') == before + 1
+        assert HANDLER_ERRORS.value(handler='broken_handler') >= 1
+
+    def test_database_methods_timed(self, tmp_path, monkeypatch):
+        from database import Database
+        monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'metrics.db'))
+        database = Database()
+        before = DB_DURATION.count(method='get_user_stats')
+
+        database.get_user_stats(1)
+
+        assert DB_DURATION.count(method='get_user_stats') == before + 1
+
+    def test_bot_api_calls_timed(self):
+        from telegram import Bot
+        from metered_request import MeteredRequest
+
+        async def get_me(request):
+            return web.json_response({'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Bot'}})
+
+        async def main():
+            app = web.Application()
+            app.router.add_post('/bot{token}/getMe', get_me)
+            server = TestServer(app)
+            await server.start_server()
+            bot = Bot('123:TEST', base_url=str(server.make_url('/bot')), request=MeteredRequest())
+            try:
+                async with bot:
+                    await bot.get_me()
+            finally:
+                await server.close()
+
+        before = TELEGRAM_API_DURATION.count(method='getMe')
+        asyncio.run(main())
+        assert TELEGRAM_API_DURATION.count(method='getMe') > before
+
+    def test_all_bot_handlers_instrumented(self):
+        import qr
+        application = qr.build_application(token='123456:TEST')
+
+        handlers = [handler for group in application.handlers.values() for handler in group]
+        assert handlers
+        assert all(getattr(handler.callback, '__instrumented__', False) for handler in handlers)
+
+    def test_metrics_endpoint(self):
+        from health_server import HealthServer
+
+        async def main():
+            async with TestClient(TestServer(HealthServer().app())) as client:
+                response = await client.get('/metrics')
+                return response.status, response.headers['Content-Type'], await response.text()
+
+        status, content_type, text = asyncio.run(main())
+        assert status == 200
+        assert content_type.startswith('text/plain; version=0.0.4')
+        assert '# TYPE bot_handler_duration_seconds histogram' in text
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
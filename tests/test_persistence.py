@@ -0,0 +1,115 @@
+"""
+Тесты для хранения context.user_data в базе данных
+"""
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from database import Database
+from persistence import DatabasePersistence
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Временная SQLite база"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'test_persistence.db'))
+    return Database()
+
+
+class CountingDatabase:
+    """Обертка над Database, считающая чтения состояния"""
+
+    def __init__(self, database):
+        self.database = database
+        self.reads = 0
+
+    def get_user_state(self, user_id):
+        self.reads += 1
+        return self.database.get_user_state(user_id)
+
+    def save_user_states(self, states):
+        return self.database.save_user_states(states)
+
+
+class TestUserStateStorage:
+    """Методы Database для состояния диалога"""
+
+    def test_roundtrip(self, database):
+        database.save_user_states({1: {'waiting_for_service': True, 'amount': 1500.0}})
+
+        assert database.get_user_state(1) == {'waiting_for_service': True, 'amount': 1500.0}
+        assert database.get_user_state(2) is None
+
+    def test_upsert_and_delete(self, database):
+        database.save_user_states({1: {'amount': 100.0}, 2: {'amount': 200.0}})
+        database.save_user_states({1: {'amount': 300.0}, 2: None})
+
+        assert database.get_user_state(1) == {'amount': 300.0}
+        assert database.get_user_state(2) is None
+
+
+class TestDatabasePersistence:
+    """Ленивая загрузка и отложенная запись"""
+
+    def test_state_survives_restart(self, database):
+        async def scenario():
+            before = DatabasePersistence(database, write_delay=0.01)
+            await before.update_user_data(7, {'waiting_for_service': True, 'amount': 850.0})
+            await before.flush()
+
+            after = DatabasePersistence(database)
+            user_data = {}
+            await after.refresh_user_data(7, user_data)
+            return user_data
+
+        assert asyncio.run(scenario()) == {'waiting_for_service': True, 'amount': 850.0}
+
+    def test_loaded_once_per_user(self, database):
+        counting = CountingDatabase(database)
+
+        async def scenario():
+            persistence = DatabasePersistence(counting)
+            user_data = {}
+            for _ in range(5):
+                await persistence.refresh_user_data(7, user_data)
+
+        asyncio.run(scenario())
+        assert counting.reads == 1
+
+    def test_writes_batched(self, database):
+        async def scenario():
+            persistence = DatabasePersistence(database, write_delay=0.05)
+            for user_id in range(10):
+                await persistence.update_user_data(user_id, {'amount': float(user_id)})
+            await asyncio.sleep(0.2)
+            return persistence.writes
+
+        assert asyncio.run(scenario()) == 1
+        assert database.get_user_state(9) == {'amount': 9.0}
+
+    def test_flush_writes_pending(self, database):
+        async def scenario():
+            persistence = DatabasePersistence(database, write_delay=60)
+            await persistence.update_user_data(1, {'amount': 500.0})
+            await persistence.flush()
+
+        asyncio.run(scenario())
+        assert database.get_user_state(1) == {'amount': 500.0}
+
+    def test_drop_removes_row(self, database):
+        database.save_user_states({1: {'amount': 500.0}})
+
+        async def scenario():
+            persistence = DatabasePersistence(database, write_delay=60)
+            await persistence.drop_user_data(1)
+            await persistence.flush()
+
+        asyncio.run(scenario())
+        assert database.get_user_state(1) is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,153 @@
+"""
+Тесты для сэмплирующего профилировщика: стеки потоков, формат collapsed stacks, /profile
+"""
+import sys
+import os
+import asyncio
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import profiler
+from profiler import SamplingProfiler
+
+
+def busy_worker(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def sleeping_worker(stop: threading.Event):
+    stop.wait()
+
+
+def run_threads(targets, sampler: SamplingProfiler, seconds: float = 0.3):
+    stop = threading.Event()
+    threads = [threading.Thread(target=target, args=(stop,), name=name) for name, target in targets]
+    for thread in threads:
+        thread.start()
+    sampler.start()
+    time.sleep(seconds)
+    sampler.stop()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+
+class TestSamplingProfiler:
+    """Сэмплы стеков всех потоков"""
+
+    def test_busy_thread_sampled(self):
+        sampler = SamplingProfiler(interval=0.005)
+        run_threads([('busy', busy_worker)], sampler)
+
+        busy = {stack: count for stack, count in sampler.stacks.items() if stack[0] == 'busy'}
+        assert sampler.samples > 10
+        assert busy
+        assert all(any(frame.startswith('busy_worker (test_profiler.py:') for frame in stack) for stack in busy)
+        assert 'sampling-profiler' not in {stack[0] for stack in sampler.stacks}
+
+    def test_idle_threads_skipped(self):
+        sampler = SamplingProfiler(interval=0.005)
+        run_threads([('idle', sleeping_worker)], sampler)
+        assert 'idle' not in {stack[0] for stack in sampler.stacks}
+
+        sampler = SamplingProfiler(interval=0.005, include_idle=True)
+        run_threads([('idle', sleeping_worker)], sampler)
+        assert 'idle' in {stack[0] for stack in sampler.stacks}
+
+    def test_collapsed_format(self):
+        sampler = SamplingProfiler(interval=0.005)
+        run_threads([('busy', busy_worker)], sampler)
+
+        lines = sampler.collapsed().splitlines()
+        counts = [int(line.rsplit(' ', 1)[1]) for line in lines]
+        assert sum(counts) == sum(sampler.stacks.values())
+        assert counts == sorted(counts, reverse=True)
+        assert all(';' in line.rsplit(' ', 1)[0] for line in lines)
+
+    def test_top_functions_by_self_time(self):
+        sampler = SamplingProfiler()
+        sampler.stacks[('MainThread', 'main (a.py:1)', 'slow (a.py:5)')] = 7
+        sampler.stacks[('worker', 'run (b.py:1)', 'slow (a.py:5)')] = 2
+        sampler.stacks[('MainThread', 'main (a.py:1)')] = 1
+
+        assert sampler.top_functions(2) == [('slow (a.py:5)', 9), ('main (a.py:1)', 1)]
+        assert '90% slow (a.py:5)' in sampler.summary()
+
+
+class TestProfileFor:
+    """Окно профилирования в event loop"""
+
+    def test_event_loop_and_worker_threads(self):
+        async def main():
+            task = asyncio.create_task(profiler.profile_for(0.3, interval=0.005))
+            await asyncio.sleep(0)
+            stop = threading.Event()
+            worker = asyncio.create_task(asyncio.to_thread(busy_worker, stop))
+            deadline = time.monotonic() + 0.2
+            while time.monotonic() < deadline:
+                sum(i * i for i in range(1000))
+                await asyncio.sleep(0)
+            stop.set()
+            await worker
+            return await task
+
+        sampled = asyncio.run(main())
+        threads = {stack[0] for stack in sampled.stacks}
+        assert 'MainThread' in threads
+        assert any(name.startswith('asyncio_') for name in threads)
+        assert not profiler.is_running()
+
+    def test_single_profile_at_a_time_and_finish_early(self):
+        async def main():
+            task = asyncio.create_task(profiler.profile_for(60, interval=0.005))
+            await asyncio.sleep(0.05)
+            assert profiler.is_running()
+            with pytest.raises(RuntimeError):
+                await profiler.profile_for(1)
+            started = time.monotonic()
+            profiler.finish_early()
+            sampled = await task
+            return sampled, time.monotonic() - started
+
+        sampled, waited = asyncio.run(main())
+        assert waited < 1
+        assert sampled.duration < 5
+        assert not profiler.is_running()
+
+    def test_save(self, tmp_path):
+        sampler = SamplingProfiler()
+        sampler.stacks[('MainThread', 'main (a.py:1)')] = 3
+
+        path = profiler.save(sampler, str(tmp_path))
+        assert path.endswith('.collapsed')
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == 'MainThread;main (a.py:1) 3\n'
+
+
+class TestProfileCommand:
+    """Регистрация /profile в боте"""
+
+    def test_profile_command_registered(self):
+        import qr
+        application = qr.build_application(token='123456:TEST')
+
+        commands = {command for group in application.handlers.values() for handler in group
+                    for command in getattr(handler, 'commands', ())}
+        assert 'profile' in commands
+
+    def test_profile_document(self):
+        import qr
+        sampler = SamplingProfiler()
+        sampler.stacks[('MainThread', 'main (a.py:1)')] = 3
+
+        document = qr.profile_document(sampler)
+        assert document.name.endswith('.collapsed')
+        assert document.getvalue() == b'MainThread;main (a.py:1) 3\n'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,120 @@
+"""
+Тесты для кэша QR-кодов и предварительного рендеринга записей календаря
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import qr
+from qr_cache import QRCache
+from google_calendar import get_mock_today_events
+
+
+class CountingRenderer:
+    """Рендерер, считающий вызовы"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, payload):
+        self.calls.append(payload)
+        return f"png:{payload}".encode()
+
+
+class TestQRCache:
+    """LRU кэш PNG"""
+
+    def test_render_once(self):
+        cache = QRCache()
+        render = CountingRenderer()
+
+        first = cache.get_or_render('SPD*AM:500', render)
+        second = cache.get_or_render('SPD*AM:500', render)
+
+        assert first == second == b'png:SPD*AM:500'
+        assert len(render.calls) == 1
+        assert cache.stats()['hits'] == 1
+
+    def test_lru_eviction(self):
+        cache = QRCache(max_entries=2)
+        render = CountingRenderer()
+
+        cache.get_or_render('a', render)
+        cache.get_or_render('b', render)
+        cache.get_or_render('a', render)
+        cache.get_or_render('c', render)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert len(cache) == 2
+
+    def test_precompute_skips_cached(self):
+        cache = QRCache()
+        render = CountingRenderer()
+        cache.get_or_render('a', render)
+
+        assert cache.precompute(['a', 'b', 'c'], render) == 2
+        assert render.calls == ['a', 'b', 'c']
+
+    def test_snapshot_roundtrip(self, tmp_path):
+        path = str(tmp_path / 'qr_cache.json')
+        cache = QRCache()
+        render = CountingRenderer()
+        cache.get_or_render('a', render)
+        cache.get_or_render('b', render)
+
+        assert cache.save(path) == 2
+
+        restored = QRCache()
+        assert restored.load(path) == 2
+        assert restored.get_or_render('b', render) == b'png:b'
+        assert len(render.calls) == 2
+
+    def test_missing_snapshot(self, tmp_path):
+        assert QRCache().load(str(tmp_path / 'missing.json')) == 0
+
+
+class FakeCalendarCache:
+    def get_events(self, day=None):
+        return get_mock_today_events()
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    """Календарь с тестовыми записями и пустой кэш QR"""
+    monkeypatch.setattr(qr, 'calendar_cache', FakeCalendarCache(), raising=False)
+    monkeypatch.setattr(qr, 'qr_cache', QRCache())
+    return qr.qr_cache
+
+
+class TestCalendarPrecompute:
+    """QR-коды для сегодняшних записей рисуются заранее"""
+
+    def test_payloads_precomputed(self, calendar):
+        options = qr.get_today_payment_options()
+
+        assert qr.precompute_calendar_qr_codes() == len(options)
+        for option in options:
+            assert qr.build_qr_payload(float(option['price']), option['procedure'].upper()) in calendar
+
+    def test_tap_served_from_cache(self, calendar):
+        qr.precompute_calendar_qr_codes()
+        option = qr.get_today_payment_options()[0]
+        misses = calendar.misses
+
+        image = qr.generate_qr_code(float(option['price']), option['procedure'].upper())
+
+        assert image.getvalue().startswith(b'\x89PNG')
+        assert calendar.misses == misses
+
+    def test_callback_keys_unique_and_short(self, calendar):
+        keys = [qr.calendar_option_key(o['event_id']) for o in qr.get_today_payment_options()]
+
+        assert len(set(keys)) == len(keys)
+        assert all(len(f"cal_{key}") <= 64 for key in keys)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,113 @@
+"""
+Тесты для рендеринга отчетов статистики
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import reports
+from database import Database
+from analytics_engine import AnalyticsEngine
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Временная SQLite база с тестовыми данными"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'test_reports.db'))
+    database = Database()
+
+    database.add_or_update_user(1, 'anna', 'Anna')
+    database.add_or_update_user(2, None, 'Marie')
+
+    database.add_transaction(1, 1500.0, 'LAMINACE ŘAS')
+    database.add_transaction(1, 800.0, 'ÚPRAVA')
+    database.add_transaction(2, 6200.0, 'ÚPRAVA')
+    return database
+
+
+@pytest.fixture
+def engine(database):
+    """Движок, подписанный на изменения тестовой базы"""
+    reports.clear_cache()
+    engine = AnalyticsEngine(database)
+    database.add_listener(engine)
+    yield engine
+    reports.clear_cache()
+
+
+class TestMonthNames:
+    """Названия месяцев"""
+
+    def test_indexed_by_month_number(self):
+        assert len(reports.MONTH_NAMES) == 13
+        assert reports.MONTH_NAMES[1] == 'Январь'
+        assert reports.MONTH_NAMES[12] == 'Декабрь'
+
+
+class TestRenderStatsOverview:
+    """Общая статистика /stats"""
+
+    def test_contents(self, engine):
+        text = reports.render_stats_overview(engine, 'sqlite')
+
+        assert text.startswith('📊 **СТАТИСТИКА БОТА**\n📝 База данных: **SQLite**\n\n')
+        assert '💰 Всего транзакций: 3\n' in text
+        assert '💵 Общая сумма: 8,500 CZK\n' in text
+        assert '**Топ мастеров:**\n1. @anna: 2 QR, 2300 CZK\n2. @ID2: 1 QR, 6200 CZK\n' in text
+        assert '\n**Популярные услуги:**\n1. ÚPRAVA: 2x\n' in text
+
+    def test_database_source_renders_same_text(self, database, engine):
+        assert reports.render_stats_overview(database, 'postgresql').split('\n', 2)[2] == \
+               reports.render_stats_overview(engine, 'postgresql').split('\n', 2)[2]
+
+
+class TestRenderMonthStats:
+    """Статистика за выбранный месяц"""
+
+    def test_current_month(self, engine):
+        text = reports.render_month_stats(engine, 0)
+
+        assert '<b>📈 Общие показатели:</b>\n💰 Транзакций: 3\n' in text
+        assert '📉 Мин. сумма: 800 CZK\n📈 Макс. сумма: 6200 CZK\n' in text
+        assert '\n<b>💳 Распределение чеков:</b>\n' in text
+        assert '6000–6499 CZK:' in text
+
+    def test_empty_month(self, engine):
+        text = reports.render_month_stats(engine, 6)
+
+        assert text.endswith('📭 Нет данных за этот период')
+
+
+class TestRenderCache:
+    """Кэширование отрендеренного текста по версии данных"""
+
+    def test_same_version_not_rerendered(self, engine):
+        calls = []
+
+        def render():
+            calls.append(1)
+            return 'text'
+
+        assert reports.cached(('view',), engine, render) == 'text'
+        assert reports.cached(('view',), engine, render) == 'text'
+        assert len(calls) == 1
+
+    def test_new_data_invalidates(self, database, engine):
+        before = reports.render_stats_overview(engine, 'sqlite')
+        database.add_transaction(1, 400.0, 'ÚPRAVA')
+        after = reports.render_stats_overview(engine, 'sqlite')
+
+        assert '💰 Всего транзакций: 3\n' in before
+        assert '💰 Всего транзакций: 4\n' in after
+
+    def test_source_without_version_not_cached(self, database):
+        reports.clear_cache()
+        reports.render_stats_overview(database, 'sqlite')
+
+        assert reports.cache_size() == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,155 @@
+"""
+Тесты для scale-out режима (шардирование апдейтов по воркерам)
+"""
+import sys
+import os
+import asyncio
+import json
+import subprocess
+import zlib
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from scale_out import WEBHOOK_PATH, create_front_app, extract_chat_id, shard_for, worker_snapshot_path
+
+
+class RecordingRouter:
+    """Роутер без процессов: запоминает, какому воркеру ушел апдейт"""
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.routed = []
+
+    def dispatch(self, raw):
+        update = json.loads(raw)
+        if not isinstance(update, dict):
+            raise ValueError('update must be a JSON object')
+        shard = shard_for(extract_chat_id(update), self.workers)
+        self.routed.append((update['update_id'], shard))
+        return shard
+
+    def alive(self):
+        return [True] * self.workers
+
+
+def request(app, method, path, **kwargs):
+    """Один запрос к приложению фронта; возвращает (статус, тело)"""
+    async def main():
+        async with TestClient(TestServer(app)) as client:
+            response = await client.request(method, path, **kwargs)
+            return response.status, await response.text()
+    return asyncio.run(main())
+
+
+class TestSharding:
+    """Назначение чата воркеру"""
+
+    def test_stable_across_restarts(self):
+        # crc32, а не hash(): не зависит от PYTHONHASHSEED
+        assert shard_for(123456789, 4) == zlib.crc32(b'123456789') % 4
+
+    def test_spread_over_workers(self):
+        counts = [0] * 4
+        for chat_id in range(10_000, 11_000):
+            counts[shard_for(chat_id, 4)] += 1
+
+        assert min(counts) > 200
+
+    def test_no_chat_goes_to_first_worker(self):
+        assert shard_for(None, 4) == 0
+
+
+class TestExtractChatId:
+    """chat_id из разных типов апдейтов"""
+
+    def test_message(self):
+        assert extract_chat_id({'update_id': 1, 'message': {'chat': {'id': 42}, 'from': {'id': 7}}}) == 42
+
+    def test_callback_query(self):
+        update = {'update_id': 1, 'callback_query': {'from': {'id': 7}, 'message': {'chat': {'id': 42}}}}
+        assert extract_chat_id(update) == 42
+
+    def test_inline_query_uses_user(self):
+        assert extract_chat_id({'update_id': 1, 'inline_query': {'from': {'id': 7}, 'query': ''}}) == 7
+
+    def test_unknown_update(self):
+        assert extract_chat_id({'update_id': 1}) is None
+
+
+class TestFront:
+    """Webhook фронт"""
+
+    def test_updates_of_one_chat_go_to_one_worker(self):
+        router = RecordingRouter()
+        app = create_front_app(router, secret=None)
+
+        async def main():
+            async with TestClient(TestServer(app)) as client:
+                for update_id in range(5):
+                    update = {'update_id': update_id, 'message': {'chat': {'id': 42}, 'text': str(update_id)}}
+                    response = await client.post(WEBHOOK_PATH, data=json.dumps(update))
+                    assert response.status == 200
+
+        asyncio.run(main())
+        assert [update_id for update_id, _ in router.routed] == [0, 1, 2, 3, 4]
+        assert {shard for _, shard in router.routed} == {shard_for(42, 4)}
+
+    def test_secret_required(self):
+        router = RecordingRouter()
+        app = create_front_app(router, secret='s3cret')
+        update = json.dumps({'update_id': 1, 'message': {'chat': {'id': 42}}})
+
+        assert request(app, 'POST', WEBHOOK_PATH, data=update)[0] == 403
+        assert request(create_front_app(router, secret='s3cret'), 'POST', WEBHOOK_PATH, data=update,
+                       headers={'X-Telegram-Bot-Api-Secret-Token': 's3cret'})[0] == 200
+        assert len(router.routed) == 1
+
+    def test_invalid_body_rejected(self):
+        assert request(create_front_app(RecordingRouter(), secret=None), 'POST', WEBHOOK_PATH, data='[1, 2]')[0] == 400
+
+    def test_health(self):
+        status, body = request(create_front_app(RecordingRouter(), secret=None), 'GET', '/health')
+
+        assert status == 200
+        assert json.loads(body)['alive'] == 4
+
+
+class TestWorkerStats:
+    """Статистика воркера одинакова на всех шардах"""
+
+    def test_worker_reads_stats_from_database(self, tmp_path):
+        env = dict(os.environ, DATABASE_PATH=str(tmp_path / 'worker.db'), SCALE_OUT_WORKER='2')
+        env.pop('DATABASE_URL', None)
+        output = subprocess.run(
+            [sys.executable, '-c', "import sys, qr; print(qr.stats_source is qr.db, 'analytics_engine' in sys.modules)"],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout.split()
+
+        assert output == ['True', 'False']
+
+
+class TestWorkerJobs:
+    """Фоновые задачи, общие для всех воркеров, идут только в одном из них"""
+
+    def test_calendar_synced_only_by_primary(self, monkeypatch):
+        import qr
+        monkeypatch.setattr(qr, 'CALENDAR_ENABLED', True)
+        monkeypatch.setattr(qr, 'MULTI_CALENDAR', False)
+
+        primary = qr.build_application(token='123456:TEST', polling=False, primary=True)
+        worker = qr.build_application(token='123456:TEST', polling=False, primary=False)
+
+        assert primary.job_queue.get_jobs_by_name('calendar_sync')
+        assert not worker.job_queue.get_jobs_by_name('calendar_sync')
+        assert worker.job_queue.get_jobs_by_name('calendar_reload')
+
+    def test_qr_snapshot_per_worker(self):
+        assert worker_snapshot_path('qr_cache.json', 0) == 'qr_cache.worker-0.json'
+        assert worker_snapshot_path('/data/qr.json', 3) == '/data/qr.worker-3.json'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
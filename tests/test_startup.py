@@ -0,0 +1,130 @@
+"""
+Тесты для холодного старта: фазы и импорты, отложенное подключение к БД, ленивый qrcode
+"""
+import sys
+import os
+import builtins
+import subprocess
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import pytest
+from startup import StartupRecorder
+
+
+class TestStartupRecorder:
+    """Фазы и замер импортов"""
+
+    def test_phases_in_order(self):
+        recorder = StartupRecorder()
+        with recorder.phase('first'):
+            time.sleep(0.01)
+        with recorder.phase('second'):
+            pass
+
+        (first, first_offset, first_duration), (second, second_offset, _) = recorder.phases
+        assert (first, second) == ('first', 'second')
+        assert first_duration >= 0.01
+        assert first_offset >= recorder.interpreter
+        assert second_offset >= first_offset + first_duration
+
+    def test_tracks_imports_of_module(self, tmp_path, monkeypatch):
+        (tmp_path / 'slow_dependency.py').write_text('import time\ntime.sleep(0.02)\n')
+        monkeypatch.syspath_prepend(str(tmp_path))
+        original_import = builtins.__import__
+        recorder = StartupRecorder()
+
+        recorder.track_imports('bot_module')
+        try:
+            exec('import slow_dependency', {'__name__': 'bot_module'})
+            exec('import json', {'__name__': 'other_module'})
+        finally:
+            recorder.mark_ready()
+            sys.modules.pop('slow_dependency', None)
+
+        assert [name for name, _, _ in recorder.phases] == ['import slow_dependency']
+        assert recorder.phases[0][2] >= 0.02
+        assert builtins.__import__ is original_import
+        assert recorder.as_dict()['ready_at'] == round(recorder.ready_at, 3)
+
+
+class TestDeferredDatabase:
+    """Подключение к БД откладывается до connect() или первого запроса"""
+
+    def test_connects_on_first_query(self, tmp_path, monkeypatch):
+        from database import Database
+
+        path = tmp_path / 'deferred.db'
+        monkeypatch.setenv('DATABASE_PATH', str(path))
+        database = Database(connect=False)
+
+        assert not database.connected
+        assert database.pool_status() == {'type': 'sqlite', 'connected': False}
+        assert not path.exists()
+
+        database.add_or_update_user(1, 'master', 'Master')
+        assert database.connected
+        assert database.get_user_stats(1) is not None
+
+    def test_concurrent_connect_runs_schema_once(self, tmp_path, monkeypatch):
+        from database import Database
+
+        monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'deferred.db'))
+        database = Database(connect=False)
+        calls = []
+        original = database.init_db
+
+        def slow_init_db():
+            calls.append(threading.get_ident())
+            time.sleep(0.05)
+            original()
+
+        database.init_db = slow_init_db
+        threads = [threading.Thread(target=database.get_total_stats) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert database.connected
+
+
+class TestLazyImports:
+    """Импорт бота не подключается к БД и не загружает qrcode/PIL"""
+
+    def test_import_qr_is_lazy(self, tmp_path):
+        path = tmp_path / 'import.db'
+        env = dict(os.environ, DATABASE_PATH=str(path))
+        env.pop('DATABASE_URL', None)
+        output = subprocess.run(
+            [sys.executable, '-c', "import sys, qr; print('qrcode' in sys.modules, 'PIL' in sys.modules, qr.db.connected)"],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout.split()
+
+        assert output == ['False', 'False', 'False']
+        assert not path.exists()
+
+    def test_dotenv_loaded_before_project_modules(self, tmp_path):
+        # Настройки модулей проекта читаются при импорте - .env должен быть загружен раньше
+        env = dict(os.environ, DATABASE_PATH=str(tmp_path / 'import.db'))
+        for name in ('DATABASE_URL', 'SHUTDOWN_TIMEOUT', 'MEMORY_SOFT_LIMIT_MB', 'QR_CACHE_SIZE'):
+            env.pop(name, None)
+        script = (
+            "import os, dotenv\n"
+            "dotenv.load_dotenv = lambda *args, **kwargs: os.environ.update("
+            "SHUTDOWN_TIMEOUT='7', MEMORY_SOFT_LIMIT_MB='123', QR_CACHE_SIZE='9') or True\n"
+            "import qr, lifecycle, memory, qr_cache\n"
+            "print(lifecycle.SHUTDOWN_TIMEOUT, memory.MEMORY_SOFT_LIMIT_MB, qr_cache.QR_CACHE_SIZE)\n"
+        )
+        output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+
+        assert output == ['7.0', '123', '9']
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
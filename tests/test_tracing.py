@@ -0,0 +1,208 @@
+"""
+Тесты для трассировки: вложенность span'ов, contextvars, экспорт и /trace
+"""
+import sys
+import os
+import asyncio
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from tracing import Tracer, trace_handler, traced, tracer
+
+
+def names(trace):
+    return [(depth, span.name) for depth, span in trace.tree()]
+
+
+class TestSpans:
+    """Вложенность и завершение трасс"""
+
+    def test_nested_spans_form_tree(self):
+        local = Tracer(enabled=True, export_path='')
+        with local.span('handler'):
+            with local.span('db.get_user_stats', root=False):
+                pass
+            with local.span('qr.generate', root=False):
+                with local.span('qr.render', root=False):
+                    pass
+
+        [trace] = local.recent
+        assert names(trace) == [(0, 'handler'), (1, 'db.get_user_stats'), (1, 'qr.generate'), (2, 'qr.render')]
+        assert all(span.duration is not None for span in trace.spans)
+        assert len({span.trace.trace_id for span in trace.spans}) == 1
+
+    def test_child_without_root_not_recorded(self):
+        local = Tracer(enabled=True, export_path='')
+        with local.span('db.add_event', root=False) as span:
+            assert span is None
+        local.record('db.connection', 0.0)
+
+        assert not local.recent
+
+    def test_error_recorded(self):
+        local = Tracer(enabled=True, export_path='')
+        with pytest.raises(RuntimeError):
+            with local.span('handler'):
+                with local.span('telegram.sendPhoto', root=False):
+                    raise RuntimeError('timed out')
+
+        [trace] = local.recent
+        assert trace.root.error == 'RuntimeError: timed out'
+        assert trace.spans[1].to_otlp()['status'] == {'code': 'ERROR', 'message': 'RuntimeError: timed out'}
+
+    def test_record_finished_span(self):
+        import time
+        local = Tracer(enabled=True, export_path='')
+        with local.span('handler'):
+            started = time.perf_counter()
+            time.sleep(0.02)
+            local.record('db.connection', started, attempts=2)
+
+        span = local.recent[0].spans[1]
+        assert span.name == 'db.connection'
+        assert span.duration >= 0.02
+        assert span.attributes == {'attempts': 2}
+
+    def test_disabled_tracer(self):
+        local = Tracer(enabled=False, export_path='')
+        with local.span('handler') as span:
+            assert span is None
+
+        assert not local.recent
+
+    def test_slowest_first(self):
+        local = Tracer(enabled=True, export_path='')
+        for name in ('fast', 'slow', 'medium'):
+            with local.span(name):
+                pass
+        durations = {'fast': 0.001, 'slow': 0.5, 'medium': 0.1}
+        for trace in local.recent:
+            trace.root.duration = durations[trace.root.name]
+
+        assert [trace.root.name for trace in local.slowest(2)] == ['slow', 'medium']
+
+    def test_jsonl_export(self, tmp_path):
+        path = tmp_path / 'traces.jsonl'
+        local = Tracer(enabled=True, export_path=str(path))
+        with local.span('handler', user_id=42):
+            with local.span('db.add_transaction', root=False):
+                pass
+
+        records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+        assert [record['name'] for record in records] == ['handler', 'db.add_transaction']
+        assert records[1]['parentSpanId'] == records[0]['spanId']
+        assert records[0]['traceId'] == records[1]['traceId']
+        assert records[0]['attributes'] == {'user_id': 42}
+        assert records[0]['endTimeUnixNano'] >= records[0]['startTimeUnixNano']
+
+
+class TestPropagation:
+    """Контекст через await, потоки и параллельные апдейты"""
+
+    def test_to_thread_and_concurrent_handlers(self):
+        @traced('db.slow_query')
+        def slow_query():
+            import time
+            time.sleep(0.01)
+
+        async def handler_a(update, context):
+            await asyncio.sleep(0.01)
+            await asyncio.to_thread(slow_query)
+
+        async def handler_b(update, context):
+            await asyncio.to_thread(slow_query)
+            await asyncio.sleep(0.01)
+            slow_query()
+
+        async def main():
+            await asyncio.gather(trace_handler(handler_a)(None, None), trace_handler(handler_b)(None, None))
+
+        before = len(tracer.recent)
+        asyncio.run(main())
+
+        traces = {trace.root.name: trace for trace in list(tracer.recent)[before:]}
+        assert names(traces['handler_a']) == [(0, 'handler_a'), (1, 'db.slow_query')]
+        assert names(traces['handler_b']) == [(0, 'handler_b'), (1, 'db.slow_query'), (1, 'db.slow_query')]
+
+    def test_handler_to_db_qr_and_telegram(self, tmp_path, monkeypatch):
+        """Полная цепочка: обработчик → метод Database → QR → sendPhoto"""
+        from telegram import Bot
+        from database import Database
+        from metered_request import MeteredRequest
+        import qr
+
+        monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'trace.db'))
+        database = Database()
+        qr.qr_cache.clear()
+
+        async def get_me(request):
+            return web.json_response({'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Bot'}})
+
+        async def send_photo(request):
+            message = {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}}
+            return web.json_response({'ok': True, 'result': message})
+
+        async def main():
+            app = web.Application()
+            app.router.add_post('/bot{token}/getMe', get_me)
+            app.router.add_post('/bot{token}/sendPhoto', send_photo)
+            server = TestServer(app)
+            await server.start_server()
+            bot = Bot('123:TEST', base_url=str(server.make_url('/bot')), request=MeteredRequest())
+
+            async def pay_handler(update, context):
+                database.add_transaction(user_id=1, amount=700, service='BARVENÍ ŘAS')
+                image = qr.generate_qr_code(700, 'BARVENÍ ŘAS')
+                await bot.send_photo(chat_id=1, photo=image)
+
+            try:
+                async with bot:
+                    await trace_handler(pay_handler)(None, None)
+            finally:
+                await server.close()
+
+        asyncio.run(main())
+
+        trace = next(trace for trace in reversed(tracer.recent) if trace.root.name == 'pay_handler')
+        assert names(trace) == [
+            (0, 'pay_handler'),
+            (1, 'db.add_transaction'),
+            (1, 'qr.generate'),
+            (2, 'qr.render'),
+            (1, 'telegram.sendPhoto'),
+        ]
+        assert trace.spans[-1].attributes['http.status'] == 200
+
+    def test_bot_handlers_traced(self):
+        import qr
+        application = qr.build_application(token='123456:TEST')
+
+        commands = {command for group in application.handlers.values() for handler in group
+                    for command in getattr(handler, 'commands', ())}
+        assert 'trace' in commands
+
+
+class TestTraceReport:
+    """Текст ответа /trace"""
+
+    def test_report_lists_spans(self):
+        import qr
+        local = Tracer(enabled=True, export_path='')
+        with local.span('handle_service_selection'):
+            for _ in range(qr.TRACE_REPORT_MAX_SPANS + 3):
+                with local.span('db.add_event', root=False):
+                    pass
+
+        text = qr.render_trace_report(local.slowest(), len(local.recent))
+
+        assert '<b>handle_service_selection</b>' in text
+        assert text.count('└ db.add_event') == qr.TRACE_REPORT_MAX_SPANS
+        assert '… еще 3' in text
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Трассировка запросов: обработчик → БД → QR → Bot API
+Корневой span открывается на каждый апдейт, вложенные span'ы (методы Database,
+генерация QR, вызовы Bot API) находят родителя через contextvars - в том числе
+через await и asyncio.to_thread. Завершенные трассы хранятся в памяти для /trace
+и дописываются в JSONL файл (поля как в OTLP JSON: traceId, spanId, parentSpanId...)
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Трассировка включена по умолчанию: span стоит единицы микросекунд
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'true').lower() == 'true'
+
+# Сколько последних трасс держать в памяти для /trace
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+
+# JSONL экспорт (пусто - только в памяти)
+TRACE_FILE = os.getenv('TRACE_FILE', '')
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """Интервал работы внутри трассы"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attributes',
+                 'start_time', 'duration', 'error', '_started')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Optional[Dict] = None):
+        self.trace = parent.trace if parent is not None else Trace()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+        self.trace.spans.append(self)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_otlp(self) -> Dict:
+        """Span в виде, близком к OTLP JSON"""
+        return {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'startTimeUnixNano': int(self.start_time * 1e9),
+            'endTimeUnixNano': int((self.start_time + (self.duration or 0)) * 1e9),
+            'attributes': self.attributes,
+            'status': {'code': 'ERROR', 'message': self.error} if self.error else {'code': 'OK'},
+        }
+
+
+class Trace:
+    """Все span'ы одного запроса; первый - корневой"""
+
+    __slots__ = ('trace_id', 'spans')
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration or 0.0
+
+    def tree(self) -> Iterator[Tuple[int, Span]]:
+        """Span'ы в порядке обхода дерева: (глубина, span)"""
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in self.spans:
+            children.setdefault(span.parent_id, []).append(span)
+
+        def walk(span: Span, depth: int):
+            yield depth, span
+            for child in children.get(span.span_id, []):
+                yield from walk(child, depth + 1)
+
+        yield from walk(self.root, 0)
+
+
+class Tracer:
+    """Создание span'ов, буфер последних трасс и JSONL экспорт"""
+
+    def __init__(self, enabled: bool = TRACE_ENABLED, buffer_size: int = TRACE_BUFFER_SIZE,
+                 export_path: str = TRACE_FILE):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.recent: deque = deque(maxlen=buffer_size)
+        self._export_lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, root: bool = True, **attributes):
+        """Span вокруг блока кода
+
+        Args:
+            name: имя span'а (handler, db.add_transaction, telegram.sendPhoto ...)
+            root: False - span пишется только внутри уже открытой трассы
+            attributes: произвольные атрибуты span'а
+        """
+        parent = _current_span.get()
+        if not self.enabled or (parent is None and not root):
+            yield None
+            return
+        span = Span(name, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            if parent is None:
+                self._finish_trace(span.trace)
+
+    def record(self, name: str, started: float, **attributes):
+        """Вложенный span уже завершенной работы (started - time.perf_counter() начала)"""
+        parent = _current_span.get()
+        if not self.enabled or parent is None:
+            return
+        span = Span(name, parent, attributes)
+        span.start_time -= span._started - started
+        span._started = started
+        span.finish()
+
+    def _finish_trace(self, trace: Trace):
+        self.recent.append(trace)
+        if self.export_path:
+            self._export(trace)
+
+    def _export(self, trace: Trace):
+        lines = ''.join(json.dumps(span.to_otlp(), ensure_ascii=False, default=str) + '\n'
+                        for span in trace.spans if span.duration is not None)
+        try:
+            with self._export_lock, open(self.export_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"Trace export failed: {e}")
+
+    def slowest(self, limit: int = 5) -> List[Trace]:
+        """Самые долгие из последних трасс"""
+        return sorted(list(self.recent), key=lambda trace: trace.duration, reverse=True)[:limit]
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def traced(name: str) -> Callable:
+    """Декоратор синхронной функции: вложенный span (вне трассы не пишется)"""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, root=False):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_handler(callback: Callable, name: Optional[str] = None) -> Callable:
+    """Обертка async обработчика апдейта: корневой span трассы"""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        attributes = {}
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            attributes['user_id'] = user.id
+        with tracer.span(name, **attributes):
+            return await callback(update, context)
+
+    return wrapper
+
+
+# Глобальный трассировщик процесса
+tracer = Tracer()